@@ -0,0 +1,28 @@
+"""Индекс кодов подтверждения
+
+Revision ID: 5b1e9d3a7c42
+Revises: 82620ea0f71b
+Create Date: 2026-10-19 13:02:41.518207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1e9d3a7c42'
+down_revision: Union[str, Sequence[str], None] = '82620ea0f71b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_email_verification_codes_user_active', 'email_verification_codes', ['user_id', 'is_used', 'expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_email_verification_codes_user_active', table_name='email_verification_codes')
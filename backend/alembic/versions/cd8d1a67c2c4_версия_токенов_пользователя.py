@@ -0,0 +1,28 @@
+"""Версия токенов пользователя
+
+Revision ID: cd8d1a67c2c4
+Revises: 0effc62304be
+Create Date: 2026-10-19 09:12:41.208517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'cd8d1a67c2c4'
+down_revision: Union[str, Sequence[str], None] = '0effc62304be'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'token_version')
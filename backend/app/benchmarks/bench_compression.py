@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+CPU против сэкономленных байт при сжатии ответов /prompts/history
+Использование: python benchmarks/bench_compression.py [--items 10,50] [--iterations 200]
+
+Тело собирается так же, как ответ истории: JSON со списком запросов на
+русском и английском с длинными сгенерированными промптами. Для каждого
+доступного кодека и уровня выводятся размер, степень сжатия и время
+сжатия одного ответа. br и zstd замеряются, если установлены brotli и
+zstandard.
+"""
+
+import sys
+import os
+import json
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+# Добавляем родительскую директорию в путь для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.compression import _brotli, _gzip, _zstd
+
+LEVELS = {
+    "gzip": (_gzip, (1, 6, 9)),
+    "br": (_brotli, (1, 4, 6, 11)),
+    "zstd": (_zstd, (1, 3, 9, 19)),
+}
+
+RU_WORDS = (
+    "ты опытный специалист который отвечает точно по существу разбери задачу шагам укажи допущения "
+    "на которые опираешься приведи пример кода объясни почему выбран именно такой подход учитывай "
+    "ограничения памяти времени выполнения конце дай краткое резюме список возможных улучшений "
+    "пользователь хочет получить подробный ответ структуру данных алгоритм сложность тесты проверка "
+    "интерфейс запрос база индекс кеш сервер клиент ошибка исключение логирование метрики нагрузка"
+).split()
+EN_WORDS = (
+    "you are an experienced engineer who answers precisely and concisely break the task into steps "
+    "state assumptions rely on provide code example explain why this approach was chosen take memory "
+    "latency constraints into account finish with short summary list of possible improvements user "
+    "wants detailed answer data structure algorithm complexity tests interface request database index"
+).split()
+
+
+def _sentence(rng: random.Random, words) -> str:
+    return " ".join(rng.choice(words) for _ in range(rng.randint(8, 20))).capitalize() + "."
+
+
+def history_payload(items: int, seed: int = 42) -> bytes:
+    """Тело ответа /prompts/history из ``items`` записей"""
+    rng = random.Random(seed)
+    now = datetime(2026, 1, 1, 12, 0, 0)
+    records = []
+    for index in range(items):
+        words = rng.choice((RU_WORDS, EN_WORDS))
+        original = " ".join(_sentence(rng, words) for _ in range(2))
+        generated = "\n\n".join(
+            " ".join(_sentence(rng, words) for _ in range(rng.randint(3, 6))) for _ in range(rng.randint(3, 6))
+        )
+        records.append({
+            "original_prompt": original,
+            "style_id": rng.randint(1, 4),
+            "id": 1000 - index,
+            "user_id": 1,
+            "generated_prompt": generated,
+            "created_at": (now - timedelta(minutes=index * 7)).isoformat(),
+        })
+    # Как JSONResponse: ensure_ascii=False, компактные разделители
+    return json.dumps(records, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def measure(codec, body: bytes, iterations: int):
+    """Возвращает (размер сжатого тела, мкс на одно сжатие)"""
+    compressed = codec(body)
+    started_at = time.perf_counter()
+    for _ in range(iterations):
+        codec(body)
+    return len(compressed), (time.perf_counter() - started_at) / iterations * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", default="10,50", help="записей в ответе через запятую")
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    for items in (int(value) for value in args.items.split(",")):
+        body = history_payload(items)
+        print(f"\nИстория из {items} записей: {len(body)} байт")
+        print(f"{'кодек':<6} {'уровень':>7} {'байт':>9} {'сжатие':>8} {'мкс':>9} {'МБ/с':>8}")
+        for name, (factory, levels) in LEVELS.items():
+            for level in levels:
+                try:
+                    codec = factory(level)
+                except ImportError:
+                    print(f"{name:<6} {'-':>7}  библиотека не установлена")
+                    break
+                size, micros = measure(codec, body, args.iterations)
+                print(
+                    f"{name:<6} {level:>7} {size:>9} {len(body) / size:>7.1f}x"
+                    f" {micros:>9.0f} {len(body) / micros:>8.0f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк рендеринга писем из шаблонов
+Использование: python benchmarks/bench_email_render.py [--iterations 5000]
+
+Сравнивает рендеринг заранее скомпилированных шаблонов с компиляцией
+шаблона при каждой отправке.
+"""
+
+import sys
+import os
+import time
+import argparse
+
+# Добавляем родительскую директорию в путь для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.email_templates import EmailTemplates
+
+CONTEXTS = {
+    "verification": {"name": "Бенчмарк", "code": "123456"},
+    "welcome": {"name": "Бенчмарк"},
+}
+
+
+def renders_per_second(render, iterations: int) -> float:
+    started_at = time.perf_counter()
+    for _ in range(iterations):
+        render()
+    return iterations / (time.perf_counter() - started_at)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    templates = EmailTemplates()
+    started_at = time.perf_counter()
+    templates.load()
+    print(f"Компиляция всех шаблонов: {(time.perf_counter() - started_at) * 1000:.1f} мс")
+    print(f"Итераций: {args.iterations}")
+
+    for email_type in templates.email_types():
+        context = CONTEXTS.get(email_type, {"name": "Бенчмарк"})
+        cached = renders_per_second(lambda: templates.render(email_type, **context), args.iterations)
+        # Без кеша: новое окружение Jinja2 и компиляция шаблонов на каждое письмо
+        uncached = renders_per_second(
+            lambda: EmailTemplates(templates.directory).render(email_type, **context),
+            max(1, args.iterations // 20),
+        )
+        print(
+            f"{email_type:<14} скомпилированные {cached:>10.0f} писем/с ({1e6 / cached:>7.1f} мкс)"
+            f"  компиляция при отправке {uncached:>8.0f} писем/с ({1e6 / uncached:>7.1f} мкс)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк get_current_user с кешем проверенных JWT и без него
+Использование: python benchmarks/bench_get_current_user.py [--iterations 20000]
+
+Пользователь заранее лежит в кеше пользователей, поэтому к БД запросы не
+идут и измеряется только проверка токена.
+"""
+
+import sys
+import os
+import time
+import asyncio
+import argparse
+from datetime import datetime
+
+# Добавляем родительскую директорию в путь для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-minimum-32-characters")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from fastapi.security import HTTPAuthorizationCredentials
+from core.auth import create_access_token
+from core.token_cache import verified_tokens
+from core.token_versions import token_versions
+from core.user_cache import user_cache
+from routers.auth import get_current_user
+from schemas.user import UserSnapshot
+
+
+async def run(iterations: int, credentials: HTTPAuthorizationCredentials) -> float:
+    """Возвращает число вызовов get_current_user в секунду"""
+    started_at = time.perf_counter()
+    for _ in range(iterations):
+        await get_current_user(credentials, db=None)
+    return iterations / (time.perf_counter() - started_at)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    now = datetime.utcnow()
+    user = UserSnapshot(
+        id=1,
+        email="bench@example.com",
+        name="Bench",
+        is_email_confirmed=True,
+        daily_limit=3,
+        requests_today=0,
+        created_at=now,
+        updated_at=now,
+    )
+    # Большой TTL, чтобы записи не истекли во время замера
+    user_cache.ttl = token_versions.ttl = 3600
+    user_cache.put(user)
+    token_versions.set(user.id, user.token_version)
+
+    token = create_access_token({"sub": user.email, "uid": user.id, "email_confirmed": True, "ver": 0})
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+    print(f"Итераций: {args.iterations}")
+    for enabled in (False, True):
+        verified_tokens.enabled = enabled
+        verified_tokens.clear()
+        rate = asyncio.run(run(args.iterations, credentials))
+        label = "с кешем" if enabled else "без кеша"
+        print(f"{label:<10} {rate:>12.0f} вызовов/с  {1e6 / rate:>8.1f} мкс/вызов")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Время импорта приложения по данным python -X importtime
+Использование: python benchmarks/bench_import_time.py [--module main] [--runs 5] [--top 15] [--budget-ms 0]
+
+Импорт выполняется в отдельных процессах; берется лучший из запусков,
+чтобы отсечь влияние холодного дискового кеша. С --budget-ms скрипт
+завершается с кодом 1, если время импорта превышает бюджет.
+"""
+
+import sys
+import os
+import argparse
+import subprocess
+from typing import Dict, Tuple
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Минимальная конфигурация, без которой приложение не импортируется
+DEFAULT_ENV = {
+    "SECRET_KEY": "benchmark-secret-key-minimum-32-characters",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
+    "DATABASE_URL": "sqlite://",
+}
+
+
+def measure_import(module: str = "main") -> Tuple[float, Dict[str, Tuple[int, int]]]:
+    """Импортирует модуль в новом процессе.
+
+    Возвращает (общее время в мс, {модуль: (собственное время, суммарное время) в мкс}).
+    """
+    env = {**DEFAULT_ENV, **os.environ}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=APP_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules[module][1] / 1000, modules
+
+
+def best_of(runs: int, module: str = "main") -> Tuple[float, Dict[str, Tuple[int, int]]]:
+    return min((measure_import(module) for _ in range(runs)), key=lambda item: item[0])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    total_ms, modules = best_of(args.runs, args.module)
+    print(f"Импорт {args.module}: {total_ms:.1f} мс (лучший из {args.runs})")
+    print("\nСамые тяжелые пакеты верхнего уровня (суммарно, мс):")
+    top_level = {}
+    for name, (_, cumulative_us) in modules.items():
+        root = name.split(".")[0]
+        if name == root and name != args.module:
+            top_level[root] = max(top_level.get(root, 0), cumulative_us)
+    for name, cumulative_us in sorted(top_level.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {name:<32} {cumulative_us / 1000:>8.1f}")
+
+    if args.budget_ms and total_ms > args.budget_ms:
+        print(f"\nБюджет превышен: {total_ms:.1f} мс > {args.budget_ms:.0f} мс")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
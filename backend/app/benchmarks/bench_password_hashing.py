@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк проверки паролей при конкурентных логинах
+Использование: python benchmarks/bench_password_hashing.py [--requests 64] [--concurrency 32] [--workers N]
+
+Сравнивает три режима:
+  inline  - bcrypt прямо в event loop (как было раньше)
+  thread  - PasswordHasher с пулом потоков
+  process - PasswordHasher с пулом процессов
+
+Для каждого режима выводит логины в секунду, логины в секунду на ядро
+и максимальную задержку event loop (насколько опаздывает тикер с шагом 10 мс).
+"""
+
+import sys
+import os
+import time
+import asyncio
+import argparse
+
+# Добавляем родительскую директорию в путь для импорта модулей
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import HTTPException
+from core.password_hashing import PasswordHasher, check_password, hash_password
+
+TICK_INTERVAL = 0.01
+
+
+async def measure_loop_lag(stop: asyncio.Event) -> float:
+    """Возвращает максимальное опоздание тикера, мс"""
+    max_lag = 0.0
+    while not stop.is_set():
+        started_at = time.perf_counter()
+        await asyncio.sleep(TICK_INTERVAL)
+        max_lag = max(max_lag, time.perf_counter() - started_at - TICK_INTERVAL)
+    return max_lag * 1000
+
+
+async def run_mode(mode: str, hashed: str, requests: int, concurrency: int, workers: int) -> dict:
+    hasher = None
+    if mode != "inline":
+        hasher = PasswordHasher(executor_kind=mode, workers=workers, max_pending=concurrency)
+        # Прогреваем пул, чтобы не мерить запуск процессов
+        await asyncio.gather(*(hasher.verify("password", hashed) for _ in range(workers)))
+
+    semaphore = asyncio.Semaphore(concurrency)
+    rejected = 0
+
+    async def login():
+        nonlocal rejected
+        async with semaphore:
+            if hasher is None:
+                check_password("password", hashed)
+                # Отдаем управление, как это делает обработчик после проверки
+                await asyncio.sleep(0)
+                return
+            try:
+                await hasher.verify("password", hashed)
+            except HTTPException:
+                rejected += 1
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop))
+    started_at = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(requests)))
+    elapsed = time.perf_counter() - started_at
+    stop.set()
+    max_lag_ms = await lag_task
+
+    if hasher is not None:
+        hasher.shutdown()
+
+    cores = 1 if mode == "inline" else min(workers, os.cpu_count() or 1)
+    completed = requests - rejected
+    return {
+        "mode": mode,
+        "logins_per_sec": completed / elapsed,
+        "logins_per_sec_per_core": completed / elapsed / cores,
+        "max_loop_lag_ms": max_lag_ms,
+        "rejected": rejected,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--modes", default="inline,thread,process")
+    args = parser.parse_args()
+
+    hashed = hash_password("password")
+    print(f"Ядер: {os.cpu_count()}, воркеров: {args.workers}, логинов: {args.requests}, конкурентность: {args.concurrency}")
+    print(f"{'режим':<8} {'логин/с':>10} {'на ядро':>10} {'лаг loop, мс':>14} {'503':>5}")
+    for mode in args.modes.split(","):
+        result = asyncio.run(run_mode(mode, hashed, args.requests, args.concurrency, args.workers))
+        print(
+            f"{result['mode']:<8} {result['logins_per_sec']:>10.1f} "
+            f"{result['logins_per_sec_per_core']:>10.1f} {result['max_loop_lag_ms']:>14.1f} {result['rejected']:>5}"
+        )
+
+
+if __name__ == "__main__":
+    main()
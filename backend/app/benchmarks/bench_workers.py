@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Пропускная способность API в зависимости от числа воркеров serve.py
+Использование: python benchmarks/bench_workers.py [--workers 1,2,4] [--duration 10] [--path /health]
+
+Для каждого числа воркеров запускается serve.py, после чего несколько
+процессов-клиентов с keep-alive соединениями нагружают маршрут в течение
+--duration секунд. Без DATABASE_URL в окружении используется пустая SQLite
+без схемы - этого достаточно для /health; маршрутам с БД нужен PostgreSQL
+с примененными миграциями.
+
+Клиенты работают на той же машине, поэтому рост упирается в число ядер:
+для честного замера клиентские процессы (--clients) должны оставлять
+ядра воркерам.
+"""
+
+import sys
+import os
+import time
+import asyncio
+import argparse
+import socket
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Минимальная конфигурация, без которой приложение не запускается
+DEFAULT_ENV = {
+    "SECRET_KEY": "benchmark-secret-key-minimum-32-characters",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
+    "STARTUP_MODE": "skip",
+    "LOG_LEVEL": "ERROR",
+    "UPSTREAM_PREWARM_ENABLED": "false",
+    "SERVER_TIMING_ENABLED": "false",
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int, port: int, data_dir: str) -> subprocess.Popen:
+    env = {
+        "DATABASE_URL": f"sqlite:///{os.path.join(data_dir, 'bench.db')}",
+        **DEFAULT_ENV,
+        **os.environ,
+    }
+    return subprocess.Popen(
+        [sys.executable, "serve.py", "--workers", str(workers), "--host", "127.0.0.1", "--port", str(port)],
+        cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_ready(url: str, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Сервер не ответил за {timeout} с")
+
+
+async def _load(url: str, duration: float, connections: int) -> int:
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(limits=limits, timeout=10) as client:
+        async def worker() -> int:
+            done = 0
+            while time.monotonic() < deadline:
+                response = await client.get(url)
+                if response.status_code == 200:
+                    done += 1
+            return done
+
+        return sum(await asyncio.gather(*(worker() for _ in range(connections))))
+
+
+def generate_load(url: str, duration: float, connections: int) -> int:
+    """Нагрузка из одного клиентского процесса; возвращает число успешных ответов"""
+    return asyncio.run(_load(url, duration, connections))
+
+
+def measure(workers: int, args) -> float:
+    """Запускает сервер с ``workers`` воркерами и возвращает запросов в секунду"""
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory(prefix="fluxo-bench-") as data_dir:
+        server = start_server(workers, port, data_dir)
+        try:
+            wait_ready(base_url + "/health")
+            # Прогрев: все воркеры приняли соединения и заполнили кеши
+            generate_load(base_url + args.path, 1, args.connections)
+            with ProcessPoolExecutor(args.clients) as pool:
+                futures = [
+                    pool.submit(generate_load, base_url + args.path, args.duration, args.connections)
+                    for _ in range(args.clients)
+                ]
+                total = sum(future.result() for future in futures)
+        finally:
+            server.terminate()
+            server.wait(timeout=60)
+    return total / args.duration
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="число воркеров через запятую")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--clients", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--connections", type=int, default=32, help="соединений на клиентский процесс")
+    parser.add_argument("--path", default="/health")
+    args = parser.parse_args()
+
+    counts = [int(value) for value in args.workers.split(",")]
+    print(f"Маршрут {args.path}, ядер: {os.cpu_count()}, клиентов: {args.clients} x {args.connections} соединений")
+    baseline = None
+    for workers in counts:
+        rate = measure(workers, args)
+        baseline = baseline or rate
+        print(f"воркеров {workers:>3}  {rate:>10.0f} запр/с  x{rate / baseline:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Подбор параметров хеширования паролей под текущую машину
+Использование: python calibrate_password_hash.py [--target-ms 250] [--scheme bcrypt|argon2] [--write ../.env]
+
+Запускайте на том же железе, где работает API. Найденные параметры
+выводятся в формате .env (или записываются в файл с --write). Пароли
+пользователей перехешируются с новыми параметрами при следующем входе.
+"""
+
+import sys
+import os
+import re
+import argparse
+
+# Добавляем текущую директорию в путь для импорта модулей
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from passlib.exc import MissingBackendError
+from core.password_hashing import (
+    ARGON2_MEMORY_COST,
+    ARGON2_PARALLELISM,
+    PASSWORD_HASH_SCHEME,
+    PASSWORD_HASH_TARGET_MS,
+    calibrate_argon2,
+    calibrate_bcrypt,
+)
+
+
+def write_env(path: str, values: dict) -> None:
+    """Обновляет переменные в .env файле, добавляя отсутствующие в конец"""
+    lines = []
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as env_file:
+            lines = env_file.read().splitlines()
+
+    for key, value in values.items():
+        pattern = re.compile(rf"^{key}=")
+        for index, line in enumerate(lines):
+            if pattern.match(line):
+                lines[index] = f"{key}={value}"
+                break
+        else:
+            lines.append(f"{key}={value}")
+
+    with open(path, "w", encoding="utf-8") as env_file:
+        env_file.write("\n".join(lines) + "\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target-ms", type=float, default=PASSWORD_HASH_TARGET_MS)
+    parser.add_argument("--scheme", choices=["bcrypt", "argon2"], default=PASSWORD_HASH_SCHEME)
+    parser.add_argument("--memory-cost", type=int, default=ARGON2_MEMORY_COST, help="Максимум памяти argon2, КиБ")
+    parser.add_argument("--parallelism", type=int, default=ARGON2_PARALLELISM)
+    parser.add_argument("--write", metavar="ENV_FILE", help="Записать параметры в .env файл")
+    args = parser.parse_args()
+
+    print(f"⏱  Калибровка {args.scheme}, цель {args.target_ms:.0f} мс на проверку пароля...")
+    values = {"PASSWORD_HASH_SCHEME": args.scheme, "PASSWORD_HASH_TARGET_MS": f"{args.target_ms:g}"}
+    if args.scheme == "argon2":
+        try:
+            time_cost, memory_cost, elapsed = calibrate_argon2(args.target_ms, args.memory_cost, args.parallelism)
+        except MissingBackendError:
+            print("❌ Для argon2 установите пакет argon2-cffi")
+            sys.exit(1)
+        values.update({
+            "ARGON2_TIME_COST": time_cost,
+            "ARGON2_MEMORY_COST": memory_cost,
+            "ARGON2_PARALLELISM": args.parallelism,
+        })
+    else:
+        rounds, elapsed = calibrate_bcrypt(args.target_ms)
+        values["BCRYPT_ROUNDS"] = rounds
+
+    print(f"✅ Проверка пароля занимает {elapsed:.0f} мс")
+    if elapsed > args.target_ms:
+        print("⚠️  Даже минимальные параметры дольше цели - оставлены минимально допустимые")
+
+    if args.write:
+        write_env(args.write, values)
+        print(f"📝 Параметры записаны в {args.write}")
+    else:
+        for key, value in values.items():
+            print(f"{key}={value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,45 @@
 import os
+import uuid
 import random
 import string
 import logging
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import HTTPException, status
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 from models.user import User
 from models.email_verification import EmailVerificationCode
 from schemas.user import UserCreate
-from services.email_service import send_verification_email, send_welcome_email
+from core.metrics import PASSWORD_HASH_DURATION, QUOTA_DENIALS
+from core.password_hashing import check_password, hash_password, password_hasher
+from core.rate_limit import VERIFICATION_CODES_LIMIT, rate_limiter
+from core.revocation import revocation_list
+from core.token_cache import verified_tokens
+from core.token_versions import token_versions
+from core.user_cache import user_cache
+from services.email_outbox import enqueue_email
+from services.email_service import build_email
 
 # Настройка логирования
 logger = logging.getLogger(__name__)
 
-# Конфигурация для хеширования паролей
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # Конфигурация JWT
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS") or 30)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Проверяет пароль"""
-    return pwd_context.verify(plain_password, hashed_password)
+    """Проверяет пароль (синхронно; в обработчиках запросов используйте password_hasher)"""
+    with PASSWORD_HASH_DURATION.labels("verify").time():
+        return check_password(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    """Хеширует пароль"""
-    return pwd_context.hash(password)
+    """Хеширует пароль (синхронно; в обработчиках запросов используйте password_hasher)"""
+    with PASSWORD_HASH_DURATION.labels("hash").time():
+        return hash_password(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Создает JWT токен"""
@@ -43,31 +52,140 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str) -> Optional[str]:
-    """Проверяет JWT токен и возвращает email пользователя"""
+def create_user_token(user: User, expires_delta: Optional[timedelta] = None) -> str:
+    """Создает JWT с данными пользователя, достаточными для проверки без БД"""
+    return create_access_token(
+        data={
+            "sub": user.email,
+            "uid": user.id,
+            "email_confirmed": user.is_email_confirmed,
+            "ver": user.token_version,
+            "jti": uuid.uuid4().hex,
+        },
+        expires_delta=expires_delta,
+    )
+
+def create_refresh_token(user: User) -> str:
+    """Создает долгоживущий refresh-токен; он одноразовый и меняется при каждом обновлении"""
+    return create_access_token(
+        data={
+            "sub": user.email,
+            "uid": user.id,
+            "ver": user.token_version,
+            "jti": uuid.uuid4().hex,
+            "type": "refresh",
+        },
+        expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    )
+
+def create_token_pair(user: User) -> dict:
+    """Выдает access- и refresh-токены (ответ /auth/login и /auth/refresh)"""
+    return {
+        "access_token": create_user_token(user, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)),
+        "refresh_token": create_refresh_token(user),
+        "token_type": "bearer",
+    }
+
+def decode_access_token(token: str) -> Optional[dict]:
+    """Проверяет подпись и срок JWT токена и возвращает его payload.
+
+    Payload уже проверенных токенов берется из кеша; он общий для всех
+    запросов с этим токеном, поэтому изменять его нельзя.
+    """
+    payload = verified_tokens.get(token)
+    if payload is not None:
+        return payload
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    if payload.get("sub") is None or payload.get("type") == "refresh":
+        return None
+    verified_tokens.put(token, payload)
+    return payload
+
+def decode_refresh_token(token: str) -> Optional[dict]:
+    """Проверяет refresh-токен; access-токены здесь не принимаются"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            return None
-        return email
     except JWTError:
         return None
+    if payload.get("type") != "refresh" or not {"uid", "jti", "ver"} <= payload.keys():
+        return None
+    return payload
+
+def token_expires_at(payload: dict) -> datetime:
+    return datetime.utcfromtimestamp(payload["exp"])
+
+def revoke_user_tokens(db: Session, user: User) -> None:
+    """Отзывает все выданные пользователю токены, увеличивая token_version"""
+    user.token_version = User.token_version + 1
+    db.commit()
+    db.refresh(user)
+    user_cache.invalidate(user.id)
+    token_versions.invalidate(user.id)
+    token_versions.set(user.id, user.token_version)
+    verified_tokens.purge_subject(user.email)
+
+def rotate_refresh_token(db: Session, refresh_token: str) -> dict:
+    """Обменивает refresh-токен на новую пару токенов без проверки пароля.
+
+    Старый refresh-токен отзывается. Повторное предъявление уже отозванного
+    токена означает, что его, скорее всего, украли: тогда отзываются все
+    токены пользователя.
+    """
+    invalid = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Неверный refresh-токен",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    payload = decode_refresh_token(refresh_token)
+    if payload is None:
+        raise invalid
+
+    user = db.query(User).filter(User.id == payload["uid"]).first()
+    if user is None or payload["ver"] != user.token_version:
+        raise invalid
+
+    if not revocation_list.revoke(db, payload["jti"], user.id, token_expires_at(payload)):
+        logger.warning("Повторное использование refresh-токена, все сессии отозваны", extra={"user_id": user.id})
+        revoke_user_tokens(db, user)
+        raise invalid
+
+    return create_token_pair(user)
+
+def verify_token(token: str) -> Optional[str]:
+    """Проверяет JWT токен и возвращает email пользователя"""
+    payload = decode_access_token(token)
+    if payload is None:
+        return None
+    return payload["sub"]
 
 def get_user_by_email(db: Session, email: str) -> Optional[User]:
     """Получает пользователя по email"""
     return db.query(User).filter(User.email == email).first()
 
-def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
+async def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
     """Аутентифицирует пользователя"""
     user = get_user_by_email(db, email)
     if not user:
         return None
-    if not verify_password(password, user.password_hash):
+    valid, new_hash = await password_hasher.verify_and_update(password, user.password_hash)
+    if not valid:
         return None
+    if new_hash:
+        # Хеш создан со старыми параметрами - перехешируем, пока знаем пароль
+        user.password_hash = new_hash
+        try:
+            db.commit()
+            logger.info("Пароль перехеширован с новыми параметрами", extra={"user_id": user.id})
+        except SQLAlchemyError:
+            # Вход не должен падать из-за перехеширования: попробуем в следующий раз
+            db.rollback()
+            logger.warning("Не удалось сохранить перехешированный пароль", extra={"user_id": user.id}, exc_info=True)
     return user
 
-def create_user(db: Session, user: UserCreate) -> User:
+async def create_user(db: Session, user: UserCreate) -> User:
     """Создает нового пользователя"""
     # Проверяем, что пользователь с таким email не существует
     if get_user_by_email(db, user.email):
@@ -77,7 +195,7 @@ def create_user(db: Session, user: UserCreate) -> User:
         )
 
     # Хешируем пароль
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await password_hasher.hash(user.password)
 
     # Создаем пользователя
     db_user = User(
@@ -92,29 +210,29 @@ def create_user(db: Session, user: UserCreate) -> User:
 
     return db_user
 
-def change_user_password(db: Session, user: User, current_password: str, new_password: str) -> bool:
+async def change_user_password(db: Session, user: User, current_password: str, new_password: str) -> bool:
     """Изменяет пароль пользователя"""
     # Проверяем текущий пароль
-    if not verify_password(current_password, user.password_hash):
+    if not await password_hasher.verify(current_password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Неверный текущий пароль"
         )
     
-    # Проверяем, что новый пароль отличается от текущего
-    if verify_password(new_password, user.password_hash):
+    # Проверяем, что новый пароль отличается от текущего. Текущий пароль уже
+    # подтвержден, поэтому достаточно сравнить строки без второго bcrypt
+    if new_password == current_password:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Новый пароль должен отличаться от текущего"
         )
     
     # Хешируем новый пароль
-    new_password_hash = get_password_hash(new_password)
+    new_password_hash = await password_hasher.hash(new_password)
     
-    # Обновляем пароль
+    # Обновляем пароль и отзываем выданные ранее токены
     user.password_hash = new_password_hash
-    db.commit()
-    db.refresh(user)
+    revoke_user_tokens(db, user)
     
     return True
 
@@ -123,15 +241,12 @@ def generate_verification_code() -> str:
     return ''.join(random.choices(string.digits, k=6))
 
 def create_verification_code(db: Session, user: User) -> str:
-    """Создает новый код подтверждения для пользователя"""
-    # Деактивируем все старые коды
-    old_codes = db.query(EmailVerificationCode).filter(
+    """Создает новый код подтверждения для пользователя; коммит выполняет вызывающий код"""
+    # Деактивируем все старые коды одним UPDATE, без загрузки объектов
+    db.query(EmailVerificationCode).filter(
         EmailVerificationCode.user_id == user.id,
         EmailVerificationCode.is_used == False
-    ).all()
-    
-    for code in old_codes:
-        code.is_used = True
+    ).update({EmailVerificationCode.is_used: True}, synchronize_session=False)
     
     # Генерируем новый код
     verification_code = generate_verification_code()
@@ -145,61 +260,34 @@ def create_verification_code(db: Session, user: User) -> str:
     )
     
     db.add(db_code)
-    db.commit()
-    db.refresh(db_code)
     
     return verification_code
 
 def send_verification_code(db: Session, user: User) -> bool:
     """Отправляет код подтверждения пользователю"""
-    logger.info(f"🔄 Попытка отправки кода подтверждения для пользователя {user.email}")
-    
-    # Проверяем лимит отправок (не более 3 в час)
-    one_hour_ago = datetime.utcnow() - timedelta(hours=1)
-    recent_codes = db.query(EmailVerificationCode).filter(
-        EmailVerificationCode.user_id == user.id,
-        EmailVerificationCode.created_at > one_hour_ago
-    ).count()
+    logger.info("Отправка кода подтверждения", extra={"user_id": user.id})
     
-    logger.info(f"📊 Количество кодов за последний час: {recent_codes}/3")
-    
-    if recent_codes >= 3:
-        logger.warning(f"⚠️ Превышен лимит отправки для пользователя {user.email}")
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+    # Проверяем лимит отправок (по умолчанию не более 3 в час) без запроса к БД
+    try:
+        rate_limiter.check(
+            VERIFICATION_CODES_LIMIT,
+            str(user.id),
             detail="Превышен лимит отправки кодов подтверждения. Попробуйте через час."
         )
+    except HTTPException:
+        QUOTA_DENIALS.labels("verification_codes").inc()
+        logger.warning("Превышен лимит отправки кодов подтверждения", extra={"user_id": user.id})
+        raise
     
-    # Создаем новый код
-    logger.info("🎲 Генерируем новый код подтверждения...")
+    # Код и письмо с ним сохраняются в одной транзакции; письмо отправит
+    # фоновый воркер, поэтому ответ не ждет почтовый сервис
+    user_id = user.id
     verification_code = create_verification_code(db, user)
-    logger.info(f"✨ Код создан: {verification_code}")
+    enqueue_email(db, "verification", build_email("verification", user.email, user.name, code=verification_code))
+    db.commit()
     
-    # Отправляем email
-    try:
-        logger.info("📧 Начинаем отправку email...")
-        success = send_verification_email(user.email, verification_code, user.name)
-        
-        if not success:
-            logger.error("❌ Функция send_verification_email вернула False")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Не удалось отправить email с кодом подтверждения. Проверьте настройки email сервиса."
-            )
-        
-        logger.info("✅ Код подтверждения успешно отправлен!")
-        return True
-        
-    except HTTPException:
-        # Перебрасываем HTTP исключения как есть
-        raise
-    except Exception as e:
-        logger.error(f"💥 Неожиданная ошибка при отправке кода: {str(e)}")
-        logger.error(f"🔍 Тип ошибки: {type(e).__name__}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Ошибка отправки email: {str(e)}"
-        )
+    logger.info("Код подтверждения поставлен в очередь отправки", extra={"user_id": user_id})
+    return True
 
 def verify_email_code(db: Session, email: str, code: str) -> bool:
     """Проверяет код подтверждения email"""
@@ -238,12 +326,11 @@ def verify_email_code(db: Session, email: str, code: str) -> bool:
     # Подтверждаем email пользователя
     user.is_email_confirmed = True
     
-    db.commit()
+    # Приветственное письмо уходит через очередь вместе с подтверждением
+    user_id = user.id
+    enqueue_email(db, "welcome", build_email("welcome", user.email, user.name))
     
-    # Отправляем приветственное письмо
-    try:
-        send_welcome_email(user.email, user.name)
-    except:
-        pass  # Не критично, если приветственное письмо не отправится
+    db.commit()
+    user_cache.invalidate(user_id)
     
     return True
\ No newline at end of file
@@ -0,0 +1,201 @@
+import os
+import gzip
+import time
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
+from core import server_timing
+from core.metrics import COMPRESSION_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Конфигурация сжатия ответов
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+# Ответы меньше порога не сжимаются: выигрыш меньше заголовков и затрат CPU
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE") or 1024)
+# Тела от этого размера сжимаются в threadpool, чтобы не блокировать event loop
+COMPRESSION_OFFLOAD_SIZE = int(os.getenv("COMPRESSION_OFFLOAD_SIZE") or 65536)
+# Порядок предпочтения при равных q в Accept-Encoding; br и zstd работают,
+# только если установлены пакеты brotli и zstandard
+COMPRESSION_ENCODINGS = os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip")
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL") or 6)
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY") or 4)
+COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL") or 3)
+
+# Типы содержимого, которые имеет смысл сжимать
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/xml", "image/svg+xml")
+
+
+def _gzip(level: int) -> Callable[[bytes], bytes]:
+    # mtime=0: одинаковое тело дает одинаковые байты
+    return lambda body: gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def _brotli(quality: int) -> Callable[[bytes], bytes]:
+    import brotli
+
+    return lambda body: brotli.compress(body, quality=quality)
+
+
+def _zstd(level: int) -> Callable[[bytes], bytes]:
+    import zstandard
+
+    # ZstdCompressor нельзя использовать из нескольких потоков одновременно
+    return lambda body: zstandard.ZstdCompressor(level=level).compress(body)
+
+
+_FACTORIES = {
+    "gzip": lambda: _gzip(COMPRESSION_GZIP_LEVEL),
+    "br": lambda: _brotli(COMPRESSION_BROTLI_QUALITY),
+    "zstd": lambda: _zstd(COMPRESSION_ZSTD_LEVEL),
+}
+
+
+def available_codecs(names: str = COMPRESSION_ENCODINGS) -> Dict[str, Callable[[bytes], bytes]]:
+    """Кодеки из списка, для которых установлены библиотеки, в порядке предпочтения"""
+    codecs = {}
+    for name in (item.strip() for item in names.split(",")):
+        if not name:
+            continue
+        if name not in _FACTORIES:
+            raise ValueError(f"Неизвестное сжатие: {name}")
+        try:
+            codecs[name] = _FACTORIES[name]()
+        except ImportError:
+            logger.info("Сжатие недоступно: не установлена библиотека", extra={"encoding": name})
+    return codecs
+
+
+def negotiate(accept_encoding: str, preferred: List[str]) -> Optional[str]:
+    """Выбирает кодек по Accept-Encoding: наибольший q, при равенстве - порядок ``preferred``"""
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        weights[name] = quality
+    best, best_quality = None, 0.0
+    for name in preferred:
+        quality = weights.get(name, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+def _is_compressible(headers: Dict[bytes, bytes]) -> bool:
+    content_type = headers.get(b"content-type", b"").decode("latin-1").lower()
+    if not content_type.startswith(COMPRESSIBLE_TYPES):
+        return False
+    if b"no-transform" in headers.get(b"cache-control", b"").lower():
+        return False
+    return True
+
+
+def _set_header(headers: List[Tuple[bytes, bytes]], name: bytes, value: bytes) -> None:
+    headers[:] = [(key, item) for key, item in headers if key.lower() != name]
+    headers.append((name, value))
+
+
+def _add_vary(headers: List[Tuple[bytes, bytes]]) -> None:
+    for index, (key, value) in enumerate(headers):
+        if key.lower() == b"vary":
+            if b"accept-encoding" not in value.lower():
+                headers[index] = (key, value + b", Accept-Encoding")
+            return
+    headers.append((b"vary", b"Accept-Encoding"))
+
+
+class CompressionMiddleware:
+    """ASGI middleware, сжимающее ответы gzip, brotli или zstd.
+
+    Сжимаются только ответы целиком (одно сообщение тела) подходящего типа
+    и не меньше ``minimum_size``. Потоковые ответы, уже сжатые ответы и
+    ответы с ``Cache-Control: no-transform`` проходят без изменений.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE, offload_size: int = COMPRESSION_OFFLOAD_SIZE,
+                 encodings: str = COMPRESSION_ENCODINGS):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+        self.codecs = available_codecs(encodings)
+        self.preferred = list(self.codecs)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.codecs:
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = dict(scope["headers"]).get(b"accept-encoding", b"").decode("latin-1")
+        encoding = negotiate(accept_encoding, self.preferred) if accept_encoding else None
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                # Заголовки отправим, когда станет известно тело
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            headers = list(start_message.get("headers", []))
+            header_map = {key.lower(): value for key, value in headers}
+            body = message.get("body", b"")
+            compressible = _is_compressible(header_map) and b"content-encoding" not in header_map
+            if compressible:
+                _add_vary(headers)
+
+            if message.get("more_body", False):
+                # Потоковый ответ: сжатие по частям ломало бы отдачу событий
+                passthrough = True
+                await send({**start_message, "headers": headers})
+                await send(message)
+                return
+
+            if encoding is None or not compressible or len(body) < self.minimum_size:
+                await send({**start_message, "headers": headers})
+                await send(message)
+                return
+
+            compressed = await self._compress(encoding, body)
+            if len(compressed) >= len(body):
+                await send({**start_message, "headers": headers})
+                await send(message)
+                return
+
+            COMPRESSION_BYTES.labels(encoding, "original").inc(len(body))
+            COMPRESSION_BYTES.labels(encoding, "compressed").inc(len(compressed))
+            _set_header(headers, b"content-encoding", encoding.encode())
+            _set_header(headers, b"content-length", str(len(compressed)).encode())
+            etag = header_map.get(b"etag")
+            if etag is not None and not etag.startswith(b"W/"):
+                # Сжатое представление не совпадает побайтно с исходным
+                _set_header(headers, b"etag", b"W/" + etag)
+            await send({**start_message, "headers": headers})
+            await send({**message, "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _compress(self, encoding: str, body: bytes) -> bytes:
+        codec = self.codecs[encoding]
+        started_at = time.perf_counter()
+        if len(body) >= self.offload_size:
+            compressed = await run_in_threadpool(codec, body)
+        else:
+            compressed = codec(body)
+        server_timing.record("compress", time.perf_counter() - started_at)
+        return compressed
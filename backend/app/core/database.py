@@ -1,16 +1,292 @@
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import time
+import logging
+import itertools
+import threading
+from contextvars import ContextVar
+from typing import List, Optional
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.ext.declarative import declarative_base
+from core import server_timing, sql_profiler
+from core.metrics import (
+    DB_STATEMENT_DURATION,
+    DB_POOL_CHECKOUT_WAIT,
+    DB_POOL_CONNECTIONS_IN_USE,
+    DB_POOL_SATURATION,
+    statement_operation,
+)
+
+logger = logging.getLogger(__name__)
 
 # Конфигурация базы данных
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# Реплики только для чтения, через запятую (необязательно)
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# Через сколько секунд повторно проверять недоступную реплику
+DB_REPLICA_RETRY_INTERVAL = float(os.getenv("DB_REPLICA_RETRY_INTERVAL", "30"))
+
+# Настройки пула соединений
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Пересоздаем соединения старше N секунд (-1 - не пересоздавать)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Проверяем соединение перед выдачей, чтобы пережить рестарт Postgres
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Серверный statement_timeout в миллисекундах (0 - без ограничения)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+# Режим совместимости с PgBouncer (transaction pooling): без состояния на уровне сессии
+DB_PGBOUNCER_MODE = os.getenv("DB_PGBOUNCER_MODE", "false").lower() == "true"
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool, измеряющий время ожидания свободного соединения"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+
+
+# Время выполнения SQL-выражений измеряем для всех движков, включая тестовые,
+# и передаем в метрики, Server-Timing и профилировщик запросов
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    DB_STATEMENT_DURATION.labels(statement_operation(statement)).observe(elapsed)
+    server_timing.record("db", elapsed)
+    sql_profiler.record(statement, parameters, elapsed)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    # Выражение упало: убираем его отметку времени, чтобы стек не рос
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start_time"):
+        conn.info["query_start_time"].pop()
+
+
+def engine_options(
+    url: str,
+    pool_size: int = DB_POOL_SIZE,
+    max_overflow: int = DB_MAX_OVERFLOW,
+    pool_timeout: float = DB_POOL_TIMEOUT,
+    pool_recycle: int = DB_POOL_RECYCLE,
+    pool_pre_ping: bool = DB_POOL_PRE_PING,
+    statement_timeout_ms: int = DB_STATEMENT_TIMEOUT_MS,
+    pgbouncer_mode: bool = DB_PGBOUNCER_MODE,
+) -> dict:
+    """Параметры create_engine для заданного URL.
+
+    SQLite (тесты) использует собственный пул и не поддерживает
+    statement_timeout, поэтому для него параметры не задаются.
+    """
+    if not url or url.startswith("sqlite"):
+        return {}
+
+    options = {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": pool_timeout,
+        "pool_recycle": pool_recycle,
+        "pool_pre_ping": pool_pre_ping,
+    }
+
+    # В обычном режиме statement_timeout задается параметром подключения.
+    # PgBouncer в режиме transaction pooling не пропускает такие параметры
+    # и смешивает сессии, поэтому там таймаут ставится через SET LOCAL
+    if statement_timeout_ms > 0 and not pgbouncer_mode:
+        options["connect_args"] = {"options": f"-c statement_timeout={statement_timeout_ms}"}
+
+    return options
+
+
+def instrument_pool(engine: Engine, capacity: int) -> None:
+    """Публикует число занятых соединений и заполненность пула в метриках"""
+
+    def _update(in_use: int) -> None:
+        DB_POOL_CONNECTIONS_IN_USE.set(in_use)
+        DB_POOL_SATURATION.set(in_use / capacity if capacity else 0)
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        _update(engine.pool.checkedout())
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        # Событие приходит до того, как пул уменьшит счетчик выданных соединений
+        _update(max(engine.pool.checkedout() - 1, 0))
+
+
+def set_transaction_timeout(engine: Engine, statement_timeout_ms: int) -> None:
+    """Устанавливает statement_timeout в начале каждой транзакции (режим PgBouncer)"""
+
+    @event.listens_for(engine, "begin")
+    def _set_local_timeout(conn):
+        conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(statement_timeout_ms)}")
+
+
+def build_engine(url: str, **overrides) -> Engine:
+    """Создает движок с настройками пула и таймаутов из конфигурации"""
+    options = engine_options(url, **overrides)
+    engine = create_engine(url, **options)
+
+    if options:
+        instrument_pool(engine, options["pool_size"] + options["max_overflow"])
+        statement_timeout_ms = overrides.get("statement_timeout_ms", DB_STATEMENT_TIMEOUT_MS)
+        if overrides.get("pgbouncer_mode", DB_PGBOUNCER_MODE) and statement_timeout_ms > 0:
+            set_transaction_timeout(engine, statement_timeout_ms)
+
+    return engine
+
+
 # Создание движка базы данных
-engine = create_engine(DATABASE_URL)
+engine = build_engine(DATABASE_URL)
+
+class ReplicaSet:
+    """Набор реплик с round robin и временным исключением недоступных.
+
+    Реплика, на которой случился обрыв соединения, исключается на
+    ``retry_interval`` секунд, после чего перед возвратом в ротацию
+    проверяется запросом ``SELECT 1``.
+    """
+
+    def __init__(self, engines: List[Engine], retry_interval: float = DB_REPLICA_RETRY_INTERVAL):
+        self.engines = engines
+        self.retry_interval = retry_interval
+        self._unhealthy_until = {}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+        for replica in engines:
+            event.listen(replica, "handle_error", self._on_error)
+
+    def _on_error(self, exception_context) -> None:
+        if exception_context.is_disconnect or exception_context.connection is None:
+            self.mark_unhealthy(exception_context.engine)
+
+    def mark_unhealthy(self, replica: Engine) -> None:
+        with self._lock:
+            self._unhealthy_until[replica] = time.monotonic() + self.retry_interval
+        logger.warning("Реплика БД исключена из ротации", extra={"replica": replica.url.render_as_string()})
+
+    def is_healthy(self, replica: Engine) -> bool:
+        until = self._unhealthy_until.get(replica)
+        if until is None:
+            return True
+        if time.monotonic() < until:
+            return False
+
+        try:
+            with replica.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        except Exception:
+            self.mark_unhealthy(replica)
+            return False
+
+        with self._lock:
+            self._unhealthy_until.pop(replica, None)
+        logger.info("Реплика БД возвращена в ротацию", extra={"replica": replica.url.render_as_string()})
+        return True
+
+    def choose(self) -> Optional[Engine]:
+        """Следующая доступная реплика или None, если доступных нет"""
+        for _ in range(len(self.engines)):
+            replica = self.engines[next(self._counter) % len(self.engines)]
+            if self.is_healthy(replica):
+                return replica
+        return None
+
+
+class RequestDbState:
+    """Состояние запроса: была ли уже запись в основную БД"""
+
+    __slots__ = ("wrote",)
+
+    def __init__(self):
+        self.wrote = False
+
+
+# Объект изменяемый, поэтому отметка о записи из потока threadpool видна
+# всем сессиям этого запроса
+_request_db_state: ContextVar[Optional[RequestDbState]] = ContextVar("request_db_state", default=None)
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_request_wrote(session, flush_context):
+    state = _request_db_state.get()
+    if state is not None:
+        state.wrote = True
+    session.info["wrote"] = True
+
+
+class RoutingSession(Session):
+    """Сессия, читающая с реплик, пока в запросе не было записи.
+
+    Flush всегда идет в основную БД. После первой записи в запросе все
+    чтения тоже идут в основную БД, чтобы запрос видел свои изменения.
+    """
+
+    def __init__(self, *args, primary: Engine = None, replicas: Optional[ReplicaSet] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.primary = primary
+        self.replicas = replicas
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.replicas is None or self._flushing or self.info.get("wrote"):
+            return self.primary
+        state = _request_db_state.get()
+        if state is not None and state.wrote:
+            return self.primary
+        return self.replicas.choose() or self.primary
+
+
+class DatabaseRoutingMiddleware:
+    """ASGI middleware: отдельное состояние маршрутизации на каждый запрос"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = _request_db_state.set(RequestDbState())
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_db_state.reset(token)
+
+
+def make_read_sessionmaker(primary: Engine, replicas: Optional[ReplicaSet]) -> sessionmaker:
+    """Фабрика сессий для эндпоинтов только на чтение"""
+    return sessionmaker(
+        class_=RoutingSession,
+        autocommit=False,
+        autoflush=False,
+        primary=primary,
+        replicas=replicas,
+    )
+
+
+replica_set = ReplicaSet([build_engine(url) for url in DATABASE_REPLICA_URLS]) if DATABASE_REPLICA_URLS else None
 
 # Создание сессии
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = make_read_sessionmaker(engine, replica_set)
 
 # Базовый класс для моделей
 Base = declarative_base()
@@ -23,6 +299,19 @@ def get_db():
     finally:
         db.close()
 
+# Сессия для зависимостей только на чтение: реплика, если она настроена
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Фабрика сессий для долгих соединений (WebSocket): сессия открывается на
+# каждую операцию, а не держит соединение пула все время подключения
+def get_sessionmaker() -> sessionmaker:
+    return SessionLocal
+
 # Функция для создания таблиц
 def create_tables():
     # Импортируем все модели чтобы они были зарегистрированы в Base.metadata
@@ -31,22 +320,22 @@ def create_tables():
         User, 
         PromptStyle, 
         PromptRequest, 
-        EmailVerificationCode
+        EmailVerificationCode,
+        RevokedToken,
+        EmailOutbox
     )
     
-    print("🔧 Создание таблиц в базе данных...")
-    print(f"📋 Найдено моделей для создания: {len(Base.metadata.tables)}")
-    
-    # Выводим список таблиц которые будут созданы
-    for table_name in Base.metadata.tables.keys():
-        print(f"  - {table_name}")
+    logger.info(
+        "Создание таблиц в базе данных",
+        extra={"tables": sorted(Base.metadata.tables.keys())}
+    )
     
     Base.metadata.create_all(bind=engine)
-    print("✅ Все таблицы успешно созданы!")
+    logger.info("Все таблицы успешно созданы")
     
     # Инициализируем начальные данные
     from core.seed_data import seed_initial_data
     try:
         seed_initial_data()
-    except Exception as e:
-        print(f"⚠️ Предупреждение при инициализации данных: {e}")
\ No newline at end of file
+    except Exception:
+        logger.warning("Предупреждение при инициализации данных", exc_info=True)
\ No newline at end of file
@@ -0,0 +1,154 @@
+import os
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, NamedTuple, Set
+from starlette.websockets import WebSocket, WebSocketDisconnect
+from core.metrics import LIVE_DISCONNECTS, LIVE_MESSAGES
+
+logger = logging.getLogger(__name__)
+
+# Конфигурация канала /ws
+# Сколько ждать сообщения с токеном после открытия соединения
+LIVE_AUTH_TIMEOUT_SECONDS = float(os.getenv("LIVE_AUTH_TIMEOUT_SECONDS") or 10)
+# Одновременных генераций в одном соединении
+LIVE_MAX_INFLIGHT = int(os.getenv("LIVE_MAX_INFLIGHT") or 3)
+# Сообщений в очереди отправки одного соединения; пока очередь полна,
+# генерации ждут и не читают дальше ответ OpenRouter
+LIVE_SEND_QUEUE_SIZE = int(os.getenv("LIVE_SEND_QUEUE_SIZE") or 64)
+# Сколько ждать места в очереди, прежде чем закрыть соединение с зависшим клиентом
+LIVE_SEND_TIMEOUT_SECONDS = float(os.getenv("LIVE_SEND_TIMEOUT_SECONDS") or 30)
+
+# Коды закрытия WebSocket
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_SLOW_CONSUMER = 1013
+
+
+class SlowConsumer(Exception):
+    """Клиент не забирает сообщения: соединение будет закрыто"""
+
+
+class _Close(NamedTuple):
+    code: int
+    reason: str
+
+
+class LiveConnection:
+    """Исходящая очередь одного WebSocket и задачи приема и отправки.
+
+    Генерации кладут сообщения через ``send`` и ждут, пока в очереди нет
+    места: медленный клиент притормаживает чтение ответа OpenRouter, а не
+    копит фрагменты в памяти воркера. Уведомления из других соединений
+    кладутся через ``push`` без ожидания; если клиент не успевает забирать
+    и их, соединение закрывается, и клиент переподключается.
+    """
+
+    def __init__(self, websocket: WebSocket, user_id: int, queue_size: int = LIVE_SEND_QUEUE_SIZE,
+                 send_timeout: float = LIVE_SEND_TIMEOUT_SECONDS):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.send_timeout = send_timeout
+        self._queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self._overflowed = asyncio.Event()
+
+    async def send(self, message: dict) -> None:
+        try:
+            await asyncio.wait_for(self._queue.put(message), self.send_timeout)
+        except asyncio.TimeoutError:
+            self._overflowed.set()
+            raise SlowConsumer()
+
+    def push(self, message: dict) -> bool:
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self._overflowed.set()
+            return False
+        return True
+
+    async def close_after_sent(self, code: int, reason: str) -> None:
+        """Закрывает соединение после отправки уже поставленных в очередь сообщений"""
+        await self.send(_Close(code, reason))
+
+    async def serve(self, handle: Callable[[str], Awaitable[None]]) -> None:
+        """Принимает сообщения и отправляет очередь, пока клиент не отключится"""
+        sender = asyncio.create_task(self._send_loop())
+        receiver = asyncio.create_task(self._receive_loop(handle))
+        overflowed = asyncio.create_task(self._overflowed.wait())
+        tasks = {sender, receiver, overflowed}
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        if overflowed in done:
+            LIVE_DISCONNECTS.labels("slow_consumer").inc()
+            logger.info("Клиент не успевает получать сообщения", extra={"user_id": self.user_id})
+            await self.close(CLOSE_SLOW_CONSUMER, "Клиент не успевает получать сообщения")
+            return
+        for task in done:
+            error = task.exception()
+            if error is not None and not isinstance(error, WebSocketDisconnect):
+                LIVE_DISCONNECTS.labels("error").inc()
+                raise error
+        LIVE_DISCONNECTS.labels("server" if sender in done and sender.exception() is None else "client").inc()
+
+    async def close(self, code: int, reason: str = "") -> None:
+        try:
+            await self.websocket.close(code, reason)
+        except RuntimeError:
+            # Соединение уже закрыто клиентом
+            pass
+
+    async def _send_loop(self) -> None:
+        while True:
+            message = await self._queue.get()
+            if isinstance(message, _Close):
+                await self.close(message.code, message.reason)
+                return
+            await self.websocket.send_json(message)
+            LIVE_MESSAGES.labels("out", message["type"]).inc()
+
+    async def _receive_loop(self, handle: Callable[[str], Awaitable[None]]) -> None:
+        while True:
+            await handle(await self.websocket.receive_text())
+
+
+class LiveHub:
+    """Открытые соединения воркера по пользователям.
+
+    Рассылка работает в пределах воркера: вкладки, подключенные к другим
+    воркерам, получат изменения при следующем /me/bootstrap.
+    """
+
+    def __init__(self):
+        self._connections: Dict[int, Set[LiveConnection]] = defaultdict(set)
+
+    def add(self, connection: LiveConnection) -> None:
+        self._connections[connection.user_id].add(connection)
+
+    def remove(self, connection: LiveConnection) -> None:
+        connections = self._connections.get(connection.user_id)
+        if connections is None:
+            return
+        connections.discard(connection)
+        if not connections:
+            del self._connections[connection.user_id]
+
+    def has(self, user_id: int) -> bool:
+        return user_id in self._connections
+
+    def publish(self, user_id: int, *messages: dict) -> None:
+        """Кладет сообщения в очереди всех соединений пользователя, не дожидаясь отправки"""
+        for connection in list(self._connections.get(user_id, ())):
+            for message in messages:
+                if not connection.push(message):
+                    break
+
+    def __len__(self) -> int:
+        return sum(len(connections) for connections in self._connections.values())
+
+
+live_hub = LiveHub()
@@ -0,0 +1,190 @@
+import os
+import sys
+import copy
+import json
+import time
+import queue
+import random
+import atexit
+import logging
+import threading
+import logging.handlers
+from datetime import datetime, timezone
+from typing import Optional
+
+# Конфигурация логирования
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Уровни для отдельных логгеров: "core.auth=DEBUG,sqlalchemy.engine=WARNING"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+# Формат вывода: json для продакшена, text для локальной разработки
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Отладочное логирование тел запросов: доля семплирования и потолок в минуту
+LOG_BODY_SAMPLE_RATE = float(os.getenv("LOG_BODY_SAMPLE_RATE", "0.01"))
+LOG_BODY_MAX_PER_MINUTE = int(os.getenv("LOG_BODY_MAX_PER_MINUTE", "60"))
+LOG_BODY_MAX_LENGTH = int(os.getenv("LOG_BODY_MAX_LENGTH", "2000"))
+
+# Стандартные атрибуты LogRecord, которые не попадают в JSON как extra-поля
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_setup_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """Форматирует запись лога в одну JSON-строку"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+
+        # Поля, переданные через extra=...
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = value
+
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который никогда не блокирует вызывающий поток.
+
+    При переполнении очереди запись отбрасывается и учитывается в счетчике,
+    вместо того чтобы писать трейсбек в stderr.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Сохраняем extra-поля и трейсбек отдельно, чтобы форматтер в
+        # потоке слушателя мог собрать полноценную JSON-запись
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BodySampler:
+    """Семплирование и ограничение частоты логирования тел запросов.
+
+    Сначала применяется вероятностное семплирование, затем token bucket
+    на ``max_per_minute`` записей, чтобы всплеск трафика не заполнил очередь.
+    """
+
+    def __init__(self, sample_rate: float, max_per_minute: int):
+        self.sample_rate = sample_rate
+        self.capacity = float(max_per_minute)
+        self.tokens = float(max_per_minute)
+        self.refill_per_second = max_per_minute / 60.0
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def should_log(self) -> bool:
+        if self.sample_rate <= 0 or self.capacity <= 0:
+            return False
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return False
+
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+            self.updated_at = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+body_sampler = BodySampler(LOG_BODY_SAMPLE_RATE, LOG_BODY_MAX_PER_MINUTE)
+
+
+def log_request_body(logger: logging.Logger, body, **fields) -> None:
+    """Логирует тело запроса на уровне DEBUG с семплированием"""
+    if not logger.isEnabledFor(logging.DEBUG) or not body_sampler.should_log():
+        return
+
+    text = body if isinstance(body, str) else json.dumps(body, ensure_ascii=False, default=str)
+    if len(text) > LOG_BODY_MAX_LENGTH:
+        text = text[:LOG_BODY_MAX_LENGTH] + "…"
+
+    logger.debug("Тело запроса", extra={"body": text, **fields})
+
+
+def parse_logger_levels(spec: str) -> dict:
+    """Разбирает строку вида "core.auth=DEBUG,httpx=WARNING" в словарь уровней"""
+    levels = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item or "=" not in item:
+            continue
+        name, level = item.split("=", 1)
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(stream=None) -> logging.handlers.QueueListener:
+    """Настраивает корневой логгер: запись в очередь, вывод в отдельном потоке.
+
+    Повторный вызов возвращает уже запущенный слушатель.
+    """
+    global _listener
+
+    with _setup_lock:
+        if _listener is not None:
+            return _listener
+
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+
+        output = logging.StreamHandler(stream or sys.stdout)
+        if LOG_FORMAT == "json":
+            output.setFormatter(JsonFormatter())
+        else:
+            output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s"))
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            if isinstance(handler, NonBlockingQueueHandler):
+                root.removeHandler(handler)
+        root.addHandler(NonBlockingQueueHandler(log_queue))
+        root.setLevel(LOG_LEVEL)
+
+        for name, level in parse_logger_levels(LOG_LEVELS).items():
+            logging.getLogger(name).setLevel(level)
+
+        _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+        return _listener
+
+
+def shutdown_logging() -> None:
+    """Останавливает слушатель, дописывая оставшиеся в очереди записи"""
+    global _listener
+
+    with _setup_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,211 @@
+import os
+import math
+import time
+import logging
+import threading
+from collections import OrderedDict
+from fastapi import HTTPException, status
+from core.metrics import LOGIN_THROTTLE_LOCKOUTS, LOGIN_THROTTLE_REJECTED
+from core.shared_state import shared_state
+
+logger = logging.getLogger(__name__)
+
+# Конфигурация ограничения попыток входа
+LOGIN_THROTTLE_ENABLED = os.getenv("LOGIN_THROTTLE_ENABLED", "true").lower() == "true"
+# С одного IP учитываются все попытки: так отсекается перебор по множеству аккаунтов
+LOGIN_IP_MAX_ATTEMPTS = int(os.getenv("LOGIN_IP_MAX_ATTEMPTS") or 30)
+LOGIN_IP_WINDOW_SECONDS = float(os.getenv("LOGIN_IP_WINDOW_SECONDS") or 60)
+# Для аккаунта учитываются только неудачные попытки; успешный вход сбрасывает счетчик
+LOGIN_ACCOUNT_MAX_FAILURES = int(os.getenv("LOGIN_ACCOUNT_MAX_FAILURES") or 5)
+LOGIN_ACCOUNT_WINDOW_SECONDS = float(os.getenv("LOGIN_ACCOUNT_WINDOW_SECONDS") or 300)
+# Блокировка удваивается при каждом повторном превышении лимита
+LOGIN_LOCKOUT_BASE_SECONDS = float(os.getenv("LOGIN_LOCKOUT_BASE_SECONDS") or 30)
+LOGIN_LOCKOUT_MAX_SECONDS = float(os.getenv("LOGIN_LOCKOUT_MAX_SECONDS") or 3600)
+# Максимум отслеживаемых ключей на каждый вид лимита; старые вытесняются.
+# При запуске через serve.py счетчики общие для воркеров (SHARED_STATE_SLOTS)
+LOGIN_THROTTLE_MAX_KEYS = int(os.getenv("LOGIN_THROTTLE_MAX_KEYS") or 100000)
+
+
+class _Counter:
+    __slots__ = ("window_start", "current", "previous", "strikes", "locked_until")
+
+    def __init__(self, now: float):
+        self.window_start = now
+        self.current = 0
+        self.previous = 0
+        self.strikes = 0
+        self.locked_until = 0.0
+
+    @classmethod
+    def from_values(cls, values) -> "_Counter":
+        counter = cls.__new__(cls)
+        counter.window_start, current, previous, strikes, counter.locked_until = values
+        counter.current, counter.previous, counter.strikes = int(current), int(previous), int(strikes)
+        return counter
+
+    def values(self) -> tuple:
+        return (self.window_start, self.current, self.previous, self.strikes, self.locked_until)
+
+
+class SlidingWindowLimiter:
+    """Скользящее окно с экспоненциальной блокировкой.
+
+    Окно приближается двумя счетчиками (текущее и предыдущее окно), поэтому
+    на ключ хранится несколько чисел. Число ключей ограничено ``max_keys``:
+    при переполнении вытесняются давно не обновлявшиеся. С ``table``
+    (SlotTable общего сегмента) счетчики хранятся там и общие для воркеров.
+    """
+
+    def __init__(self, scope: str, limit: int, window: float, lockout_base: float = LOGIN_LOCKOUT_BASE_SECONDS,
+                 lockout_max: float = LOGIN_LOCKOUT_MAX_SECONDS, max_keys: int = LOGIN_THROTTLE_MAX_KEYS, table=None):
+        self.scope = scope
+        self.limit = limit
+        self.window = window
+        self.lockout_base = lockout_base
+        self.lockout_max = lockout_max
+        self.max_keys = max_keys
+        self.table = table
+        self._counters: "OrderedDict[str, _Counter]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _advance(self, counter: _Counter, now: float) -> None:
+        elapsed_windows = int((now - counter.window_start) // self.window)
+        if elapsed_windows >= 1:
+            counter.previous = counter.current if elapsed_windows == 1 else 0
+            counter.current = 0
+            counter.window_start += elapsed_windows * self.window
+        if counter.strikes and now > counter.locked_until + self.lockout_max:
+            # Давно не было нарушений - снова начинаем с базовой блокировки
+            counter.strikes = 0
+
+    def _estimate(self, counter: _Counter, now: float) -> float:
+        weight = 1 - (now - counter.window_start) / self.window
+        return counter.previous * weight + counter.current
+
+    def _register(self, counter: _Counter, now: float) -> float:
+        """Учитывает попытку в счетчике. Возвращает длительность блокировки или 0"""
+        counter.current += 1
+        if self._estimate(counter, now) <= self.limit:
+            return 0.0
+
+        lockout = min(self.lockout_max, self.lockout_base * 2 ** counter.strikes)
+        counter.strikes += 1
+        counter.locked_until = now + lockout
+        # После блокировки окно начинается заново
+        counter.current = counter.previous = 0
+        counter.window_start = now
+        return lockout
+
+    def retry_after(self, key: str, now: float) -> float:
+        """Сколько секунд ключ еще заблокирован (0 - не заблокирован)"""
+        if self.table is not None:
+            values = self.table.get(key)
+            return max(0.0, values[4] - now) if values is not None else 0.0
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None:
+                return 0.0
+            return max(0.0, counter.locked_until - now)
+
+    def hit(self, key: str, now: float) -> float:
+        """Учитывает попытку. Возвращает длительность блокировки, если лимит превышен"""
+        if self.table is not None:
+            def update(values):
+                if values is None:
+                    counter = _Counter(now)
+                else:
+                    counter = _Counter.from_values(values)
+                    self._advance(counter, now)
+                lockout = self._register(counter, now)
+                return counter.values(), lockout
+
+            lockout = self.table.update(key, update)
+        else:
+            with self._lock:
+                counter = self._counters.get(key)
+                if counter is None:
+                    counter = self._counters[key] = _Counter(now)
+                    while len(self._counters) > self.max_keys:
+                        self._counters.popitem(last=False)
+                else:
+                    self._counters.move_to_end(key)
+                    self._advance(counter, now)
+                lockout = self._register(counter, now)
+
+        if not lockout:
+            return 0.0
+        LOGIN_THROTTLE_LOCKOUTS.labels(self.scope).inc()
+        logger.warning("Блокировка попыток входа", extra={"scope": self.scope, "lockout_seconds": lockout})
+        return lockout
+
+    def reset(self, key: str) -> None:
+        if self.table is not None:
+            self.table.delete(key)
+            return
+        with self._lock:
+            self._counters.pop(key, None)
+
+    def clear(self) -> None:
+        if self.table is not None:
+            self.table.clear()
+            return
+        with self._lock:
+            self._counters.clear()
+
+
+def _too_many_attempts(scope: str, retry_after: float) -> HTTPException:
+    LOGIN_THROTTLE_REJECTED.labels(scope).inc()
+    seconds = max(1, math.ceil(retry_after))
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=f"Слишком много попыток входа. Попробуйте через {seconds} сек.",
+        headers={"Retry-After": str(seconds)},
+    )
+
+
+class LoginThrottle:
+    """Ограничение попыток входа до проверки пароля.
+
+    ``check`` вызывается до bcrypt и обращений к БД; результат попытки
+    сообщается через ``record_failure`` / ``record_success``.
+    """
+
+    def __init__(self, enabled: bool = LOGIN_THROTTLE_ENABLED):
+        self.enabled = enabled
+        self.ips = SlidingWindowLimiter(
+            "ip", LOGIN_IP_MAX_ATTEMPTS, LOGIN_IP_WINDOW_SECONDS,
+            table=shared_state.table("login_ip") if shared_state else None,
+        )
+        self.accounts = SlidingWindowLimiter(
+            "account", LOGIN_ACCOUNT_MAX_FAILURES, LOGIN_ACCOUNT_WINDOW_SECONDS,
+            table=shared_state.table("login_account") if shared_state else None,
+        )
+
+    def check(self, ip: str, email: str) -> None:
+        """Пропускает попытку или бросает 429 с Retry-After"""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        email = email.lower()
+
+        account_wait = self.accounts.retry_after(email, now)
+        if account_wait:
+            raise _too_many_attempts("account", account_wait)
+        ip_wait = self.ips.retry_after(ip, now) or self.ips.hit(ip, now)
+        if ip_wait:
+            raise _too_many_attempts("ip", ip_wait)
+
+    def record_failure(self, email: str) -> None:
+        if self.enabled:
+            self.accounts.hit(email.lower(), time.monotonic())
+
+    def record_success(self, email: str) -> None:
+        if self.enabled:
+            self.accounts.reset(email.lower())
+
+    def clear(self) -> None:
+        self.ips.clear()
+        self.accounts.clear()
+
+
+login_throttle = LoginThrottle()
@@ -0,0 +1,227 @@
+import os
+import time
+from fastapi import Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Каталог для файлов метрик при запуске нескольких воркеров uvicorn.
+# prometheus_client сам переключается в multiprocess-режим, если переменная задана
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Бакеты для быстрых операций (БД, ожидание пула) и медленных (upstream, bcrypt, email)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SLOW_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "fluxo_http_request_duration_seconds",
+    "Время обработки HTTP-запроса",
+    ["method", "route", "status"],
+    buckets=FAST_BUCKETS + (5.0, 10.0, 30.0),
+)
+
+UPSTREAM_REQUEST_DURATION = Histogram(
+    "fluxo_upstream_request_duration_seconds",
+    "Время запроса к внешнему API",
+    ["upstream"],
+    buckets=SLOW_BUCKETS,
+)
+
+UPSTREAM_RESPONSES = Counter(
+    "fluxo_upstream_responses_total",
+    "Ответы внешнего API по статусу",
+    ["upstream", "status"],
+)
+
+DB_STATEMENT_DURATION = Histogram(
+    "fluxo_db_statement_duration_seconds",
+    "Время выполнения SQL-выражения",
+    ["operation"],
+    buckets=FAST_BUCKETS,
+)
+
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "fluxo_db_pool_checkout_wait_seconds",
+    "Время ожидания свободного соединения в пуле",
+    buckets=FAST_BUCKETS,
+)
+
+DB_POOL_CONNECTIONS_IN_USE = Gauge(
+    "fluxo_db_pool_connections_in_use",
+    "Число выданных из пула соединений",
+    multiprocess_mode="livesum",
+)
+
+DB_POOL_SATURATION = Gauge(
+    "fluxo_db_pool_saturation_ratio",
+    "Доля занятых соединений от pool_size + max_overflow",
+    multiprocess_mode="livemax",
+)
+
+PASSWORD_HASH_DURATION = Histogram(
+    "fluxo_password_hash_duration_seconds",
+    "Время хеширования и проверки пароля",
+    ["operation"],
+    buckets=SLOW_BUCKETS,
+)
+
+PASSWORD_HASH_QUEUE_DEPTH = Gauge(
+    "fluxo_password_hash_queue_depth",
+    "Операции bcrypt, ожидающие или выполняющиеся в пуле",
+    multiprocess_mode="livesum",
+)
+
+PASSWORD_HASH_REJECTED = Counter(
+    "fluxo_password_hash_rejected_total",
+    "Операции bcrypt, отклоненные из-за переполнения очереди",
+)
+
+EMAIL_SEND_DURATION = Histogram(
+    "fluxo_email_send_duration_seconds",
+    "Время отправки email",
+    ["email_type"],
+    buckets=SLOW_BUCKETS,
+)
+
+EMAIL_OUTBOX_DELIVERIES = Counter(
+    "fluxo_email_outbox_deliveries_total",
+    "Попытки доставки писем из очереди: sent, retry, failed",
+    ["email_type", "result"],
+)
+
+USER_CACHE_REQUESTS = Counter(
+    "fluxo_user_cache_requests_total",
+    "Обращения к кешу пользователей: hit, miss, expired",
+    ["result"],
+)
+
+TOKEN_CACHE_REQUESTS = Counter(
+    "fluxo_token_cache_requests_total",
+    "Обращения к кешу проверенных JWT: hit, miss",
+    ["result"],
+)
+
+TOKEN_REVOCATION_CHECKS = Counter(
+    "fluxo_token_revocation_checks_total",
+    "Проверки отзыва токенов: clear - отсеяно фильтром Блума, revoked и false_positive - после запроса к БД",
+    ["result"],
+)
+
+USER_CACHE_SIZE = Gauge(
+    "fluxo_user_cache_size",
+    "Число пользователей в кеше воркера",
+    multiprocess_mode="livesum",
+)
+
+LOGIN_THROTTLE_REJECTED = Counter(
+    "fluxo_login_throttle_rejected_total",
+    "Попытки входа, отклоненные до проверки пароля",
+    ["scope"],
+)
+
+LOGIN_THROTTLE_LOCKOUTS = Counter(
+    "fluxo_login_throttle_lockouts_total",
+    "Блокировки входа по IP или аккаунту",
+    ["scope"],
+)
+
+RATE_LIMIT_REJECTED = Counter(
+    "fluxo_rate_limit_rejected_total",
+    "Запросы, отклоненные ограничителем частоты",
+    ["policy"],
+)
+
+QUOTA_DENIALS = Counter(
+    "fluxo_quota_denials_total",
+    "Отказы из-за исчерпанных квот",
+    ["quota"],
+)
+
+COMPRESSION_BYTES = Counter(
+    "fluxo_compression_bytes_total",
+    "Размер сжатых ответов до и после сжатия",
+    ["encoding", "kind"],
+)
+
+LIVE_CONNECTIONS = Gauge(
+    "fluxo_live_connections",
+    "Открытые WebSocket-соединения /ws",
+    multiprocess_mode="livesum",
+)
+
+LIVE_MESSAGES = Counter(
+    "fluxo_live_messages_total",
+    "Сообщения WebSocket-соединений /ws",
+    ["direction", "type"],
+)
+
+LIVE_DISCONNECTS = Counter(
+    "fluxo_live_disconnects_total",
+    "Закрытия WebSocket-соединений /ws по причинам",
+    ["reason"],
+)
+
+
+def statement_operation(statement: str) -> str:
+    """Возвращает тип SQL-выражения (SELECT, INSERT, ...) для метки метрики"""
+    head = statement.lstrip().split(None, 1)
+    return head[0].upper() if head else "UNKNOWN"
+
+
+class MetricsMiddleware:
+    """ASGI middleware, измеряющий время обработки запроса по шаблону маршрута.
+
+    Метка route берется из шаблона пути (``/prompts/history``), а не из
+    фактического URL, чтобы количество временных рядов не росло.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUEST_DURATION.labels(scope["method"], route, str(status_code)).observe(
+                time.perf_counter() - start
+            )
+
+
+def mark_worker_stopped() -> None:
+    """Исключает live-метрики остановленного воркера из общего каталога"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def metrics_response() -> Response:
+    """Формирует ответ в текстовом формате Prometheus"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        # Собираем метрики всех воркеров из общего каталога
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,239 @@
+import os
+import time
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Optional, Tuple
+from fastapi import HTTPException, status
+from core.metrics import PASSWORD_HASH_DURATION, PASSWORD_HASH_QUEUE_DEPTH, PASSWORD_HASH_REJECTED
+
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
+logger = logging.getLogger(__name__)
+
+# Где выполнять bcrypt: process - отдельные процессы, thread - потоки
+# (bcrypt отпускает GIL, но потоки делят процессор с event loop)
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "process").lower()
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS") or os.cpu_count() or 1)
+# Сколько операций может ждать или выполняться одновременно; сверх этого - 503
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING") or PASSWORD_HASH_WORKERS * 4)
+
+# Алгоритм и параметры хеширования. Подбираются под железо командой
+# python calibrate_password_hash.py; хеши со старыми параметрами
+# перехешируются при следующем успешном входе
+PASSWORD_HASH_SCHEME = os.getenv("PASSWORD_HASH_SCHEME", "bcrypt").lower()
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS") or 12)
+# argon2id (нужен пакет argon2-cffi): время, память в КиБ и число потоков
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST") or 3)
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST") or 65536)
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM") or 2)
+# Целевое время одной проверки пароля для калибровки
+PASSWORD_HASH_TARGET_MS = float(os.getenv("PASSWORD_HASH_TARGET_MS") or 250)
+
+# Нижние границы параметров: дешевле не калибруем даже на медленной машине
+BCRYPT_MIN_ROUNDS = 10
+BCRYPT_MAX_ROUNDS = 20
+ARGON2_MIN_MEMORY_COST = 19456
+ARGON2_MAX_TIME_COST = 20
+
+
+def build_context(
+    scheme: str = PASSWORD_HASH_SCHEME,
+    bcrypt_rounds: int = BCRYPT_ROUNDS,
+    argon2_time_cost: int = ARGON2_TIME_COST,
+    argon2_memory_cost: int = ARGON2_MEMORY_COST,
+    argon2_parallelism: int = ARGON2_PARALLELISM,
+) -> "CryptContext":
+    """Создает CryptContext: новые хеши - в ``scheme``, остальные схемы устаревшие.
+
+    Второй алгоритм остается в списке, чтобы после смены схемы старые хеши
+    продолжали проверяться и перехешировались при входе.
+    """
+    from passlib.context import CryptContext
+
+    schemes = ["argon2", "bcrypt"] if scheme == "argon2" else ["bcrypt", "argon2"]
+    return CryptContext(
+        schemes=schemes,
+        deprecated="auto",
+        bcrypt__rounds=bcrypt_rounds,
+        argon2__type="ID",
+        argon2__rounds=argon2_time_cost,
+        argon2__memory_cost=argon2_memory_cost,
+        argon2__parallelism=argon2_parallelism,
+    )
+
+
+# Конфигурация для хеширования паролей. Контекст создается при первом
+# обращении: в режиме process passlib и bcrypt загружаются только в
+# процессах пула, а не в каждом воркере при импорте приложения
+_pwd_context: Optional["CryptContext"] = None
+
+
+def get_pwd_context() -> "CryptContext":
+    global _pwd_context
+    if _pwd_context is None:
+        _pwd_context = build_context()
+    return _pwd_context
+
+
+def __getattr__(name: str):
+    if name == "pwd_context":
+        return get_pwd_context()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def hash_password(password: str) -> str:
+    """Хеширует пароль (синхронно, в текущем процессе)"""
+    return get_pwd_context().hash(password)
+
+
+def check_password(plain_password: str, hashed_password: str) -> bool:
+    """Проверяет пароль (синхронно, в текущем процессе)"""
+    return get_pwd_context().verify(plain_password, hashed_password)
+
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Проверяет пароль и, если параметры хеша устарели, возвращает новый хеш"""
+    return get_pwd_context().verify_and_update(plain_password, hashed_password)
+
+
+def _verify_time_ms(context: "CryptContext", samples: int = 3) -> float:
+    """Медиана времени проверки пароля в заданном контексте, мс"""
+    hashed = context.hash("calibration-password")
+    timings = []
+    for _ in range(samples):
+        started_at = time.perf_counter()
+        context.verify("calibration-password", hashed)
+        timings.append((time.perf_counter() - started_at) * 1000)
+    return sorted(timings)[len(timings) // 2]
+
+
+def calibrate_bcrypt(
+    target_ms: float = PASSWORD_HASH_TARGET_MS,
+    min_rounds: int = BCRYPT_MIN_ROUNDS,
+    max_rounds: int = BCRYPT_MAX_ROUNDS,
+) -> Tuple[int, float]:
+    """Подбирает наибольший cost bcrypt, при котором проверка укладывается в target_ms.
+
+    Возвращает (rounds, время проверки в мс). Каждый шаг удваивает время,
+    поэтому перебор останавливается на первом превышении цели.
+    """
+    from passlib.context import CryptContext
+
+    rounds = min_rounds
+    elapsed = _verify_time_ms(CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds))
+    while rounds < max_rounds:
+        next_elapsed = _verify_time_ms(CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds + 1))
+        if next_elapsed > target_ms:
+            break
+        rounds, elapsed = rounds + 1, next_elapsed
+    return rounds, elapsed
+
+
+def calibrate_argon2(
+    target_ms: float = PASSWORD_HASH_TARGET_MS,
+    memory_cost: int = ARGON2_MEMORY_COST,
+    parallelism: int = ARGON2_PARALLELISM,
+) -> Tuple[int, int, float]:
+    """Подбирает параметры argon2id под target_ms.
+
+    Память фиксируется на ``memory_cost`` КиБ (уменьшается вдвое, пока даже
+    time_cost=1 не уложится в цель), затем увеличивается time_cost.
+    Возвращает (time_cost, memory_cost, время проверки в мс).
+    """
+    from passlib.context import CryptContext
+
+    def measure(time_cost: int, memory: int) -> float:
+        return _verify_time_ms(CryptContext(
+            schemes=["argon2"],
+            argon2__type="ID",
+            argon2__rounds=time_cost,
+            argon2__memory_cost=memory,
+            argon2__parallelism=parallelism,
+        ))
+
+    elapsed = measure(1, memory_cost)
+    while elapsed > target_ms and memory_cost // 2 >= ARGON2_MIN_MEMORY_COST:
+        memory_cost //= 2
+        elapsed = measure(1, memory_cost)
+
+    time_cost = 1
+    while time_cost < ARGON2_MAX_TIME_COST:
+        next_elapsed = measure(time_cost + 1, memory_cost)
+        if next_elapsed > target_ms:
+            break
+        time_cost, elapsed = time_cost + 1, next_elapsed
+    return time_cost, memory_cost, elapsed
+
+
+class PasswordHasher:
+    """Выполняет bcrypt в ограниченном пуле вне event loop.
+
+    Число одновременно ожидающих операций ограничено ``max_pending``:
+    лишние запросы сразу получают 503, а не копятся в очереди, пока
+    клиенты не отвалятся по таймауту.
+    """
+
+    def __init__(
+        self,
+        executor_kind: str = PASSWORD_HASH_EXECUTOR,
+        workers: int = PASSWORD_HASH_WORKERS,
+        max_pending: int = PASSWORD_HASH_MAX_PENDING,
+    ):
+        self.executor_kind = executor_kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == "process":
+                # forkserver не копирует потоки и блокировки родителя (логи, event loop)
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(method),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    async def _run(self, operation: str, func, *args):
+        if self.pending >= self.max_pending:
+            PASSWORD_HASH_REJECTED.inc()
+            logger.warning("Очередь хеширования паролей переполнена", extra={"pending": self.pending})
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Сервер перегружен, повторите попытку позже",
+                headers={"Retry-After": "1"},
+            )
+
+        self.pending += 1
+        PASSWORD_HASH_QUEUE_DEPTH.set(self.pending)
+        try:
+            with PASSWORD_HASH_DURATION.labels(operation).time():
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.pending -= 1
+            PASSWORD_HASH_QUEUE_DEPTH.set(self.pending)
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run("verify", check_password, plain_password, hashed_password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        return await self._run("verify", verify_and_update_password, plain_password, hashed_password)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
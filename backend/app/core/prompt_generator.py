@@ -1,7 +1,49 @@
 import os
+import json
+import time
+import logging
 import httpx
-from typing import Optional
+from typing import AsyncIterator, Optional
 from fastapi import HTTPException, status
+from core import server_timing
+from core.metrics import UPSTREAM_REQUEST_DURATION, UPSTREAM_RESPONSES
+
+logger = logging.getLogger(__name__)
+
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+# Установить соединение с OpenRouter при старте, до первого запроса пользователя
+UPSTREAM_PREWARM_ENABLED = os.getenv("UPSTREAM_PREWARM_ENABLED", "true").lower() == "true"
+UPSTREAM_PREWARM_TIMEOUT_SECONDS = float(os.getenv("UPSTREAM_PREWARM_TIMEOUT_SECONDS") or 3)
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Общий клиент воркера: TCP- и TLS-соединение с OpenRouter переиспользуется между запросами"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(timeout=30.0)
+    return _http_client
+
+
+async def prewarm_http_client(timeout: float = UPSTREAM_PREWARM_TIMEOUT_SECONDS) -> bool:
+    """Открывает соединение с OpenRouter заранее, чтобы первый запрос не ждал TLS-рукопожатия"""
+    if not UPSTREAM_PREWARM_ENABLED or not os.getenv("OPENROUTER_API_KEY"):
+        return False
+    try:
+        # Ответ не важен: соединение остается в пуле клиента
+        await get_http_client().head(OPENROUTER_URL, timeout=timeout)
+        return True
+    except httpx.HTTPError as e:
+        logger.warning("Не удалось заранее подключиться к OpenRouter", extra={"error_type": type(e).__name__})
+        return False
+
+
+async def close_http_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
 
 
 async def generate_prompt(original_prompt: str, style_id: Optional[int]) -> str:
@@ -18,6 +60,12 @@ async def generate_prompt(original_prompt: str, style_id: Optional[int]) -> str:
     return await call_openrouter_api(styled_prompt)
 
 
+def stream_prompt(original_prompt: str, style_id: Optional[int]) -> AsyncIterator[str]:
+    """Генерирует промпт, отдавая текст частями по мере ответа OpenRouter"""
+    prompt = apply_style(original_prompt, style_id) if style_id else original_prompt
+    return stream_openrouter_api(prompt)
+
+
 def apply_style(prompt: str, style_id: int) -> str:
     """Применяет стиль к промпту на основе ID"""
     
@@ -32,9 +80,7 @@ def apply_style(prompt: str, style_id: int) -> str:
     return style_templates.get(style_id, prompt)
 
 
-async def call_openrouter_api(prompt: str) -> str:
-    """Вызывает OpenRouter API для генерации ответа"""
-    
+def _request_headers() -> dict:
     api_key = os.getenv("OPENROUTER_API_KEY")
     if not api_key:
         raise HTTPException(
@@ -42,13 +88,15 @@ async def call_openrouter_api(prompt: str) -> str:
             detail="OpenRouter API key не настроен"
         )
     
-    headers = {
+    return {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json",
         "HTTP-Referer": "https://fluxo.app",
         "X-Title": "Fluxo"
     }
-    
+
+
+def _request_payload(prompt: str, stream: bool = False) -> dict:
     payload = {
         "model": "mistralai/mistral-small-3.2-24b-instruct:free",
         "messages": [
@@ -60,47 +108,128 @@ async def call_openrouter_api(prompt: str) -> str:
         "max_tokens": 1000,
         "temperature": 0.7
     }
+    if stream:
+        payload["stream"] = True
+    return payload
+
+
+async def call_openrouter_api(prompt: str) -> str:
+    """Вызывает OpenRouter API для генерации ответа"""
+    
+    headers = _request_headers()
+    payload = _request_payload(prompt)
     
+    started_at = time.perf_counter()
     try:
-        async with httpx.AsyncClient() as client:
+        client = get_http_client()
+        try:
             response = await client.post(
-                "https://openrouter.ai/api/v1/chat/completions",
+                OPENROUTER_URL,
                 headers=headers,
                 json=payload,
                 timeout=30.0
             )
-            
+        finally:
+            elapsed = time.perf_counter() - started_at
+            UPSTREAM_REQUEST_DURATION.labels("openrouter").observe(elapsed)
+            server_timing.record("upstream", elapsed)
+        
+        UPSTREAM_RESPONSES.labels("openrouter", str(response.status_code)).inc()
+        
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail=f"Ошибка OpenRouter API: {response.status_code}"
+            )
+        
+        data = response.json()
+        
+        if "choices" not in data or not data["choices"]:
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail="Пустой ответ от OpenRouter API"
+            )
+        
+        return data["choices"][0]["message"]["content"]
+        
+    except httpx.TimeoutException:
+        UPSTREAM_RESPONSES.labels("openrouter", "timeout").inc()
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Таймаут запроса к OpenRouter API"
+        )
+    except httpx.RequestError as e:
+        UPSTREAM_RESPONSES.labels("openrouter", "connection_error").inc()
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Ошибка соединения с OpenRouter API: {str(e)}"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Внутренняя ошибка при обращении к API: {str(e)}"
+        )
+
+
+async def stream_openrouter_api(prompt: str) -> AsyncIterator[str]:
+    """Вызывает OpenRouter API в потоковом режиме и отдает фрагменты текста.
+
+    Следующая строка ответа читается, только когда потребитель забрал
+    предыдущий фрагмент: медленный клиент притормаживает и чтение из OpenRouter.
+    """
+    headers = _request_headers()
+    payload = _request_payload(prompt, stream=True)
+    
+    started_at = time.perf_counter()
+    try:
+        async with get_http_client().stream(
+            "POST",
+            OPENROUTER_URL,
+            headers=headers,
+            json=payload,
+            timeout=30.0
+        ) as response:
+            UPSTREAM_RESPONSES.labels("openrouter", str(response.status_code)).inc()
             if response.status_code != 200:
                 raise HTTPException(
                     status_code=status.HTTP_502_BAD_GATEWAY,
                     detail=f"Ошибка OpenRouter API: {response.status_code}"
                 )
             
-            data = response.json()
-            
-            if "choices" not in data or not data["choices"]:
-                raise HTTPException(
-                    status_code=status.HTTP_502_BAD_GATEWAY,
-                    detail="Пустой ответ от OpenRouter API"
-                )
-            
-            return data["choices"][0]["message"]["content"]
-            
+            async for line in response.aiter_lines():
+                # Строки-комментарии (": OPENROUTER PROCESSING") держат соединение
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(data)
+                except ValueError:
+                    continue
+                if "error" in chunk:
+                    raise HTTPException(
+                        status_code=status.HTTP_502_BAD_GATEWAY,
+                        detail="Ошибка OpenRouter API при генерации"
+                    )
+                choices = chunk.get("choices") or [{}]
+                delta = (choices[0].get("delta") or {}).get("content")
+                if delta:
+                    yield delta
     except httpx.TimeoutException:
+        UPSTREAM_RESPONSES.labels("openrouter", "timeout").inc()
         raise HTTPException(
             status_code=status.HTTP_504_GATEWAY_TIMEOUT,
             detail="Таймаут запроса к OpenRouter API"
         )
     except httpx.RequestError as e:
+        UPSTREAM_RESPONSES.labels("openrouter", "connection_error").inc()
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail=f"Ошибка соединения с OpenRouter API: {str(e)}"
         )
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Внутренняя ошибка при обращении к API: {str(e)}"
-        )
+    finally:
+        UPSTREAM_REQUEST_DURATION.labels("openrouter").observe(time.perf_counter() - started_at)
 
 
 def get_available_styles() -> dict:
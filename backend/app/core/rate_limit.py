@@ -0,0 +1,209 @@
+import os
+import re
+import math
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+from fastapi import HTTPException, Request, status
+from core.metrics import RATE_LIMIT_REJECTED
+from core.shared_state import shared_state
+
+# Конфигурация ограничения частоты запросов
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# Хранилище состояния: memory - в памяти воркера, shared - общий сегмент
+# памяти воркеров serve.py (выбирается по умолчанию, если он есть)
+RATE_LIMIT_BACKEND = (os.getenv("RATE_LIMIT_BACKEND") or ("shared" if shared_state else "memory")).lower()
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS") or 100000)
+
+# Лимиты в формате "число/период", например "10/hour" или "5/15minute"
+RATE_LIMIT_REGISTER = os.getenv("RATE_LIMIT_REGISTER", "10/hour")
+RATE_LIMIT_CONFIRM_EMAIL = os.getenv("RATE_LIMIT_CONFIRM_EMAIL", "5/15minute")
+RATE_LIMIT_CONFIRM_EMAIL_IP = os.getenv("RATE_LIMIT_CONFIRM_EMAIL_IP", "30/minute")
+RATE_LIMIT_RESEND_CONFIRMATION = os.getenv("RATE_LIMIT_RESEND_CONFIRMATION", "10/hour")
+RATE_LIMIT_VERIFICATION_CODES = os.getenv("RATE_LIMIT_VERIFICATION_CODES", "3/hour")
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+_RATE_PATTERN = re.compile(r"^\s*(\d+)\s*/\s*(\d*)\s*(second|minute|hour|day)s?\s*$")
+
+
+def parse_rate(rate: str) -> Tuple[int, float]:
+    """Разбирает "5/15minute" в (5, 900.0)"""
+    match = _RATE_PATTERN.match(rate)
+    if not match:
+        raise ValueError(f"Неверный формат лимита: {rate!r}")
+    limit, multiplier, unit = match.groups()
+    return int(limit), int(multiplier or 1) * _PERIODS[unit]
+
+
+class RateLimitPolicy:
+    """Именованный лимит: не более ``limit`` запросов за ``period`` секунд на ключ.
+
+    ``key`` определяет, по чему считаются запросы: ip, email (из JSON-тела)
+    или user (id из access-токена).
+    """
+
+    def __init__(self, name: str, rate: str, key: str = "ip"):
+        if key not in ("ip", "email", "user"):
+            raise ValueError(f"Неизвестный ключ лимита: {key}")
+        self.name = name
+        self.key = key
+        self.limit, self.period = parse_rate(rate)
+
+    @property
+    def emission_interval(self) -> float:
+        return self.period / self.limit
+
+
+class InMemoryBackend:
+    """Состояние GCRA в памяти воркера: на ключ хранится одно число (TAT).
+
+    Любой другой backend должен реализовать те же методы ``acquire``,
+    ``reset`` и ``clear``; ``acquire`` обязан быть атомарным.
+    """
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._tats: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, emission_interval: float, period: float, now: float) -> float:
+        """Пытается занять слот. Возвращает 0 или через сколько секунд повторить"""
+        with self._lock:
+            tat = max(self._tats.get(key, now), now)
+            new_tat = tat + emission_interval
+            if new_tat - now > period:
+                return new_tat - period - now
+            self._tats[key] = new_tat
+            self._tats.move_to_end(key)
+            # Истекшие и самые старые ключи вытесняются первыми
+            while len(self._tats) > self.max_keys:
+                self._tats.popitem(last=False)
+            return 0.0
+
+    def reset(self, key: str) -> None:
+        with self._lock:
+            self._tats.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tats.clear()
+
+
+class SharedMemoryBackend:
+    """Состояние GCRA в общем сегменте памяти: лимит один на все воркеры.
+
+    TAT хранится в таблице ``rate_limit`` (SlotTable), обновление атомарно
+    благодаря блокировке слота между процессами.
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    def acquire(self, key: str, emission_interval: float, period: float, now: float) -> float:
+        def update(values):
+            tat = max(values[0], now) if values else now
+            new_tat = tat + emission_interval
+            if new_tat - now > period:
+                return values, new_tat - period - now
+            return (new_tat,), 0.0
+
+        return self.table.update(key, update)
+
+    def reset(self, key: str) -> None:
+        self.table.delete(key)
+
+    def clear(self) -> None:
+        self.table.clear()
+
+
+def create_backend(kind: str):
+    """Создает хранилище состояния по имени из конфигурации"""
+    if kind == "memory":
+        return InMemoryBackend()
+    if kind == "shared":
+        if shared_state is None:
+            raise ValueError("RATE_LIMIT_BACKEND=shared требует запуска через serve.py")
+        return SharedMemoryBackend(shared_state.table("rate_limit"))
+    raise ValueError(f"Неизвестный backend ограничителя частоты: {kind}")
+
+
+class RateLimiter:
+    """Ограничитель частоты по алгоритму GCRA (generic cell rate algorithm).
+
+    В отличие от подсчета записей за окно, не требует запросов к БД и
+    хранит на ключ одно число; допускает пачку из ``limit`` запросов, после
+    чего пропускает по одному каждые ``period / limit`` секунд.
+    """
+
+    def __init__(self, backend=None, enabled: bool = RATE_LIMIT_ENABLED):
+        self.backend = backend or InMemoryBackend()
+        self.enabled = enabled
+
+    def hit(self, policy: RateLimitPolicy, identity: str) -> float:
+        """Учитывает запрос. Возвращает 0 или через сколько секунд можно повторить"""
+        if not self.enabled:
+            return 0.0
+        key = f"{policy.name}:{identity}"
+        return self.backend.acquire(key, policy.emission_interval, policy.period, time.monotonic())
+
+    def check(self, policy: RateLimitPolicy, identity: str, detail: Optional[str] = None) -> None:
+        """Учитывает запрос или бросает 429 с Retry-After"""
+        retry_after = self.hit(policy, identity)
+        if retry_after:
+            RATE_LIMIT_REJECTED.labels(policy.name).inc()
+            seconds = max(1, math.ceil(retry_after))
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=detail or f"Слишком много запросов. Попробуйте через {seconds} сек.",
+                headers={"Retry-After": str(seconds)},
+            )
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+
+rate_limiter = RateLimiter(create_backend(RATE_LIMIT_BACKEND))
+
+# Политики маршрутов аутентификации
+REGISTER_LIMIT = RateLimitPolicy("register", RATE_LIMIT_REGISTER, key="ip")
+# Код из 6 цифр: лимит по email делает перебор за время жизни кода бессмысленным
+CONFIRM_EMAIL_LIMIT = RateLimitPolicy("confirm_email", RATE_LIMIT_CONFIRM_EMAIL, key="email")
+CONFIRM_EMAIL_IP_LIMIT = RateLimitPolicy("confirm_email_ip", RATE_LIMIT_CONFIRM_EMAIL_IP, key="ip")
+RESEND_CONFIRMATION_LIMIT = RateLimitPolicy("resend_confirmation", RATE_LIMIT_RESEND_CONFIRMATION, key="ip")
+# Отправка кодов подтверждения на одного пользователя (считается по id в send_verification_code)
+VERIFICATION_CODES_LIMIT = RateLimitPolicy("verification_codes", RATE_LIMIT_VERIFICATION_CODES, key="user")
+
+
+def _client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+async def _identity(request: Request, key: str) -> str:
+    if key == "email":
+        try:
+            body = await request.json()
+        except ValueError:
+            body = None
+        if isinstance(body, dict) and isinstance(body.get("email"), str):
+            return body["email"].lower()
+    elif key == "user":
+        from core.auth import decode_access_token
+
+        authorization = request.headers.get("authorization", "")
+        payload = decode_access_token(authorization[7:]) if authorization.lower().startswith("bearer ") else None
+        if payload is not None:
+            return str(payload.get("uid") or payload["sub"])
+    # Без email или токена считаем по IP
+    return "ip:" + _client_ip(request)
+
+
+def rate_limit(policy: RateLimitPolicy):
+    """Зависимость FastAPI, применяющая лимит к маршруту:
+
+        @router.post("/register", dependencies=[Depends(rate_limit(REGISTER_LIMIT))])
+    """
+    async def dependency(request: Request) -> None:
+        rate_limiter.check(policy, await _identity(request, policy.key))
+
+    return dependency
@@ -0,0 +1,160 @@
+import os
+import math
+import asyncio
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from core.metrics import TOKEN_REVOCATION_CHECKS
+from models.revoked_token import RevokedToken
+
+logger = logging.getLogger(__name__)
+
+# Конфигурация списка отозванных токенов
+REVOCATION_BLOOM_CAPACITY = int(os.getenv("REVOCATION_BLOOM_CAPACITY") or 100000)
+REVOCATION_BLOOM_ERROR_RATE = float(os.getenv("REVOCATION_BLOOM_ERROR_RATE") or 0.001)
+# Как часто воркер подтягивает токены, отозванные другими воркерами
+REVOCATION_SYNC_INTERVAL_SECONDS = float(os.getenv("REVOCATION_SYNC_INTERVAL_SECONDS") or 5)
+# Запас при синхронизации на транзакции, закоммиченные позже своего revoked_at
+REVOCATION_SYNC_OVERLAP = timedelta(minutes=1)
+REVOCATION_CLEANUP_INTERVAL = timedelta(hours=1)
+
+
+class BloomFilter:
+    """Фильтр Блума на bytearray: ложноположительные ответы возможны, ложноотрицательные - нет"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class RevocationList:
+    """Отозванные jti: фильтр Блума в памяти поверх таблицы revoked_tokens.
+
+    Для неотозванного токена (обычный случай) проверка не обращается к БД.
+    Если фильтр отвечает «возможно», ответ уточняется запросом по первичному
+    ключу. Отзывы из других воркеров подтягиваются фоновой синхронизацией.
+    """
+
+    def __init__(self, capacity: int = REVOCATION_BLOOM_CAPACITY, error_rate: float = REVOCATION_BLOOM_ERROR_RATE):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._synced_until: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    def is_revoked(self, db: Session, jti: str) -> bool:
+        if jti not in self._bloom:
+            TOKEN_REVOCATION_CHECKS.labels("clear").inc()
+            return False
+        revoked = db.query(RevokedToken.jti).filter(RevokedToken.jti == jti).first() is not None
+        TOKEN_REVOCATION_CHECKS.labels("revoked" if revoked else "false_positive").inc()
+        return revoked
+
+    def revoke(self, db: Session, jti: str, user_id: int, expires_at: datetime) -> bool:
+        """Отзывает токен. Возвращает False, если он уже был отозван"""
+        db.add(RevokedToken(jti=jti, user_id=user_id, expires_at=expires_at))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            self.add(jti)
+            return False
+        self.add(jti)
+        return True
+
+    def add(self, jti: str) -> None:
+        with self._lock:
+            self._bloom.add(jti)
+
+    def load(self, db: Session) -> None:
+        """Перестраивает фильтр по всем действующим записям таблицы"""
+        bloom = BloomFilter(self.capacity, self.error_rate)
+        # revoked_at заполняется БД; как и created_at в остальных таблицах, считаем его UTC
+        synced_until = datetime.utcnow() - REVOCATION_SYNC_OVERLAP
+        rows = db.query(RevokedToken.jti, RevokedToken.revoked_at).filter(
+            RevokedToken.expires_at > datetime.utcnow()
+        ).yield_per(1000)
+        for jti, revoked_at in rows:
+            bloom.add(jti)
+            if revoked_at > synced_until:
+                synced_until = revoked_at
+        with self._lock:
+            self._bloom = bloom
+            self._synced_until = synced_until
+        logger.info("Список отозванных токенов загружен", extra={"revoked_tokens": bloom.count})
+
+    def sync(self, db: Session) -> None:
+        """Добавляет токены, отозванные после предыдущей синхронизации"""
+        if self._synced_until is None or self._bloom.count > self.capacity:
+            # Первый запуск или фильтр переполнен истекшими jti - перестраиваем
+            self.load(db)
+            return
+        rows = db.query(RevokedToken.jti, RevokedToken.revoked_at).filter(
+            RevokedToken.revoked_at >= self._synced_until - REVOCATION_SYNC_OVERLAP
+        ).all()
+        for jti, revoked_at in rows:
+            if jti not in self._bloom:
+                self.add(jti)
+            if revoked_at > self._synced_until:
+                self._synced_until = revoked_at
+
+    def clear(self) -> None:
+        with self._lock:
+            self._bloom = BloomFilter(self.capacity, self.error_rate)
+            self._synced_until = None
+
+
+def delete_expired(db: Session) -> int:
+    """Удаляет записи об отозванных токенах, срок которых уже истек"""
+    deleted = db.query(RevokedToken).filter(RevokedToken.expires_at <= datetime.utcnow()).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+revocation_list = RevocationList()
+
+
+async def run_sync_loop(session_factory, interval: float = REVOCATION_SYNC_INTERVAL_SECONDS) -> None:
+    """Фоновая задача: синхронизация фильтра и периодическая очистка таблицы"""
+    def sync_once(cleanup: bool) -> None:
+        db = session_factory()
+        try:
+            revocation_list.sync(db)
+            if cleanup:
+                deleted = delete_expired(db)
+                logger.debug("Удалены истекшие отозванные токены", extra={"deleted": deleted})
+        finally:
+            db.close()
+
+    cleaned_at = datetime.utcnow()
+    while True:
+        try:
+            cleanup = datetime.utcnow() - cleaned_at >= REVOCATION_CLEANUP_INTERVAL
+            await run_in_threadpool(sync_once, cleanup)
+            if cleanup:
+                cleaned_at = datetime.utcnow()
+        except Exception:
+            logger.warning("Не удалось синхронизировать список отозванных токенов", exc_info=True)
+        await asyncio.sleep(interval)
@@ -1,7 +1,10 @@
+import logging
 from sqlalchemy.orm import Session
 from models.prompt_style import PromptStyle
 from core.database import SessionLocal
 
+logger = logging.getLogger(__name__)
+
 
 def seed_prompt_styles(db: Session) -> None:
     """Заполняет таблицу prompt_styles начальными данными"""
@@ -9,7 +12,10 @@ def seed_prompt_styles(db: Session) -> None:
     # Проверяем, есть ли уже данные в таблице
     existing_styles = db.query(PromptStyle).count()
     if existing_styles > 0:
-        print(f"📋 Стили промптов уже существуют ({existing_styles} записей), пропускаем инициализацию")
+        logger.info(
+            "Стили промптов уже существуют, пропускаем инициализацию",
+            extra={"existing_styles": existing_styles}
+        )
         return
     
     # Создаем базовые стили промптов
@@ -36,7 +42,7 @@ def seed_prompt_styles(db: Session) -> None:
         }
     ]
     
-    print("🎨 Создание базовых стилей промптов...")
+    logger.info("Создание базовых стилей промптов")
     
     for style_data in styles_data:
         style = PromptStyle(
@@ -45,27 +51,27 @@ def seed_prompt_styles(db: Session) -> None:
             description=style_data["description"]
         )
         db.add(style)
-        print(f"  ✅ Добавлен стиль: {style_data['name']} (ID: {style_data['id']})")
+        logger.debug("Добавлен стиль", extra={"style_id": style_data["id"], "style_name": style_data["name"]})
     
     try:
         db.commit()
-        print("✅ Все стили промптов успешно созданы!")
-    except Exception as e:
+        logger.info("Все стили промптов успешно созданы", extra={"count": len(styles_data)})
+    except Exception:
         db.rollback()
-        print(f"❌ Ошибка при создании стилей: {e}")
+        logger.exception("Ошибка при создании стилей")
         raise
 
 
 def seed_initial_data() -> None:
     """Заполняет базу данных начальными данными"""
-    print("🌱 Запуск инициализации начальных данных...")
+    logger.info("Запуск инициализации начальных данных")
     
     db = SessionLocal()
     try:
         seed_prompt_styles(db)
-        print("✅ Инициализация данных завершена успешно!")
-    except Exception as e:
-        print(f"❌ Ошибка при инициализации данных: {e}")
+        logger.info("Инициализация данных завершена")
+    except Exception:
+        logger.exception("Ошибка при инициализации данных")
         raise
     finally:
         db.close()
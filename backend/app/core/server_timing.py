@@ -0,0 +1,111 @@
+import os
+import time
+from contextvars import ContextVar
+from typing import Iterable, Optional
+from fastapi.responses import JSONResponse
+
+# Конфигурация заголовка Server-Timing
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() == "true"
+
+# Накопленные времена этапов текущего запроса (мс). None - сбор выключен.
+# Словарь изменяемый, поэтому запись из потоков threadpool видна middleware
+_timings: ContextVar[Optional[dict]] = ContextVar("server_timings", default=None)
+
+
+class _Stage:
+    __slots__ = ("name", "timings", "started_at")
+
+    def __init__(self, name: str, timings: dict):
+        self.name = name
+        self.timings = timings
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        elapsed_ms = (time.perf_counter() - self.started_at) * 1000
+        self.timings[self.name] = self.timings.get(self.name, 0.0) + elapsed_ms
+
+
+class _NoopStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+_NOOP_STAGE = _NoopStage()
+
+
+def stage(name: str):
+    """Контекстный менеджер, добавляющий время блока к этапу ``name``.
+
+    Повторные замеры одного этапа суммируются. Вне запроса или при
+    выключенном сборе возвращает заглушку.
+    """
+    timings = _timings.get()
+    if timings is None:
+        return _NOOP_STAGE
+    return _Stage(name, timings)
+
+
+def record(name: str, seconds: float) -> None:
+    """Добавляет уже измеренное время к этапу ``name``"""
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds * 1000
+
+
+def format_header(timings: dict) -> str:
+    """Собирает значение заголовка: ``auth;dur=1.2, db;dur=3.4``"""
+    return ", ".join(f"{name};dur={duration:.1f}" for name, duration in timings.items())
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse, учитывающий время сериализации в этапе serialize"""
+
+    def render(self, content) -> bytes:
+        with stage("serialize"):
+            return super().render(content)
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware, добавляющий заголовок Server-Timing к каждому ответу.
+
+    Для разрешенных источников добавляет Timing-Allow-Origin, иначе браузер
+    не покажет тайминги кросс-доменных запросов фронтенда.
+    """
+
+    def __init__(self, app, allowed_origins: Iterable[str] = ()):
+        self.app = app
+        self.allowed_origins = {origin.encode() for origin in allowed_origins}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = {}
+        token = _timings.set(timings)
+        started_at = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                timings["total"] = (time.perf_counter() - started_at) * 1000
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", format_header(timings).encode()))
+                if self.allowed_origins:
+                    origin = dict(scope["headers"]).get(b"origin")
+                    if origin in self.allowed_origins:
+                        headers.append((b"timing-allow-origin", origin))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _timings.reset(token)
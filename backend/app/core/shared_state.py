@@ -0,0 +1,237 @@
+import os
+import fcntl
+import struct
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Callable, Dict, Optional, Tuple
+
+# Общий для воркеров сегмент памяти. Его создает serve.py перед запуском
+# нескольких воркеров и передает имя через окружение; без него (тесты,
+# один процесс) кеши и счетчики работают в памяти процесса
+SHARED_STATE_NAME = os.getenv("SHARED_STATE_NAME")
+# Число слотов в каждой таблице; при коллизии слот достается новому ключу
+SHARED_STATE_SLOTS = int(os.getenv("SHARED_STATE_SLOTS") or 65536)
+SHARED_STATE_LOCK_STRIPES = 256
+
+# Счетчики изменений пользователей: кеш пользователей и версии токенов
+EPOCH_KINDS = ("users", "token_versions")
+# Таблицы ключ -> несколько чисел: имя и число полей
+TABLES = (("rate_limit", 1), ("login_ip", 5), ("login_account", 5))
+
+_MAGIC = b"FLXS"
+_HEADER = struct.Struct("<4sIQ")
+
+
+def _layout(slots: int) -> Tuple[Dict[str, Tuple[int, int]], int]:
+    """Смещения областей сегмента: имя -> (смещение, размер в байтах)"""
+    regions = {}
+    offset = _HEADER.size
+    for kind in EPOCH_KINDS:
+        regions["epochs:" + kind] = (offset, slots * 8)
+        offset += slots * 8
+    for name, fields in TABLES:
+        regions["keys:" + name] = (offset, slots * 8)
+        offset += slots * 8
+        regions["values:" + name] = (offset, slots * fields * 8)
+        offset += slots * fields * 8
+    return regions, offset
+
+
+def _lock_path(name: str) -> str:
+    return os.path.join(tempfile.gettempdir(), f"{name}.lock")
+
+
+class StripedLock:
+    """Блокировки между процессами: байтовые диапазоны lock-файла через fcntl.
+
+    Блокировки fcntl принадлежат процессу, а не потоку, поэтому каждая
+    полоса дополнительно закрыта threading.Lock для потоков одного воркера.
+    """
+
+    def __init__(self, path: str, stripes: int = SHARED_STATE_LOCK_STRIPES):
+        self.stripes = stripes
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._thread_locks = [threading.Lock() for _ in range(stripes)]
+
+    @contextmanager
+    def hold(self, index: int):
+        stripe = index % self.stripes
+        with self._thread_locks[stripe]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, stripe)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, stripe)
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class EpochArray:
+    """Номера изменений пользователей, общие для всех воркеров.
+
+    Запись кеша запоминает номер на момент заполнения; если другой воркер
+    увеличил его, запись считается устаревшей. Пользователи с совпадающим
+    остатком от деления делят слот - это дает лишние промахи, но не
+    устаревшие ответы.
+    """
+
+    def __init__(self, view: memoryview, lock: StripedLock, lock_offset: int):
+        self._epochs = view
+        self._lock = lock
+        self._lock_offset = lock_offset
+
+    def get(self, user_id: int) -> int:
+        return self._epochs[user_id % len(self._epochs)]
+
+    def bump(self, user_id: int) -> int:
+        index = user_id % len(self._epochs)
+        with self._lock.hold(self._lock_offset + index):
+            self._epochs[index] += 1
+            return self._epochs[index]
+
+
+class SlotTable:
+    """Хеш-таблица фиксированного размера: ключ -> ``fields`` чисел float.
+
+    Ключ хранится как 64-битный отпечаток; новый ключ, попавший в занятый
+    слот, вытесняет прежний (как вытеснение старых ключей в памяти воркера).
+    """
+
+    def __init__(self, keys: memoryview, values: memoryview, fields: int, lock: StripedLock, lock_offset: int):
+        self.fields = fields
+        self._keys = keys
+        self._values = values
+        self._lock = lock
+        self._lock_offset = lock_offset
+
+    def _locate(self, key: str) -> Tuple[int, int]:
+        digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+        # 0 означает пустой слот
+        fingerprint = int.from_bytes(digest, "little") or 1
+        return fingerprint % len(self._keys), fingerprint
+
+    def _read(self, index: int, fingerprint: int) -> Optional[Tuple[float, ...]]:
+        if self._keys[index] != fingerprint:
+            return None
+        start = index * self.fields
+        return tuple(self._values[start:start + self.fields])
+
+    def get(self, key: str) -> Optional[Tuple[float, ...]]:
+        index, fingerprint = self._locate(key)
+        with self._lock.hold(self._lock_offset + index):
+            return self._read(index, fingerprint)
+
+    def update(self, key: str, func: Callable):
+        """Атомарно обновляет запись ключа.
+
+        ``func`` получает текущие значения (или None) и возвращает пару
+        (новые значения или None для удаления, результат вызова).
+        """
+        index, fingerprint = self._locate(key)
+        with self._lock.hold(self._lock_offset + index):
+            values, result = func(self._read(index, fingerprint))
+            if values is not None:
+                start = index * self.fields
+                for field, value in enumerate(values):
+                    self._values[start + field] = value
+                self._keys[index] = fingerprint
+            elif self._keys[index] == fingerprint:
+                self._keys[index] = 0
+            return result
+
+    def delete(self, key: str) -> None:
+        self.update(key, lambda values: (None, None))
+
+    def clear(self) -> None:
+        for stripe in range(self._lock.stripes):
+            with self._lock.hold(stripe):
+                for index in range(stripe, len(self._keys), self._lock.stripes):
+                    self._keys[index] = 0
+
+
+class SharedState:
+    """Сегмент multiprocessing.shared_memory с номерами изменений и таблицами.
+
+    Процесс-супервизор вызывает ``create``, воркеры - ``attach`` по имени.
+    Время в таблицах - time.monotonic(): в Linux это общие для всех
+    процессов часы, поэтому значения сравнимы между воркерами.
+    """
+
+    def __init__(self, segment: shared_memory.SharedMemory, slots: int, owner: bool):
+        self.segment = segment
+        self.name = segment.name
+        self.slots = slots
+        self.owner = owner
+        self.lock = StripedLock(_lock_path(segment.name))
+        regions, _ = _layout(slots)
+        buffer = segment.buf
+        self.epochs = {}
+        self.tables = {}
+        for lock_offset, kind in enumerate(EPOCH_KINDS):
+            offset, size = regions["epochs:" + kind]
+            view = buffer[offset:offset + size].cast("q")
+            self.epochs[kind] = EpochArray(view, self.lock, lock_offset * slots)
+        for lock_offset, (name, fields) in enumerate(TABLES, start=len(EPOCH_KINDS)):
+            key_offset, key_size = regions["keys:" + name]
+            value_offset, value_size = regions["values:" + name]
+            self.tables[name] = SlotTable(
+                buffer[key_offset:key_offset + key_size].cast("Q"),
+                buffer[value_offset:value_offset + value_size].cast("d"),
+                fields,
+                self.lock,
+                lock_offset * slots,
+            )
+
+    @classmethod
+    def create(cls, slots: int = SHARED_STATE_SLOTS, name: Optional[str] = None) -> "SharedState":
+        _, size = _layout(slots)
+        # Новый сегмент POSIX заполнен нулями: все слоты пусты, номера равны 0
+        segment = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _HEADER.pack_into(segment.buf, 0, _MAGIC, slots, size)
+        return cls(segment, slots, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedState":
+        # Подключение регистрирует сегмент в resource_tracker. Воркеры uvicorn
+        # запускаются через multiprocessing (spawn) и делят его с супервизором,
+        # поэтому сегмент удаляется только при выходе супервизора. Процесс,
+        # запущенный иначе, получил бы свой resource_tracker, удаляющий
+        # сегмент при выходе этого процесса
+        segment = shared_memory.SharedMemory(name=name)
+        magic, slots, size = _HEADER.unpack_from(segment.buf, 0)
+        if magic != _MAGIC or _layout(slots)[1] != size:
+            segment.close()
+            raise RuntimeError(f"Сегмент {name} не является общим состоянием Fluxo")
+        return cls(segment, slots, owner=False)
+
+    def epoch(self, kind: str) -> EpochArray:
+        return self.epochs[kind]
+
+    def table(self, name: str) -> SlotTable:
+        return self.tables[name]
+
+    def close(self) -> None:
+        """Отключается от сегмента; создатель также удаляет его и lock-файл"""
+        # memoryview на буфер должны быть освобождены до закрытия сегмента
+        for epochs in self.epochs.values():
+            epochs._epochs.release()
+        for table in self.tables.values():
+            table._keys.release()
+            table._values.release()
+        self.epochs.clear()
+        self.tables.clear()
+        self.lock.close()
+        self.segment.close()
+        if self.owner:
+            self.segment.unlink()
+            try:
+                os.unlink(_lock_path(self.name))
+            except FileNotFoundError:
+                pass
+
+
+shared_state: Optional[SharedState] = SharedState.attach(SHARED_STATE_NAME) if SHARED_STATE_NAME else None
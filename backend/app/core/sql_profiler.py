@@ -0,0 +1,146 @@
+import os
+import heapq
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Конфигурация профилировщика SQL
+SQL_PROFILER_ENABLED = os.getenv("SQL_PROFILER_ENABLED", "true").lower() == "true"
+# Выражения дольше порога пишутся в лог медленных запросов
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+# Сколько раз одно выражение может выполниться за запрос, прежде чем мы заподозрим N+1
+SQL_REPEAT_THRESHOLD = int(os.getenv("SQL_REPEAT_THRESHOLD", "3"))
+SQL_PROFILER_TOP_N = 5
+
+
+class QueryStats:
+    """Статистика SQL-выражений одного запроса"""
+
+    def __init__(self, top_n: int = SQL_PROFILER_TOP_N):
+        self.count = 0
+        self.total_time = 0.0
+        self.statements = Counter()
+        self._slowest: List[Tuple[float, int, str]] = []
+        self._top_n = top_n
+        self._lock = threading.Lock()
+
+    def add(self, statement: str, elapsed: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.total_time += elapsed
+            self.statements[statement] += 1
+            entry = (elapsed, self.count, statement)
+            if len(self._slowest) < self._top_n:
+                heapq.heappush(self._slowest, entry)
+            else:
+                heapq.heappushpop(self._slowest, entry)
+
+    @property
+    def slowest(self) -> List[Tuple[float, str]]:
+        """Самые медленные выражения: [(секунды, SQL), ...] по убыванию"""
+        return [(elapsed, statement) for elapsed, _, statement in sorted(self._slowest, reverse=True)]
+
+    def repeated(self, threshold: int = SQL_REPEAT_THRESHOLD) -> dict:
+        """Выражения, выполненные не менее ``threshold`` раз (кандидаты в N+1)"""
+        return {statement: count for statement, count in self.statements.items() if count >= threshold}
+
+
+_request_stats: ContextVar[Optional[QueryStats]] = ContextVar("sql_request_stats", default=None)
+# Активные захваты из тестов: запросы TestClient выполняются в другом потоке,
+# поэтому контекстная переменная теста туда не доходит
+_captures: List[QueryStats] = []
+_captures_lock = threading.Lock()
+
+
+def redact_parameters(parameters):
+    """Заменяет значения параметров их типами, чтобы в лог не попадали данные"""
+    if isinstance(parameters, dict):
+        return {key: f"<{type(value).__name__}>" for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return f"<{len(parameters)} наборов параметров>"
+        return [f"<{type(value).__name__}>" for value in parameters]
+    return parameters
+
+
+def record(statement: str, parameters, elapsed: float) -> None:
+    """Учитывает выполненное выражение; вызывается из обработчика событий движка"""
+    statement = statement.strip()
+
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.add(statement, elapsed)
+    if _captures:
+        with _captures_lock:
+            for capture in _captures:
+                capture.add(statement, elapsed)
+
+    if elapsed * 1000 >= SLOW_QUERY_THRESHOLD_MS:
+        logger.warning(
+            "Медленный SQL-запрос",
+            extra={
+                "duration_ms": round(elapsed * 1000, 2),
+                "statement": statement,
+                "parameters": redact_parameters(parameters),
+            }
+        )
+
+
+@contextmanager
+def capture():
+    """Собирает статистику всех SQL-выражений внутри блока (для тестов)"""
+    stats = QueryStats()
+    with _captures_lock:
+        _captures.append(stats)
+    try:
+        yield stats
+    finally:
+        with _captures_lock:
+            _captures.remove(stats)
+
+
+def report(stats: QueryStats, route: str) -> None:
+    """Пишет в лог сводку по запросу и предупреждение о повторяющихся выражениях"""
+    repeated = stats.repeated()
+    if repeated:
+        logger.warning(
+            "Повторяющиеся SQL-выражения в одном запросе (возможен N+1)",
+            extra={"route": route, "repeated": [{"statement": s, "count": c} for s, c in repeated.items()]}
+        )
+
+    if logger.isEnabledFor(logging.DEBUG) and stats.count:
+        logger.debug(
+            "SQL-профиль запроса",
+            extra={
+                "route": route,
+                "query_count": stats.count,
+                "query_time_ms": round(stats.total_time * 1000, 2),
+                "slowest": [{"duration_ms": round(e * 1000, 2), "statement": s} for e, s in stats.slowest],
+            }
+        )
+
+
+class SqlProfilerMiddleware:
+    """ASGI middleware: собирает SQL-статистику на каждый HTTP-запрос"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _request_stats.set(stats)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_stats.reset(token)
+            route = getattr(scope.get("route"), "path", None) or scope["path"]
+            report(stats, route)
@@ -0,0 +1,94 @@
+import os
+import time
+import logging
+from contextlib import contextmanager
+from typing import Dict, Set
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Что делать со схемой БД при старте воркера:
+#   create - create_all и начальные данные (локальная разработка)
+#   check  - только сверить ревизию БД с head миграций Alembic; миграции
+#            и seed_db.py выполняются отдельным шагом деплоя
+#   skip   - ничего не проверять
+STARTUP_MODE = os.getenv("STARTUP_MODE", "create").lower()
+# Каталог миграций Alembic (по умолчанию backend/alembic рядом с app)
+ALEMBIC_SCRIPT_LOCATION = os.getenv("ALEMBIC_SCRIPT_LOCATION") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "alembic"
+)
+# Сколько соединений пула открыть до приема запросов
+DB_POOL_PREWARM_CONNECTIONS = int(os.getenv("DB_POOL_PREWARM_CONNECTIONS") or 2)
+
+STARTUP_MODES = ("create", "check", "skip")
+if STARTUP_MODE not in STARTUP_MODES:
+    raise ValueError(f"Неизвестный STARTUP_MODE: {STARTUP_MODE}")
+
+
+class SchemaMismatchError(RuntimeError):
+    """Ревизия схемы БД не совпадает с head миграций"""
+
+
+def expected_revisions(script_location: str = ALEMBIC_SCRIPT_LOCATION) -> Set[str]:
+    """Head-ревизии из файлов миграций (без запуска env.py)"""
+    from alembic.script import ScriptDirectory
+
+    return set(ScriptDirectory(script_location).get_heads())
+
+
+def current_revisions(engine: Engine) -> Set[str]:
+    """Ревизии, записанные в таблице alembic_version"""
+    from alembic.runtime.migration import MigrationContext
+
+    with engine.connect() as conn:
+        return set(MigrationContext.configure(conn).get_current_heads())
+
+
+def check_schema(engine: Engine, script_location: str = ALEMBIC_SCRIPT_LOCATION) -> str:
+    """Проверяет, что к БД применены все миграции. Возвращает текущую ревизию"""
+    expected = expected_revisions(script_location)
+    current = current_revisions(engine)
+    if current != expected:
+        raise SchemaMismatchError(
+            f"Схема БД не соответствует миграциям: в БД {sorted(current) or 'нет ревизии'}, "
+            f"ожидается {sorted(expected)}. Выполните alembic upgrade head"
+        )
+    return ",".join(sorted(current))
+
+
+def prewarm_pool(engine: Engine, connections: int = DB_POOL_PREWARM_CONNECTIONS) -> int:
+    """Открывает соединения пула заранее, чтобы первые запросы не ждали подключения и TLS"""
+    size = getattr(engine.pool, "size", None)
+    if callable(size):
+        connections = min(connections, size())
+    opened = []
+    try:
+        # Соединения удерживаются одновременно, иначе пул выдал бы одно и то же
+        for _ in range(connections):
+            conn = engine.connect()
+            opened.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in opened:
+            conn.close()
+    return len(opened)
+
+
+class StartupTimer:
+    """Длительность этапов запуска для лога готовности воркера"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = round((time.perf_counter() - started_at) * 1000, 1)
+
+    def total_ms(self) -> float:
+        return round((time.perf_counter() - self.started_at) * 1000, 1)
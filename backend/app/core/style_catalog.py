@@ -0,0 +1,65 @@
+import os
+import json
+import hashlib
+import threading
+from typing import Optional
+from core.prompt_generator import get_available_styles
+
+# Конфигурация HTTP-кеширования /prompts/styles
+# true - стили отдаются без авторизации и могут кешироваться CDN
+STYLES_PUBLIC = os.getenv("STYLES_PUBLIC", "false").lower() == "true"
+STYLES_CACHE_MAX_AGE_SECONDS = int(os.getenv("STYLES_CACHE_MAX_AGE_SECONDS") or 3600)
+
+
+class StyleCatalog:
+    """Готовый ответ /prompts/styles: сериализованное тело и его ETag.
+
+    Тело и ETag пересчитываются только при изменении реестра стилей
+    (``load`` с другим содержимым); обработчик отдает готовые байты.
+    """
+
+    def __init__(self):
+        self.styles: Optional[dict] = None
+        self.body = b""
+        self.etag = ""
+        self._lock = threading.Lock()
+
+    def load(self, styles: Optional[dict] = None) -> bool:
+        """Обновляет ответ по реестру стилей. Возвращает True, если он изменился"""
+        styles = get_available_styles() if styles is None else styles
+        with self._lock:
+            if styles == self.styles:
+                return False
+            # Ключи JSON - строки, как и в ответе, который собирал FastAPI
+            body = json.dumps(styles, ensure_ascii=False, separators=(",", ":")).encode()
+            self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+            self.body = body
+            self.styles = styles
+            return True
+
+    def current(self):
+        """Возвращает (тело, ETag), при первом обращении собирая их"""
+        if self.styles is None:
+            self.load()
+        return self.body, self.etag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Проверяет заголовок If-None-Match (сравнение слабое, как требует RFC 9110)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def cache_control() -> str:
+    if STYLES_PUBLIC:
+        return f"public, max-age={STYLES_CACHE_MAX_AGE_SECONDS}"
+    # Ответ за авторизацией: общие кеши его не хранят
+    return f"private, max-age={STYLES_CACHE_MAX_AGE_SECONDS}"
+
+
+style_catalog = StyleCatalog()
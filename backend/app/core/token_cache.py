@@ -0,0 +1,101 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+from core.metrics import TOKEN_CACHE_REQUESTS
+
+# Конфигурация кеша проверенных JWT
+TOKEN_CACHE_ENABLED = os.getenv("TOKEN_CACHE_ENABLED", "true").lower() == "true"
+TOKEN_CACHE_MAX_SIZE = int(os.getenv("TOKEN_CACHE_MAX_SIZE") or 10000)
+# Запись удаляется на столько секунд раньше exp, чтобы расхождение часов
+# не продлило жизнь токена дольше, чем позволила бы полная проверка
+TOKEN_CACHE_SKEW_SECONDS = float(os.getenv("TOKEN_CACHE_SKEW_SECONDS") or 5)
+
+
+def token_digest(token: str) -> bytes:
+    """Ключ кеша: сам токен в памяти не храним"""
+    return hashlib.sha256(token.encode()).digest()
+
+
+class VerifiedTokenCache:
+    """LRU-кеш payload уже проверенных JWT.
+
+    Срок записи считается по ``time.monotonic()`` от ``exp`` токена за вычетом
+    запаса на расхождение часов, поэтому перевод системных часов не продлевает
+    жизнь записи. Токены без ``exp`` не кешируются.
+    """
+
+    def __init__(self, max_size: int = TOKEN_CACHE_MAX_SIZE, skew: float = TOKEN_CACHE_SKEW_SECONDS, enabled: bool = TOKEN_CACHE_ENABLED):
+        self.max_size = max_size
+        self.skew = skew
+        self.enabled = enabled
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._digests_by_subject = {}
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[dict]:
+        """Возвращает payload проверенного токена или None"""
+        if not self.enabled:
+            return None
+        digest = token_digest(token)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    self._remove(digest)
+                TOKEN_CACHE_REQUESTS.labels("miss").inc()
+                return None
+            self._entries.move_to_end(digest)
+        TOKEN_CACHE_REQUESTS.labels("hit").inc()
+        return entry[1]
+
+    def put(self, token: str, payload: dict) -> None:
+        """Запоминает payload токена, прошедшего полную проверку"""
+        if not self.enabled or "exp" not in payload:
+            return
+        ttl = payload["exp"] - time.time() - self.skew
+        if ttl <= 0:
+            return
+        digest = token_digest(token)
+        subject = payload.get("sub")
+        with self._lock:
+            self._remove(digest)
+            self._entries[digest] = (time.monotonic() + ttl, payload)
+            self._digests_by_subject.setdefault(subject, set()).add(digest)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def purge(self, token: str) -> None:
+        """Удаляет токен из кеша (выход из системы)"""
+        with self._lock:
+            self._remove(token_digest(token))
+
+    def purge_subject(self, subject: str) -> None:
+        """Удаляет все токены пользователя (смена пароля, отзыв)"""
+        with self._lock:
+            for digest in list(self._digests_by_subject.get(subject, ())):
+                self._remove(digest)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._digests_by_subject.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, digest: bytes) -> None:
+        entry = self._entries.pop(digest, None)
+        if entry is None:
+            return
+        subject = entry[1].get("sub")
+        digests = self._digests_by_subject.get(subject)
+        if digests is not None:
+            digests.discard(digest)
+            if not digests:
+                del self._digests_by_subject[subject]
+
+
+verified_tokens = VerifiedTokenCache()
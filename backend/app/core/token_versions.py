@@ -0,0 +1,63 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional
+from core.shared_state import shared_state
+
+# Сколько воркер доверяет известной ему версии токенов пользователя.
+# Смена пароля в этом же воркере действует сразу; в остальных - тоже сразу
+# при запуске через serve.py (общие номера изменений), иначе не позже TTL
+TOKEN_VERSION_CACHE_TTL_SECONDS = float(os.getenv("TOKEN_VERSION_CACHE_TTL_SECONDS") or 60)
+TOKEN_VERSION_CACHE_MAX_SIZE = int(os.getenv("TOKEN_VERSION_CACHE_MAX_SIZE") or 100000)
+
+
+class TokenVersionRegistry:
+    """Текущие версии токенов пользователей в памяти воркера.
+
+    Позволяет проверять отзыв токенов без запроса к БД: версия в токене
+    должна совпадать с версией пользователя. С ``epochs`` версия, известная
+    до ``invalidate`` в любом воркере, перечитывается из БД.
+    """
+
+    def __init__(self, ttl: float = TOKEN_VERSION_CACHE_TTL_SECONDS, max_size: int = TOKEN_VERSION_CACHE_MAX_SIZE, epochs=None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.epochs = epochs
+        self._versions: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[int]:
+        """Возвращает известную версию или None, если ее нужно перечитать из БД"""
+        with self._lock:
+            entry = self._versions.get(user_id)
+            if entry is None:
+                return None
+            expires_at, epoch, version = entry
+            if expires_at <= time.monotonic() or (self.epochs is not None and self.epochs.get(user_id) != epoch):
+                del self._versions[user_id]
+                return None
+            self._versions.move_to_end(user_id)
+            return version
+
+    def set(self, user_id: int, version: int) -> None:
+        epoch = self.epochs.get(user_id) if self.epochs is not None else 0
+        with self._lock:
+            self._versions[user_id] = (time.monotonic() + self.ttl, epoch, version)
+            self._versions.move_to_end(user_id)
+            while len(self._versions) > self.max_size:
+                self._versions.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        """Сбрасывает версию во всех воркерах; вызывается при отзыве токенов"""
+        if self.epochs is not None:
+            self.epochs.bump(user_id)
+        with self._lock:
+            self._versions.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._versions.clear()
+
+
+token_versions = TokenVersionRegistry(epochs=shared_state.epoch("token_versions") if shared_state else None)
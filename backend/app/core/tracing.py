@@ -0,0 +1,345 @@
+import os
+import sys
+import json
+import time
+import queue
+import random
+import atexit
+import logging
+import threading
+from contextvars import ContextVar
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Конфигурация трассировки.
+# Доля запросов, для которых строится трасса: 0 отключает трассировку полностью
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+# Куда выгружать спаны: stdout, file, memory или none
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "stdout").lower()
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "traces.jsonl")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "fluxo-api")
+# Максимальная длина SQL в атрибуте db.statement
+TRACE_MAX_STATEMENT_LENGTH = 500
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    """Интервал трассы. Используется как контекстный менеджер"""
+
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_id", "kind",
+        "start_ns", "end_ns", "attributes", "error", "_trace", "_token",
+    )
+
+    def __init__(self, name: str, trace: "_Trace", parent: Optional["Span"] = None, kind: str = "internal", attributes: Optional[dict] = None):
+        self.name = name
+        self.trace_id = trace.trace_id
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent.span_id if parent else None
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes or {}
+        self.error = None
+        self._trace = trace
+        self._token = None
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def end(self) -> None:
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        self._trace.finish(self)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        self.end()
+        _current_span.reset(self._token)
+
+
+class _NoopSpan:
+    """Заглушка для запросов вне выборки: ничего не записывает"""
+
+    __slots__ = ()
+
+    def set_attribute(self, key, value) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _Trace:
+    """Спаны одного запроса; выгружаются целиком после завершения корневого"""
+
+    __slots__ = ("trace_id", "root", "spans", "tracer")
+
+    def __init__(self, tracer: "Tracer"):
+        self.trace_id = "%032x" % random.getrandbits(128)
+        self.root = None
+        self.spans = []
+        self.tracer = tracer
+
+    def finish(self, span: Span) -> None:
+        self.spans.append(span)
+        if span is self.root:
+            self.tracer.exporter.export(self.spans)
+
+
+class InMemorySpanExporter:
+    """Хранит завершенные спаны в памяти (для тестов)"""
+
+    def __init__(self):
+        self._spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span]) -> None:
+        with self._lock:
+            self._spans.extend(spans)
+
+    def get_finished_spans(self) -> List[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp_json(spans: List[Span], service_name: str = TRACE_SERVICE_NAME) -> dict:
+    """Преобразует спаны в OTLP/JSON (формат ExportTraceServiceRequest)"""
+    kinds = {"internal": 1, "server": 2, "client": 3}
+    otlp_spans = []
+    for span in spans:
+        otlp_span = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": kinds.get(span.kind, 1),
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        }
+        if span.parent_id:
+            otlp_span["parentSpanId"] = span.parent_id
+        otlp_spans.append(otlp_span)
+
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+            "scopeSpans": [{"scope": {"name": "fluxo.tracing"}, "spans": otlp_spans}],
+        }]
+    }
+
+
+class OTLPJsonExporter:
+    """Пишет трассы в формате OTLP/JSON, по одной строке на трассу.
+
+    Запись выполняется в фоновом потоке, чтобы не блокировать event loop.
+    Такой файл читает, например, filelog/otlpjsonfile receiver OpenTelemetry Collector.
+    """
+
+    def __init__(self, stream=None, path: Optional[str] = None, max_queue_size: int = 2048):
+        self._stream = stream
+        self._path = path
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._worker, name="trace-exporter", daemon=True)
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    def export(self, spans: List[Span]) -> None:
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped += 1
+
+    def _worker(self) -> None:
+        output = self._stream or open(self._path, "a", encoding="utf-8")
+        while True:
+            spans = self._queue.get()
+            if spans is None:
+                break
+            try:
+                output.write(json.dumps(to_otlp_json(spans), ensure_ascii=False) + "\n")
+                output.flush()
+            except Exception:
+                logger.warning("Не удалось выгрузить трассу", exc_info=True)
+        if output is not self._stream:
+            output.close()
+
+    def shutdown(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+
+class _NullExporter:
+    def export(self, spans: List[Span]) -> None:
+        pass
+
+
+def create_exporter(kind: str):
+    """Создает экспортер по имени из конфигурации"""
+    if kind == "stdout":
+        return OTLPJsonExporter(stream=sys.stdout)
+    if kind == "file":
+        return OTLPJsonExporter(path=TRACE_EXPORT_PATH)
+    if kind == "memory":
+        return InMemorySpanExporter()
+    return _NullExporter()
+
+
+class Tracer:
+    """Трассировщик с вероятностным семплированием корневых спанов.
+
+    Решение о семплировании принимается один раз на запрос; для запросов вне
+    выборки все вложенные ``span()`` возвращают заглушку без аллокаций.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, exporter=None):
+        self.sample_rate = sample_rate
+        self.exporter = exporter or _NullExporter()
+
+    def configure(self, sample_rate: Optional[float] = None, exporter=None) -> None:
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if exporter is not None:
+            self.exporter = exporter
+
+    def start_trace(self, name: str, kind: str = "server", **attributes):
+        """Начинает новую трассу, если запрос попал в выборку"""
+        if self.sample_rate <= 0 or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+            return NOOP_SPAN
+        trace = _Trace(self)
+        trace.root = Span(name, trace, kind=kind, attributes=attributes)
+        return trace.root
+
+    def span(self, name: str, kind: str = "internal", **attributes):
+        """Создает вложенный спан в текущей трассе"""
+        parent = _current_span.get()
+        if parent is None:
+            return NOOP_SPAN
+        return Span(name, parent._trace, parent=parent, kind=kind, attributes=attributes)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+tracer = Tracer(
+    sample_rate=TRACE_SAMPLE_RATE,
+    exporter=create_exporter(TRACE_EXPORTER) if TRACE_SAMPLE_RATE > 0 else None,
+)
+
+
+class TracingMiddleware:
+    """ASGI middleware: корневой спан на каждый HTTP-запрос"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        root = tracer.start_trace("HTTP " + scope["method"], **{"http.method": scope["method"]})
+        if root is NOOP_SPAN:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.set_attribute("http.status_code", message["status"])
+            await send(message)
+
+        with root:
+            await self.app(scope, receive, send_wrapper)
+            route = getattr(scope.get("route"), "path", None)
+            if route:
+                root.name = f"{scope['method']} {route}"
+                root.set_attribute("http.route", route)
+
+
+_instrumented = False
+
+
+def instrument() -> None:
+    """Автоинструментирование SQLAlchemy и httpx (идемпотентно)"""
+    global _instrumented
+    if _instrumented:
+        return
+    _instrumented = True
+
+    import httpx
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _start_db_span(conn, cursor, statement, parameters, context, executemany):
+        span = tracer.span("db.query", kind="client", **{
+            "db.system": conn.dialect.name,
+            "db.statement": statement[:TRACE_MAX_STATEMENT_LENGTH],
+        })
+        conn.info.setdefault("trace_spans", []).append(span)
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _end_db_span(conn, cursor, statement, parameters, context, executemany):
+        conn.info["trace_spans"].pop().end()
+
+    @event.listens_for(Engine, "handle_error")
+    def _fail_db_span(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("trace_spans"):
+            span = conn.info["trace_spans"].pop()
+            if span is not NOOP_SPAN:
+                span.error = type(exception_context.original_exception).__name__
+            span.end()
+
+    original_send = httpx.AsyncClient.send
+
+    async def traced_send(self, request, *args, **kwargs):
+        span = tracer.span("HTTP " + request.method, kind="client", **{
+            "http.method": request.method,
+            "http.url": f"{request.url.scheme}://{request.url.host}{request.url.path}",
+        })
+        with span:
+            response = await original_send(self, request, *args, **kwargs)
+            span.set_attribute("http.status_code", response.status_code)
+            return response
+
+    httpx.AsyncClient.send = traced_send
@@ -0,0 +1,108 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+from core.metrics import USER_CACHE_REQUESTS, USER_CACHE_SIZE
+from core.shared_state import shared_state
+from schemas.user import UserSnapshot
+
+# Конфигурация кеша пользователей. Кеш свой у каждого воркера; при запуске
+# через serve.py изменения из других воркеров видны сразу благодаря общим
+# номерам изменений, иначе - не позже чем через TTL
+USER_CACHE_ENABLED = os.getenv("USER_CACHE_ENABLED", "true").lower() == "true"
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS") or 30)
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE") or 10000)
+
+
+class UserCache:
+    """TTL-кеш снимков пользователей по id с индексом по email.
+
+    Хранит только ``UserSnapshot`` - без ORM-объектов, поэтому снимок можно
+    отдавать в обработчики любого запроса. При переполнении вытесняются
+    давно не использованные записи.
+
+    ``epochs`` - общие для воркеров номера изменений (EpochArray): запись,
+    заполненная до ``invalidate`` в любом воркере, считается устаревшей.
+    """
+
+    def __init__(self, ttl: float = USER_CACHE_TTL_SECONDS, max_size: int = USER_CACHE_MAX_SIZE,
+                 enabled: bool = USER_CACHE_ENABLED, epochs=None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.enabled = enabled
+        self.epochs = epochs
+        self._entries: "OrderedDict[int, Tuple[float, int, UserSnapshot]]" = OrderedDict()
+        self._ids_by_email = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[UserSnapshot]:
+        """Возвращает снимок пользователя или None, если его нет или он устарел"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                USER_CACHE_REQUESTS.labels("miss").inc()
+                return None
+            expires_at, epoch, snapshot = entry
+            if expires_at <= time.monotonic():
+                self._remove(user_id)
+                USER_CACHE_REQUESTS.labels("expired").inc()
+                return None
+            if self.epochs is not None and self.epochs.get(user_id) != epoch:
+                # Пользователя изменили в другом воркере
+                self._remove(user_id)
+                USER_CACHE_REQUESTS.labels("invalidated").inc()
+                return None
+            self._entries.move_to_end(user_id)
+            USER_CACHE_REQUESTS.labels("hit").inc()
+            return snapshot
+
+    def get_by_email(self, email: str) -> Optional[UserSnapshot]:
+        if not self.enabled:
+            return None
+        user_id = self._ids_by_email.get(email)
+        if user_id is None:
+            USER_CACHE_REQUESTS.labels("miss").inc()
+            return None
+        return self.get(user_id)
+
+    def put(self, user) -> UserSnapshot:
+        """Кладет в кеш снимок ORM-пользователя и возвращает его"""
+        snapshot = user if isinstance(user, UserSnapshot) else UserSnapshot.model_validate(user)
+        if not self.enabled:
+            return snapshot
+        epoch = self.epochs.get(snapshot.id) if self.epochs is not None else 0
+        with self._lock:
+            self._remove(snapshot.id)
+            self._entries[snapshot.id] = (time.monotonic() + self.ttl, epoch, snapshot)
+            self._ids_by_email[snapshot.email] = snapshot.id
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+            USER_CACHE_SIZE.set(len(self._entries))
+        return snapshot
+
+    def invalidate(self, user_id: int) -> None:
+        """Удаляет пользователя из кеша; вызывается после изменения его записи"""
+        if self.epochs is not None:
+            self.epochs.bump(user_id)
+        with self._lock:
+            self._remove(user_id)
+            USER_CACHE_SIZE.set(len(self._entries))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._ids_by_email.clear()
+            USER_CACHE_SIZE.set(0)
+
+    def _remove(self, user_id: int) -> None:
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            email = entry[2].email
+            if self._ids_by_email.get(email) == user_id:
+                del self._ids_by_email[email]
+
+
+user_cache = UserCache(epochs=shared_state.epoch("users") if shared_state else None)
@@ -0,0 +1,62 @@
+import os
+import asyncio
+import logging
+from datetime import datetime
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from models.email_verification import EmailVerificationCode
+
+logger = logging.getLogger(__name__)
+
+# Конфигурация очистки кодов подтверждения
+VERIFICATION_CLEANUP_INTERVAL_SECONDS = float(os.getenv("VERIFICATION_CLEANUP_INTERVAL_SECONDS") or 3600)
+# Удаляем небольшими пачками, чтобы не держать долгие блокировки таблицы
+VERIFICATION_CLEANUP_BATCH_SIZE = int(os.getenv("VERIFICATION_CLEANUP_BATCH_SIZE") or 1000)
+# Пауза между пачками, чтобы очистка не вытесняла обычные запросы
+VERIFICATION_CLEANUP_BATCH_PAUSE_SECONDS = float(os.getenv("VERIFICATION_CLEANUP_BATCH_PAUSE_SECONDS") or 0.05)
+
+
+def delete_stale_batch(db: Session, batch_size: int = VERIFICATION_CLEANUP_BATCH_SIZE) -> int:
+    """Удаляет одну пачку использованных или истекших кодов и коммитит ее"""
+    stale_ids = db.query(EmailVerificationCode.id).filter(
+        or_(
+            EmailVerificationCode.is_used == True,
+            EmailVerificationCode.expires_at <= datetime.utcnow()
+        )
+    ).order_by(EmailVerificationCode.id).limit(batch_size).subquery()
+    deleted = db.query(EmailVerificationCode).filter(
+        EmailVerificationCode.id.in_(db.query(stale_ids.c.id))
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+async def cleanup_verification_codes(session_factory, batch_size: int = VERIFICATION_CLEANUP_BATCH_SIZE,
+                                     pause: float = VERIFICATION_CLEANUP_BATCH_PAUSE_SECONDS) -> int:
+    """Удаляет все устаревшие коды пачками, каждая в своей транзакции"""
+    def delete_batch() -> int:
+        db = session_factory()
+        try:
+            return delete_stale_batch(db, batch_size)
+        finally:
+            db.close()
+
+    total = 0
+    while True:
+        deleted = await run_in_threadpool(delete_batch)
+        total += deleted
+        if deleted < batch_size:
+            return total
+        await asyncio.sleep(pause)
+
+
+async def run_cleanup_loop(session_factory, interval: float = VERIFICATION_CLEANUP_INTERVAL_SECONDS) -> None:
+    """Фоновая задача: периодическая очистка таблицы кодов подтверждения"""
+    while True:
+        try:
+            deleted = await cleanup_verification_codes(session_factory)
+            logger.debug("Удалены устаревшие коды подтверждения", extra={"deleted": deleted})
+        except Exception:
+            logger.warning("Не удалось очистить коды подтверждения", exc_info=True)
+        await asyncio.sleep(interval)
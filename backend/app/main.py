@@ -1,27 +1,104 @@
+import time
+# Время до готовности воркера отсчитывается от начала импорта приложения
+_import_started_at = time.perf_counter()
+
 import os
+import asyncio
+import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routers import auth, prompts
-from core.database import create_tables
+from starlette.concurrency import run_in_threadpool
+from core.logging_config import setup_logging, shutdown_logging
+from core.compression import COMPRESSION_ENABLED, CompressionMiddleware
+from core.metrics import METRICS_ENABLED, MetricsMiddleware, mark_worker_stopped, metrics_response
+from core.tracing import TracingMiddleware, instrument as instrument_tracing
+from core.server_timing import SERVER_TIMING_ENABLED, ServerTimingMiddleware, TimedJSONResponse
+from core.sql_profiler import SQL_PROFILER_ENABLED, SqlProfilerMiddleware
+from routers import auth, live, me, prompts
+from core.database import SessionLocal, create_tables, engine, replica_set, DatabaseRoutingMiddleware
+from core.prompt_generator import close_http_client, prewarm_http_client
+from core.startup import STARTUP_MODE, StartupTimer, check_schema, prewarm_pool
+from core.revocation import run_sync_loop as run_revocation_sync_loop
+from core.verification_cleanup import run_cleanup_loop as run_verification_cleanup_loop
+from services.email_outbox import run_outbox_loop
+from services.email_templates import email_templates
+from core.style_catalog import style_catalog
+from core.password_hashing import password_hasher
+
+# Логи пишутся в очередь и выводятся отдельным потоком, не блокируя event loop
+setup_logging()
+logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Fluxo API", version="1.0.0")
+app = FastAPI(title="Fluxo API", version="1.0.0", default_response_class=TimedJSONResponse)
 
-# Создаем таблицы при запуске приложения
+# Подготовка воркера: схема БД, шаблоны, прогрев соединений, фоновые задачи
 @app.on_event("startup")
 async def startup_event():
-    print("🚀 Запуск приложения Fluxo API...")
-    try:
-        create_tables()
-        print("✅ Инициализация базы данных завершена успешно!")
-        
-        # Дополнительная проверка и инициализация данных
-        from core.seed_data import seed_initial_data
-        seed_initial_data()
-        
-    except Exception as e:
-        print(f"❌ Ошибка инициализации базы данных: {e}")
-        # Не останавливаем приложение, чтобы можно было диагностировать проблемы
-        pass
+    logger.info("Запуск приложения Fluxo API", extra={"startup_mode": STARTUP_MODE})
+    timer = StartupTimer()
+    
+    if STARTUP_MODE == "create":
+        # Локальная разработка: таблицы и начальные данные создаются при старте
+        with timer.stage("create_tables"):
+            try:
+                create_tables()
+                logger.info("Инициализация базы данных завершена")
+            except Exception:
+                logger.exception("Ошибка инициализации базы данных")
+                # Не останавливаем приложение, чтобы можно было диагностировать проблемы
+    elif STARTUP_MODE == "check":
+        # Миграции и seed_db.py выполняются шагом деплоя; воркер только сверяет
+        # ревизию и не запускается со схемой, которой не ожидает код
+        with timer.stage("schema_check"):
+            revision = await run_in_threadpool(check_schema, engine)
+        logger.info("Схема БД соответствует миграциям", extra={"revision": revision})
+    
+    # Шаблоны писем компилируются заранее, а не при первой регистрации
+    with timer.stage("email_templates"):
+        email_templates.load()
+    # Ответ /prompts/styles сериализуется один раз
+    with timer.stage("styles"):
+        style_catalog.load()
+    
+    # Соединения с БД и OpenRouter открываются до приема запросов
+    with timer.stage("db_pool"):
+        try:
+            await run_in_threadpool(prewarm_pool, engine)
+            for replica in replica_set.engines if replica_set is not None else ():
+                await run_in_threadpool(prewarm_pool, replica)
+        except Exception:
+            logger.warning("Не удалось заранее открыть соединения с БД", exc_info=True)
+    with timer.stage("upstream"):
+        await prewarm_http_client()
+    
+    # Загрузка и синхронизация списка отозванных токенов между воркерами
+    app.state.revocation_sync = asyncio.create_task(run_revocation_sync_loop(SessionLocal))
+    # Периодическая очистка использованных и истекших кодов подтверждения
+    app.state.verification_cleanup = asyncio.create_task(run_verification_cleanup_loop(SessionLocal))
+    # Отправка писем из очереди email_outbox
+    app.state.email_outbox = asyncio.create_task(run_outbox_loop(SessionLocal))
+    
+    logger.info(
+        "Приложение готово к приему запросов",
+        extra={
+            "import_ms": round((_import_finished_at - _import_started_at) * 1000, 1),
+            "startup_ms": timer.total_ms(),
+            "ready_ms": round((time.perf_counter() - _import_started_at) * 1000, 1),
+            "stages_ms": timer.stages,
+        }
+    )
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.revocation_sync.cancel()
+    app.state.verification_cleanup.cancel()
+    app.state.email_outbox.cancel()
+    await close_http_client()
+    password_hasher.shutdown()
+    mark_worker_stopped()
+    # Дописываем оставшиеся в очереди записи лога
+    shutdown_logging()
 
 # Настройка CORS
 origins = [
@@ -42,10 +119,46 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Сжатие ответов (gzip/brotli/zstd); внутри Server-Timing, чтобы время
+# сжатия попало в этап compress
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+# Метрики времени обработки запросов по маршрутам
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# Трассировка запросов; SQL и httpx инструментируются автоматически
+instrument_tracing()
+app.add_middleware(TracingMiddleware)
+
+# Разбивка времени обработки по этапам в заголовке Server-Timing
+if SERVER_TIMING_ENABLED:
+    app.add_middleware(ServerTimingMiddleware, allowed_origins=origins)
+
+# Профиль SQL-запросов: лог медленных выражений и подозрений на N+1
+if SQL_PROFILER_ENABLED:
+    app.add_middleware(SqlProfilerMiddleware)
+
+# Чтение с реплик до первой записи в запросе
+if replica_set is not None:
+    app.add_middleware(DatabaseRoutingMiddleware)
+
 # Подключение роутеров
 app.include_router(auth.router)
 app.include_router(prompts.router)
+app.include_router(me.router)
+app.include_router(live.router)
 
 @app.get('/health')
 def check_health():
     return {'status': 'ok'}
+
+
+if METRICS_ENABLED:
+    @app.get('/metrics', include_in_schema=False)
+    def get_metrics():
+        return metrics_response()
+
+
+_import_finished_at = time.perf_counter()
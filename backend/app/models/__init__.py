@@ -3,11 +3,15 @@ from .user import User
 from .prompt_style import PromptStyle
 from .prompt_request import PromptRequest
 from .email_verification import EmailVerificationCode
+from .revoked_token import RevokedToken
+from .email_outbox import EmailOutbox
 
 __all__ = [
     "Base",
     "User",
     "PromptStyle", 
     "PromptRequest",
-    "EmailVerificationCode"
+    "EmailVerificationCode",
+    "RevokedToken",
+    "EmailOutbox"
 ]
\ No newline at end of file
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, Index, func
+from .base import Base
+
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        # Выборка писем, которые пора отправить
+        Index("ix_email_outbox_due", "status", "next_attempt_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    email_type = Column(String(32), nullable=False)
+    # Готовое письмо в формате Resend API: from, to, subject, html
+    payload = Column(JSON, nullable=False)
+    # pending - ждет отправки, sending - взято воркером, sent, failed
+    status = Column(String(16), default="pending", server_default="pending", nullable=False)
+    attempts = Column(Integer, default=0, server_default="0", nullable=False)
+    next_attempt_at = Column(DateTime, nullable=False)
+    last_error = Column(Text, nullable=True)
+    provider_id = Column(String(64), nullable=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    sent_at = Column(DateTime, nullable=True)
@@ -14,6 +14,8 @@ class User(Base):
     daily_limit = Column(Integer, default=3, nullable=False)
     requests_today = Column(Integer, default=0, nullable=False)
     last_request_date = Column(Date, nullable=True)
+    # Увеличивается при смене пароля: токены с прежней версией перестают приниматься
+    token_version = Column(Integer, default=0, server_default="0", nullable=False)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
     updated_at = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
 
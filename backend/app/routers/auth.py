@@ -1,32 +1,47 @@
-from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from core.database import get_db
+from core.database import get_db, get_read_db
+from core import server_timing
+from core.tracing import tracer
+from core.login_throttle import login_throttle
+from core.rate_limit import (
+    CONFIRM_EMAIL_IP_LIMIT,
+    CONFIRM_EMAIL_LIMIT,
+    REGISTER_LIMIT,
+    RESEND_CONFIRMATION_LIMIT,
+    rate_limit,
+)
+from core.revocation import revocation_list
+from core.token_cache import verified_tokens
+from core.token_versions import token_versions
+from core.user_cache import user_cache
 from core.auth import (
     authenticate_user,
     create_user,
-    create_access_token,
-    verify_token,
+    create_token_pair,
+    decode_access_token,
+    decode_refresh_token,
+    rotate_refresh_token,
+    token_expires_at,
     get_user_by_email,
     change_user_password,
     send_verification_code,
-    verify_email_code,
-    ACCESS_TOKEN_EXPIRE_MINUTES
+    verify_email_code
 )
-from schemas.user import UserCreate, UserLogin, UserResponse, Token, EmailConfirmation, EmailConfirmationRequest, EmailConfirmationResponse, PasswordChange, PasswordChangeResponse
+from schemas.user import UserCreate, UserLogin, UserResponse, UserSnapshot, TokenClaims, Token, RefreshTokenRequest, LogoutRequest, LogoutResponse, EmailConfirmation, EmailConfirmationRequest, EmailConfirmationResponse, PasswordChange, PasswordChangeResponse
 from models.user import User
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 security = HTTPBearer()
 
 
-@router.post("/register", response_model=EmailConfirmationResponse)
+@router.post("/register", response_model=EmailConfirmationResponse, dependencies=[Depends(rate_limit(REGISTER_LIMIT))])
 async def register(user: UserCreate, db: Session = Depends(get_db)):
     """Регистрация нового пользователя с отправкой кода подтверждения"""
     try:
         # Создаем пользователя
-        db_user = create_user(db, user)
+        db_user = await create_user(db, user)
         
         # Отправляем код подтверждения
         try:
@@ -50,25 +65,35 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
 
 
 @router.post("/login", response_model=Token)
-async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
+async def login(user_credentials: UserLogin, request: Request, db: Session = Depends(get_db)):
     """Авторизация пользователя"""
-    user = authenticate_user(db, user_credentials.email, user_credentials.password)
+    # Лимиты проверяются до bcrypt и запросов к БД
+    login_throttle.check(request.client.host if request.client else "unknown", user_credentials.email)
+    
+    user = await authenticate_user(db, user_credentials.email, user_credentials.password)
     if not user:
+        login_throttle.record_failure(user_credentials.email)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неверный email или пароль",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
-    )
-    
-    return {"access_token": access_token, "token_type": "bearer"}
+    login_throttle.record_success(user_credentials.email)
+    return create_token_pair(user)
+
+
+@router.post("/refresh", response_model=Token)
+async def refresh(request: RefreshTokenRequest, db: Session = Depends(get_db)):
+    """Обмен refresh-токена на новую пару токенов без ввода пароля"""
+    return rotate_refresh_token(db, request.refresh_token)
 
 
-@router.post("/confirm-email", response_model=EmailConfirmationResponse)
+@router.post(
+    "/confirm-email",
+    response_model=EmailConfirmationResponse,
+    dependencies=[Depends(rate_limit(CONFIRM_EMAIL_IP_LIMIT)), Depends(rate_limit(CONFIRM_EMAIL_LIMIT))]
+)
 async def confirm_email(confirmation: EmailConfirmation, db: Session = Depends(get_db)):
     """Подтверждение email по коду"""
     try:
@@ -87,7 +112,7 @@ async def confirm_email(confirmation: EmailConfirmation, db: Session = Depends(g
         )
 
 
-@router.post("/resend-confirmation", response_model=EmailConfirmationResponse)
+@router.post("/resend-confirmation", response_model=EmailConfirmationResponse, dependencies=[Depends(rate_limit(RESEND_CONFIRMATION_LIMIT))])
 async def resend_confirmation(request: EmailConfirmationRequest, db: Session = Depends(get_db)):
     """Повторная отправка кода подтверждения"""
     # Находим пользователя
@@ -120,30 +145,138 @@ async def resend_confirmation(request: EmailConfirmationRequest, db: Session = D
         )
 
 
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def _decode_credentials(credentials: HTTPAuthorizationCredentials) -> dict:
+    payload = decode_access_token(credentials.credentials)
+    if payload is None:
+        raise _unauthorized("Неверный токен")
+    return payload
+
+
+def _check_not_revoked(db: Session, payload: dict) -> None:
+    jti = payload.get("jti")
+    if jti is not None and revocation_list.is_revoked(db, jti):
+        raise _unauthorized("Токен отозван")
+
+
+def _check_token_version(db: Session, user_id: int, version: int) -> None:
+    """Сверяет версию токена с текущей версией пользователя"""
+    known = token_versions.get(user_id)
+    if known is None or version > known:
+        # Версия неизвестна воркеру или токен выдан после смены пароля
+        # в другом воркере - перечитываем из БД
+        known = db.query(User.token_version).filter(User.id == user_id).scalar()
+        if known is None:
+            raise _unauthorized("Пользователь не найден")
+        token_versions.set(user_id, known)
+    if version != known:
+        raise _unauthorized("Токен отозван")
+
+
+def _resolve_user(db: Session, payload: dict) -> UserSnapshot:
+    """Находит пользователя токена (в кеше или БД) и сверяет версию токена"""
+    _check_not_revoked(db, payload)
+    email = payload["sub"]
+    version = payload.get("ver")
+    
+    snapshot = user_cache.get_by_email(email)
+    if snapshot is not None and version is not None and version > snapshot.token_version:
+        # Кеш старше токена: пароль сменили в другом воркере
+        snapshot = None
+    
+    if snapshot is None:
+        user = get_user_by_email(db, email)
+        if user is None:
+            raise _unauthorized("Пользователь не найден")
+        snapshot = user_cache.put(user)
+        token_versions.set(snapshot.id, snapshot.token_version)
+    
+    # Токены старого формата без версии принимаются до истечения срока
+    if version is not None and version != snapshot.token_version:
+        raise _unauthorized("Токен отозван")
+    
+    return snapshot
+
+
+def authenticate_token(db: Session, token: str) -> UserSnapshot:
+    """Проверка access-токена, переданного не в заголовке (сообщением WebSocket)"""
+    payload = decode_access_token(token)
+    if payload is None:
+        raise _unauthorized("Неверный токен")
+    return _resolve_user(db, payload)
+
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> UserResponse:
-    """Получение текущего пользователя по JWT токену"""
-    token = credentials.credentials
-    email = verify_token(token)
-    
-    if email is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Неверный токен",
-            headers={"WWW-Authenticate": "Bearer"},
+    db: Session = Depends(get_read_db)
+) -> UserSnapshot:
+    """Получение текущего пользователя по JWT токену.
+
+    Возвращает снимок без привязки к сессии: обработчики, которым нужно
+    изменить пользователя, загружают его из БД сами.
+    """
+    with tracer.span("auth.get_current_user"), server_timing.stage("auth"):
+        return _resolve_user(db, _decode_credentials(credentials))
+
+
+async def get_token_claims(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_read_db)
+) -> TokenClaims:
+    """Проверка JWT без загрузки пользователя.
+
+    Для эндпоинтов, которым нужен только id пользователя. К БД обращается
+    лишь когда воркер еще не знает версию токенов пользователя.
+    """
+    with tracer.span("auth.get_token_claims"), server_timing.stage("auth"):
+        payload = _decode_credentials(credentials)
+        if "uid" not in payload:
+            # Токен старого формата содержит только email
+            user = _resolve_user(db, payload)
+            return TokenClaims(
+                user_id=user.id,
+                email=user.email,
+                is_email_confirmed=user.is_email_confirmed,
+                token_version=user.token_version,
+            )
+        
+        claims = TokenClaims(
+            user_id=payload["uid"],
+            email=payload["sub"],
+            is_email_confirmed=payload.get("email_confirmed", False),
+            token_version=payload.get("ver", 0),
         )
+        _check_not_revoked(db, payload)
+        _check_token_version(db, claims.user_id, claims.token_version)
+        return claims
+
+
+@router.post("/logout", response_model=LogoutResponse)
+async def logout(
+    request: LogoutRequest,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    claims: TokenClaims = Depends(get_token_claims),
+    db: Session = Depends(get_db)
+):
+    """Выход: отзывает текущий access-токен и переданный refresh-токен"""
+    payload = decode_access_token(credentials.credentials)
+    if "jti" in payload:
+        revocation_list.revoke(db, payload["jti"], claims.user_id, token_expires_at(payload))
+    verified_tokens.purge(credentials.credentials)
     
-    user = get_user_by_email(db, email)
-    if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Пользователь не найден",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+    if request.refresh_token:
+        refresh_payload = decode_refresh_token(request.refresh_token)
+        if refresh_payload is not None and refresh_payload["uid"] == claims.user_id:
+            revocation_list.revoke(db, refresh_payload["jti"], claims.user_id, token_expires_at(refresh_payload))
     
-    return user
+    return LogoutResponse(message="Вы вышли из системы")
 
 
 @router.get("/me", response_model=UserResponse)
@@ -169,7 +302,7 @@ async def change_password(
     
     try:
         # Меняем пароль
-        change_user_password(
+        await change_user_password(
             db=db,
             user=user,
             current_password=password_data.current_password,
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+from typing import Dict, Tuple
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, status
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
+from core.database import get_sessionmaker
+from core.live import (
+    CLOSE_UNAUTHORIZED,
+    LIVE_AUTH_TIMEOUT_SECONDS,
+    LIVE_MAX_INFLIGHT,
+    LiveConnection,
+    SlowConsumer,
+    live_hub,
+)
+from core.metrics import LIVE_CONNECTIONS, LIVE_DISCONNECTS, LIVE_MESSAGES
+from core.prompt_generator import stream_prompt
+from routers.auth import authenticate_token
+from routers.prompts import check_style, load_user_within_limit, notify_live, save_prompt_request, user_limits
+from models.user import User
+from schemas.live import (
+    AuthMessage,
+    CancelMessage,
+    ChunkMessage,
+    ClientMessage,
+    DoneMessage,
+    ErrorMessage,
+    GenerateMessage,
+    ReadyMessage,
+)
+from schemas.prompt_request import PromptRequestResponse
+from schemas.user import UserResponse, UserSnapshot
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["live"])
+
+client_message = TypeAdapter(ClientMessage)
+
+
+def _authenticate(session_factory: sessionmaker, token: str) -> UserSnapshot:
+    with session_factory() as db:
+        return authenticate_token(db, token)
+
+
+class LiveSession:
+    """Генерации одного соединения /ws.
+
+    Каждая генерация - отдельная задача, поэтому несколько запросов идут
+    параллельно, а их фрагменты перемежаются в одном соединении и
+    различаются по ``id``.
+    """
+
+    def __init__(self, connection: LiveConnection, token: str, session_factory: sessionmaker):
+        self.connection = connection
+        self.user_id = connection.user_id
+        self.token = token
+        self.session_factory = session_factory
+        self.generations: Dict[str, asyncio.Task] = {}
+
+    async def handle(self, text: str) -> None:
+        try:
+            message = client_message.validate_json(text)
+        except ValidationError as e:
+            LIVE_MESSAGES.labels("in", "invalid").inc()
+            await self._error(
+                None,
+                status.HTTP_422_UNPROCESSABLE_ENTITY,
+                f"Ошибка валидации: {e.errors(include_url=False, include_input=False)}",
+            )
+            return
+        LIVE_MESSAGES.labels("in", message.type).inc()
+
+        if isinstance(message, CancelMessage):
+            task = self.generations.get(message.id)
+            if task is not None:
+                task.cancel()
+            return
+
+        if message.id in self.generations:
+            await self._error(message.id, status.HTTP_409_CONFLICT, "Генерация с таким id уже идет")
+        elif len(self.generations) >= LIVE_MAX_INFLIGHT:
+            await self._error(
+                message.id,
+                status.HTTP_429_TOO_MANY_REQUESTS,
+                f"Не больше {LIVE_MAX_INFLIGHT} одновременных генераций",
+            )
+        else:
+            self.generations[message.id] = asyncio.create_task(self._generate(message))
+
+    async def cancel_all(self) -> None:
+        """Отменяет идущие генерации: поток из OpenRouter закрывается, результат не сохраняется"""
+        tasks = list(self.generations.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _check(self, message: GenerateMessage) -> None:
+        # Токен мог быть отозван после подключения; остальные генерации
+        # соединения еще не учтены в счетчике, но займут лимит
+        with self.session_factory() as db:
+            authenticate_token(db, self.token)
+            check_style(message.style_id)
+            load_user_within_limit(db, self.user_id, pending=len(self.generations) - 1)
+
+    def _save(self, message: GenerateMessage, generated_prompt: str) -> Tuple[PromptRequestResponse, dict]:
+        with self.session_factory() as db:
+            user = db.get(User, self.user_id)
+            prompt_request = save_prompt_request(db, user, message, generated_prompt)
+            return PromptRequestResponse.model_validate(prompt_request), user_limits(user)
+
+    async def _generate(self, message: GenerateMessage) -> None:
+        try:
+            await run_in_threadpool(self._check, message)
+            parts = []
+            # Пока очередь отправки полна, send ждет и следующая часть из
+            # OpenRouter не читается
+            async for delta in stream_prompt(message.original_prompt, message.style_id):
+                parts.append(delta)
+                await self.connection.send(ChunkMessage(id=message.id, delta=delta).model_dump())
+            item, limits = await run_in_threadpool(self._save, message, "".join(parts))
+            self.generations.pop(message.id, None)
+            await self.connection.send(DoneMessage(id=message.id, request=item).model_dump(mode="json"))
+            notify_live(self.user_id, limits, item)
+        except HTTPException as e:
+            await self._error(message.id, e.status_code, e.detail)
+            if e.status_code == status.HTTP_401_UNAUTHORIZED:
+                await self.connection.close_after_sent(CLOSE_UNAUTHORIZED, e.detail)
+        except SlowConsumer:
+            # Соединение закрывается в LiveConnection.serve
+            pass
+        except Exception:
+            logger.exception("Ошибка генерации по WebSocket", extra={"user_id": self.user_id})
+            await self._error(message.id, status.HTTP_500_INTERNAL_SERVER_ERROR, "Внутренняя ошибка генерации")
+        finally:
+            self.generations.pop(message.id, None)
+
+    async def _error(self, generation_id, status_code: int, detail: str) -> None:
+        await self.connection.send(ErrorMessage(id=generation_id, status=status_code, detail=detail).model_dump())
+
+
+@router.websocket("/ws")
+async def live_channel(websocket: WebSocket, session_factory: sessionmaker = Depends(get_sessionmaker)):
+    """Генерации с потоковым ответом и обновления лимитов и истории в одном соединении.
+
+    Первым сообщением клиент присылает ``{"type": "auth", "token": ...}``,
+    затем ``generate`` и ``cancel``. Сервер отвечает ``ready``, ``chunk``,
+    ``done`` и ``error`` и после каждой генерации пользователя рассылает
+    ``limits`` и ``history`` во все его соединения.
+    """
+    await websocket.accept()
+    try:
+        text = await asyncio.wait_for(websocket.receive_text(), LIVE_AUTH_TIMEOUT_SECONDS)
+        auth = AuthMessage.model_validate_json(text)
+        user = await run_in_threadpool(_authenticate, session_factory, auth.token)
+    except WebSocketDisconnect:
+        return
+    except (asyncio.TimeoutError, ValidationError):
+        LIVE_DISCONNECTS.labels("unauthorized").inc()
+        await websocket.close(CLOSE_UNAUTHORIZED, "Ожидалось сообщение auth с токеном")
+        return
+    except HTTPException as e:
+        LIVE_DISCONNECTS.labels("unauthorized").inc()
+        await websocket.close(CLOSE_UNAUTHORIZED, e.detail)
+        return
+
+    connection = LiveConnection(websocket, user.id)
+    session = LiveSession(connection, auth.token, session_factory)
+    await connection.send(ReadyMessage(
+        user=UserResponse.model_validate(user, from_attributes=True),
+        limits=user_limits(user),
+    ).model_dump(mode="json"))
+    live_hub.add(connection)
+    LIVE_CONNECTIONS.inc()
+    try:
+        await connection.serve(session.handle)
+    finally:
+        live_hub.remove(connection)
+        LIVE_CONNECTIONS.dec()
+        await session.cancel_all()
@@ -0,0 +1,74 @@
+import json
+import hashlib
+from typing import Dict, Optional
+from fastapi import APIRouter, Depends, Query, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from core.database import get_read_db
+from core.style_catalog import style_catalog
+from routers.auth import get_current_user
+from routers.prompts import query_history, user_limits
+from schemas.bootstrap import BootstrapResponse
+from schemas.prompt_request import PromptRequestResponse
+from schemas.user import UserResponse, UserSnapshot
+
+router = APIRouter(prefix="/me", tags=["me"])
+
+BOOTSTRAP_HISTORY_MAX_LIMIT = 50
+
+
+def section_etag(data) -> str:
+    """Валидатор раздела: хеш его JSON-представления"""
+    body = json.dumps(jsonable_encoder(data), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.blake2b(body.encode(), digest_size=12).hexdigest()
+
+
+def parse_known(known: Optional[str]) -> Dict[str, str]:
+    """Разбирает "user:etag,history:etag" в словарь раздел -> etag"""
+    validators = {}
+    for item in (known or "").split(","):
+        name, _, etag = item.strip().partition(":")
+        if name and etag:
+            validators[name] = etag
+    return validators
+
+
+def build_section(name: str, data, known: Dict[str, str], etag: Optional[str] = None) -> dict:
+    etag = etag or section_etag(data)
+    if known.get(name) == etag:
+        return {"etag": etag, "not_modified": True}
+    return {"etag": etag, "data": data}
+
+
+@router.get("/bootstrap", response_model=BootstrapResponse)
+async def get_bootstrap(
+    response: Response,
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+    history_limit: int = Query(10, ge=1, le=BOOTSTRAP_HISTORY_MAX_LIMIT),
+    known: Optional[str] = Query(None, description="Известные клиенту валидаторы: раздел:etag через запятую"),
+):
+    """Данные для первой отрисовки дашборда одним запросом.
+
+    Пользователь проверяется один раз; лимиты считаются по его снимку из
+    кеша, стили берутся из памяти, к БД обращается только страница
+    истории. Разделы, etag которых клиент передал в ``known``, приходят
+    без данных с ``not_modified``.
+    """
+    validators = parse_known(known)
+    history = await run_in_threadpool(query_history, db, current_user.id, history_limit)
+    # Для стилей используется готовый ETag ответа /prompts/styles
+    _, styles_etag = style_catalog.current()
+    
+    # Ответ зависит от пользователя: промежуточные кеши его не хранят,
+    # а клиент перепроверяет разделы через known
+    response.headers["Cache-Control"] = "private, no-cache"
+    return {
+        "user": build_section("user", UserResponse.model_validate(current_user, from_attributes=True), validators),
+        "limits": build_section("limits", user_limits(current_user), validators),
+        "styles": build_section("styles", style_catalog.styles, validators, etag=styles_etag.strip('"')),
+        "history": build_section(
+            "history", [PromptRequestResponse.model_validate(item) for item in history], validators
+        ),
+    }
@@ -1,15 +1,26 @@
+import logging
 from datetime import date
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from typing import Dict, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from sqlalchemy.orm import Session
 from pydantic import ValidationError
-from core.database import get_db
+from core.database import get_db, get_read_db
+from core.logging_config import log_request_body
+from core.metrics import QUOTA_DENIALS
+from core.tracing import tracer
+from core.user_cache import user_cache
+from core.live import live_hub
 from core.prompt_generator import generate_prompt, get_available_styles
-from routers.auth import get_current_user
+from core.style_catalog import STYLES_PUBLIC, cache_control, etag_matches, style_catalog
+from routers.auth import get_current_user, get_token_claims
 from models.user import User
 from models.prompt_request import PromptRequest
-from schemas.user import UserResponse
+from schemas.user import TokenClaims, UserResponse
 from schemas.prompt_request import PromptRequestCreate, PromptRequestResponse
+from schemas.prompt_style import PromptStyleInfo
+from schemas.live import HistoryMessage, LimitsMessage
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/prompts", tags=["prompts"])
 
@@ -22,7 +33,9 @@ def check_daily_limit(db: Session, user: User) -> bool:
     if user.last_request_date != today:
         user.requests_today = 0
         user.last_request_date = today
+        user_id = user.id
         db.commit()
+        user_cache.invalidate(user_id)
     
     # Проверяем лимит
     if user.requests_today >= user.daily_limit:
@@ -34,141 +47,195 @@ def check_daily_limit(db: Session, user: User) -> bool:
 def increment_user_requests(db: Session, user: User):
     """Увеличивает счетчик запросов пользователя"""
     user.requests_today += 1
+    # id читаем до commit: после него обращение к атрибутам перезагружает объект
+    user_id = user.id
     db.commit()
+    user_cache.invalidate(user_id)
+
+
+def query_history(db: Session, user_id: int, limit: int = 10, offset: int = 0) -> List[PromptRequest]:
+    """Страница истории промптов пользователя, новые первыми"""
+    return db.query(PromptRequest).filter(
+        PromptRequest.user_id == user_id
+    ).order_by(PromptRequest.created_at.desc()).offset(offset).limit(limit).all()
+
+
+def user_limits(user: UserResponse) -> dict:
+    """Лимиты пользователя на сегодня по снимку из кеша, без обращения к БД"""
+    today = date.today()
+    # В новый день счетчик считается сброшенным; в БД он обнулится при
+    # следующем запросе на генерацию, поэтому эндпоинт ничего не пишет
+    if user.last_request_date != today:
+        requests_today = 0
+        last_request_date = today
+    else:
+        requests_today = user.requests_today
+        last_request_date = user.last_request_date
+    
+    return {
+        "daily_limit": user.daily_limit,
+        "requests_today": requests_today,
+        "remaining_requests": user.daily_limit - requests_today,
+        "last_request_date": last_request_date
+    }
+
+
+def load_user_within_limit(db: Session, user_id: int, pending: int = 0) -> User:
+    """Загружает пользователя для генерации и проверяет дневной лимит.
+
+    ``pending`` - генерации пользователя, которые уже идут, но еще не
+    учтены в счетчике.
+    """
+    with tracer.span("prompts.load_user"):
+        user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Пользователь не найден"
+        )
+    
+    with tracer.span("prompts.check_daily_limit"):
+        within_limit = check_daily_limit(db, user) and user.requests_today + pending < user.daily_limit
+    if not within_limit:
+        QUOTA_DENIALS.labels("daily_prompts").inc()
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Превышен дневной лимит запросов ({user.daily_limit})"
+        )
+    return user
+
+
+def check_style(style_id: Optional[int]) -> None:
+    """Проверяет валидность стиля, если он указан"""
+    if style_id and style_id not in get_available_styles():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Неверный ID стиля. Доступные стили: 1-4"
+        )
+
+
+def save_prompt_request(db: Session, user: User, request: PromptRequestCreate, generated_prompt: str) -> PromptRequest:
+    """Сохраняет результат генерации и учитывает его в дневном лимите"""
+    prompt_request = PromptRequest(
+        user_id=user.id,
+        original_prompt=request.original_prompt,
+        style_id=request.style_id,
+        generated_prompt=generated_prompt
+    )
+    db.add(prompt_request)
+    
+    # Увеличиваем счетчик запросов
+    increment_user_requests(db, user)
+    
+    db.commit()
+    db.refresh(prompt_request)
+    return prompt_request
+
+
+def notify_live(user_id: int, limits: dict, item: PromptRequestResponse) -> None:
+    """Рассылает новые лимиты и запись истории в WebSocket-соединения пользователя"""
+    live_hub.publish(
+        user_id,
+        LimitsMessage(data=limits).model_dump(mode="json"),
+        HistoryMessage(item=item).model_dump(mode="json"),
+    )
 
 
 @router.post("/create", response_model=PromptRequestResponse)
 async def create_prompt(
     raw_request: Request,
-    current_user: UserResponse = Depends(get_current_user),
+    claims: TokenClaims = Depends(get_token_claims),
     db: Session = Depends(get_db)
 ):
     """Создание нового промпта"""
-    print(f"🎯 Получен запрос на создание промпта:")
-    print(f"  - Content-Type: {raw_request.headers.get('content-type', 'не указан')}")
-    print(f"  - Method: {raw_request.method}")
-    print(f"  - URL: {raw_request.url}")
-    print(f"  - User-Agent: {raw_request.headers.get('user-agent', 'не указан')[:100]}...")
-    
     # Читаем JSON данные только один раз
     try:
         request_data = await raw_request.json()
-        print(f"  - JSON данные: {request_data}")
-        print(f"  - Тип JSON: {type(request_data)}")
+        log_request_body(
+            logger,
+            request_data,
+            path=raw_request.url.path,
+            user_id=claims.user_id,
+            content_type=raw_request.headers.get("content-type"),
+        )
         
         # Создаем Pydantic модель
         request = PromptRequestCreate(**request_data)
-        print(f"  - Успешно создана Pydantic модель: {request}")
         
     except ValidationError as e:
-        print(f"  - Ошибка валидации Pydantic: {e}")
-        print(f"  - Детали ошибки: {e.errors()}")
+        logger.info(
+            "Ошибка валидации запроса на создание промпта",
+            extra={"user_id": claims.user_id, "errors": e.errors(include_url=False, include_input=False)}
+        )
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail=f"Ошибка валидации: {e.errors()}"
         )
     except Exception as e:
-        print(f"  - Общая ошибка создания модели: {e}")
+        logger.info(
+            "Некорректное тело запроса на создание промпта",
+            extra={"user_id": claims.user_id, "error_type": type(e).__name__}
+        )
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Ошибка обработки запроса: {str(e)}"
         )
     
-    print(f"  - Пользователь: {current_user.email}")
-    print(f"  - Промпт: {request.original_prompt}")
-    print(f"  - Стиль: {request.style_id}")
-    # Получаем полного пользователя из БД
-    user = db.query(User).filter(User.id == current_user.id).first()
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Пользователь не найден"
-        )
-    
-    # Проверяем дневной лимит
-    if not check_daily_limit(db, user):
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail=f"Превышен дневной лимит запросов ({user.daily_limit})"
-        )
-    
-    # Проверяем валидность стиля, если указан
-    if request.style_id:
-        available_styles = get_available_styles()
-        if request.style_id not in available_styles:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Неверный ID стиля. Доступные стили: 1-4"
-            )
+    logger.debug(
+        "Запрос на создание промпта",
+        extra={"user_id": claims.user_id, "style_id": request.style_id, "prompt_length": len(request.original_prompt)}
+    )
+    # Получаем полного пользователя из БД и проверяем дневной лимит
+    user = load_user_within_limit(db, claims.user_id)
+    check_style(request.style_id)
     
     # Генерируем промпт
-    generated_prompt = await generate_prompt(request.original_prompt, request.style_id)
-    
-    # Создаем запись о запросе
-    prompt_request = PromptRequest(
-        user_id=user.id,
-        original_prompt=request.original_prompt,
-        style_id=request.style_id,
-        generated_prompt=generated_prompt
-    )
+    with tracer.span("prompts.generate", **{"prompt.style_id": request.style_id or 0}):
+        generated_prompt = await generate_prompt(request.original_prompt, request.style_id)
     
-    db.add(prompt_request)
+    with tracer.span("prompts.commit"):
+        prompt_request = save_prompt_request(db, user, request, generated_prompt)
     
-    # Увеличиваем счетчик запросов
-    increment_user_requests(db, user)
-    
-    db.commit()
-    db.refresh(prompt_request)
+    # Открытые вкладки пользователя получают новые лимиты и запись истории
+    if live_hub.has(claims.user_id):
+        notify_live(claims.user_id, user_limits(user), PromptRequestResponse.model_validate(prompt_request))
     
     return prompt_request
 
 
 @router.get("/history", response_model=List[PromptRequestResponse])
 async def get_user_history(
-    current_user: UserResponse = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    claims: TokenClaims = Depends(get_token_claims),
+    db: Session = Depends(get_read_db),
     limit: int = 10,
     offset: int = 0
 ):
     """Получение истории промптов пользователя"""
-    prompts = db.query(PromptRequest).filter(
-        PromptRequest.user_id == current_user.id
-    ).order_by(PromptRequest.created_at.desc()).offset(offset).limit(limit).all()
-    
-    return prompts
+    return query_history(db, claims.user_id, limit, offset)
 
 
-@router.get("/styles")
-async def get_prompt_styles(
-    current_user: UserResponse = Depends(get_current_user)
-):
-    """Получение доступных стилей промптов"""
-    return get_available_styles()
+@router.get(
+    "/styles",
+    response_model=Dict[int, PromptStyleInfo],
+    # Без авторизации ответ одинаков для всех и может кешироваться CDN
+    dependencies=[] if STYLES_PUBLIC else [Depends(get_token_claims)],
+)
+async def get_prompt_styles(request: Request):
+    """Получение доступных стилей промптов.
+
+    Тело сериализовано заранее; на условный запрос с актуальным ETag
+    отвечаем 304 без тела.
+    """
+    body, etag = style_catalog.current()
+    headers = {"ETag": etag, "Cache-Control": cache_control()}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
 
 
 @router.get("/limits")
 async def get_user_limits(
-    current_user: UserResponse = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserResponse = Depends(get_current_user)
 ):
     """Получение информации о лимитах пользователя"""
-    user = db.query(User).filter(User.id == current_user.id).first()
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Пользователь не найден"
-        )
-    
-    today = date.today()
-    # Если это новый день, сбрасываем счетчик
-    if user.last_request_date != today:
-        user.requests_today = 0
-        user.last_request_date = today
-        db.commit()
-    
-    return {
-        "daily_limit": user.daily_limit,
-        "requests_today": user.requests_today,
-        "remaining_requests": user.daily_limit - user.requests_today,
-        "last_request_date": user.last_request_date
-    }
\ No newline at end of file
+    return user_limits(current_user)
@@ -0,0 +1,30 @@
+from pydantic import BaseModel
+from datetime import date
+from typing import Dict, Generic, List, Optional, TypeVar
+from schemas.prompt_request import PromptRequestResponse
+from schemas.prompt_style import PromptStyleInfo
+from schemas.user import UserResponse
+
+T = TypeVar("T")
+
+
+class UserLimits(BaseModel):
+    daily_limit: int
+    requests_today: int
+    remaining_requests: int
+    last_request_date: date
+
+
+class BootstrapSection(BaseModel, Generic[T]):
+    """Раздел ответа /me/bootstrap с валидатором для условного запроса"""
+    etag: str
+    # Клиент прислал актуальный etag раздела: данные не передаются
+    not_modified: bool = False
+    data: Optional[T] = None
+
+
+class BootstrapResponse(BaseModel):
+    user: BootstrapSection[UserResponse]
+    limits: BootstrapSection[UserLimits]
+    styles: BootstrapSection[Dict[int, PromptStyleInfo]]
+    history: BootstrapSection[List[PromptRequestResponse]]
@@ -0,0 +1,64 @@
+from pydantic import BaseModel, Field
+from typing import Annotated, Literal, Optional, Union
+from schemas.bootstrap import UserLimits
+from schemas.prompt_request import PromptRequestCreate, PromptRequestResponse
+from schemas.user import UserResponse
+
+
+class AuthMessage(BaseModel):
+    """Первое сообщение клиента: браузер не передает заголовки при открытии WebSocket"""
+    type: Literal["auth"]
+    token: str
+
+
+class GenerateMessage(PromptRequestCreate):
+    """Запуск генерации; ``id`` выбирает клиент, им помечаются все ответы"""
+    type: Literal["generate"]
+    id: str = Field(..., min_length=1, max_length=64)
+
+
+class CancelMessage(BaseModel):
+    """Отмена генерации: результат не сохраняется и не учитывается в лимите"""
+    type: Literal["cancel"]
+    id: str
+
+
+ClientMessage = Annotated[Union[GenerateMessage, CancelMessage], Field(discriminator="type")]
+
+
+class ReadyMessage(BaseModel):
+    type: Literal["ready"] = "ready"
+    user: UserResponse
+    limits: UserLimits
+
+
+class ChunkMessage(BaseModel):
+    type: Literal["chunk"] = "chunk"
+    id: str
+    delta: str
+
+
+class DoneMessage(BaseModel):
+    type: Literal["done"] = "done"
+    id: str
+    request: PromptRequestResponse
+
+
+class ErrorMessage(BaseModel):
+    type: Literal["error"] = "error"
+    # Без id - ошибка сообщения, которое не удалось разобрать
+    id: Optional[str] = None
+    status: int
+    detail: str
+
+
+class LimitsMessage(BaseModel):
+    """Рассылается во все соединения пользователя после каждой генерации"""
+    type: Literal["limits"] = "limits"
+    data: UserLimits
+
+
+class HistoryMessage(BaseModel):
+    """Новая запись истории, рассылается вместе с ``limits``"""
+    type: Literal["history"] = "history"
+    item: PromptRequestResponse
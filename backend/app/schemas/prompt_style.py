@@ -20,4 +20,10 @@ class PromptStyleResponse(PromptStyleBase):
     id: int
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class PromptStyleInfo(BaseModel):
+    """Стиль в ответе /prompts/styles"""
+    name: str
+    description: str
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
 from datetime import datetime, date
 from typing import Optional, List
 
@@ -31,6 +31,13 @@ class UserResponse(UserBase):
         from_attributes = True
 
 
+class UserSnapshot(UserResponse):
+    """Неизменяемый снимок пользователя без привязки к сессии БД (для кеша)"""
+    model_config = ConfigDict(frozen=True)
+
+    token_version: int = 0
+
+
 class UserLogin(BaseModel):
     email: EmailStr
     password: str
@@ -39,12 +46,35 @@ class UserLogin(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
+
+class LogoutResponse(BaseModel):
+    message: str
 
 
 class TokenData(BaseModel):
     email: Optional[str] = None
 
 
+class TokenClaims(BaseModel):
+    """Данные пользователя из JWT. is_email_confirmed - на момент выдачи токена"""
+    model_config = ConfigDict(frozen=True)
+
+    user_id: int
+    email: str
+    is_email_confirmed: bool
+    token_version: int
+
+
 class EmailConfirmation(BaseModel):
     email: EmailStr
     code: str = Field(..., min_length=6, max_length=6)
@@ -10,9 +10,11 @@ import os
 # Добавляем текущую директорию в путь для импорта модулей
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from core.logging_config import setup_logging
 from core.seed_data import seed_initial_data
 
 if __name__ == "__main__":
+    setup_logging()
     print("🌱 Запуск ручного заполнения базы данных...")
     try:
         seed_initial_data()
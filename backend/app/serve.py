@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Production-запуск API: несколько воркеров uvicorn с uvloop и httptools
+Использование: python serve.py [--workers 4] [--port 8000]
+
+До запуска воркеров создаются общий сегмент памяти (core/shared_state.py),
+через который воркеры делят лимиты и инвалидацию кешей, и каталог файлов
+метрик prometheus_client. При одном воркере приложение работает в этом же
+процессе и общее состояние не нужно.
+"""
+
+import os
+import sys
+import glob
+import shutil
+import argparse
+import tempfile
+from typing import Optional
+
+# Добавляем текущую директорию в путь для импорта модулей
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import uvicorn
+
+# Конфигурация сервера
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT") or 8000)
+# По умолчанию по воркеру на ядро
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY") or os.cpu_count() or 1)
+# Сколько воркер дожидается активных запросов при остановке
+GRACEFUL_TIMEOUT_SECONDS = int(os.getenv("GRACEFUL_TIMEOUT_SECONDS") or 30)
+KEEP_ALIVE_TIMEOUT_SECONDS = int(os.getenv("KEEP_ALIVE_TIMEOUT_SECONDS") or 5)
+# Перезапуск воркера после указанного числа запросов (0 - без перезапуска)
+WORKER_MAX_REQUESTS = int(os.getenv("WORKER_MAX_REQUESTS") or 0)
+
+
+def prepare_metrics_dir() -> Optional[str]:
+    """Готовит пустой каталог метрик для multiprocess-режима prometheus_client.
+
+    Возвращает путь временного каталога, если его пришлось создать.
+    """
+    path = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if not path:
+        path = tempfile.mkdtemp(prefix="fluxo-metrics-")
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+        return path
+    os.makedirs(path, exist_ok=True)
+    # Файлы прошлого запуска исказили бы счетчики
+    for stale in glob.glob(os.path.join(path, "*.db")):
+        os.remove(stale)
+    return None
+
+
+def serve(workers: int, host: str, port: int) -> None:
+    options = dict(
+        host=host,
+        port=port,
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT_SECONDS,
+        timeout_keep_alive=KEEP_ALIVE_TIMEOUT_SECONDS,
+        limit_max_requests=WORKER_MAX_REQUESTS or None,
+        # Логирование настраивает само приложение (core/logging_config.py)
+        log_config=None,
+    )
+    if workers == 1:
+        uvicorn.run("main:app", **options)
+        return
+
+    # Супервизор приложение не импортирует: воркеры запускаются через spawn
+    # и подключаются к сегменту по имени из окружения
+    from core.shared_state import SharedState
+
+    temporary_metrics_dir = prepare_metrics_dir()
+    shared_state = SharedState.create()
+    os.environ["SHARED_STATE_NAME"] = shared_state.name
+    try:
+        uvicorn.run("main:app", **options)
+    finally:
+        shared_state.close()
+        if temporary_metrics_dir:
+            shutil.rmtree(temporary_metrics_dir, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+    serve(max(1, args.workers), args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
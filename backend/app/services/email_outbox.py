@@ -0,0 +1,200 @@
+import os
+import random
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import List, NamedTuple, Optional
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from core.metrics import EMAIL_OUTBOX_DELIVERIES, EMAIL_SEND_DURATION
+from models.email_outbox import EmailOutbox
+from services.email_service import RESEND_BATCH_LIMIT, send_batch
+
+logger = logging.getLogger(__name__)
+
+# Конфигурация очереди писем
+EMAIL_OUTBOX_POLL_INTERVAL_SECONDS = float(os.getenv("EMAIL_OUTBOX_POLL_INTERVAL_SECONDS") or 1)
+# Сколько писем воркер забирает за раз; они уходят пачками по RESEND_BATCH_LIMIT
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE") or 500)
+EMAIL_OUTBOX_CONCURRENCY = int(os.getenv("EMAIL_OUTBOX_CONCURRENCY") or 4)
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS") or 8)
+# Повтор через base * 2^(попытка - 1) секунд, но не позже max
+EMAIL_OUTBOX_BACKOFF_BASE_SECONDS = float(os.getenv("EMAIL_OUTBOX_BACKOFF_BASE_SECONDS") or 5)
+EMAIL_OUTBOX_BACKOFF_MAX_SECONDS = float(os.getenv("EMAIL_OUTBOX_BACKOFF_MAX_SECONDS") or 3600)
+# Письмо, взятое упавшим воркером, снова становится доступным через это время
+EMAIL_OUTBOX_LEASE_SECONDS = float(os.getenv("EMAIL_OUTBOX_LEASE_SECONDS") or 120)
+# Сколько хранить отправленные письма
+EMAIL_OUTBOX_RETENTION = timedelta(hours=int(os.getenv("EMAIL_OUTBOX_RETENTION_HOURS") or 24))
+EMAIL_OUTBOX_CLEANUP_INTERVAL = timedelta(hours=1)
+
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+
+class ClaimedEmail(NamedTuple):
+    id: int
+    email_type: str
+    payload: dict
+    attempts: int
+
+
+class Delivery(NamedTuple):
+    provider_id: Optional[str] = None
+    error: Optional[str] = None
+
+
+def enqueue_email(db: Session, email_type: str, payload: dict) -> EmailOutbox:
+    """Ставит письмо в очередь. Оно уйдет после коммита транзакции вызывающего кода"""
+    email = EmailOutbox(
+        email_type=email_type,
+        payload=payload,
+        status=PENDING,
+        next_attempt_at=datetime.utcnow()
+    )
+    db.add(email)
+    return email
+
+
+def claim_batch(db: Session, limit: int = EMAIL_OUTBOX_BATCH_SIZE) -> List[ClaimedEmail]:
+    """Забирает письма, которые пора отправить.
+
+    Строки блокируются через SKIP LOCKED, поэтому несколько воркеров не
+    берут одно письмо. Взятое письмо получает аренду: если воркер не
+    запишет результат, письмо снова станет доступным после ее истечения.
+    """
+    now = datetime.utcnow()
+    rows = db.query(EmailOutbox).filter(
+        EmailOutbox.status.in_((PENDING, SENDING)),
+        EmailOutbox.next_attempt_at <= now
+    ).order_by(EmailOutbox.id).limit(limit).with_for_update(skip_locked=True).all()
+    
+    claimed = []
+    for row in rows:
+        row.status = SENDING
+        row.attempts += 1
+        row.next_attempt_at = now + timedelta(seconds=EMAIL_OUTBOX_LEASE_SECONDS)
+        claimed.append(ClaimedEmail(row.id, row.email_type, row.payload, row.attempts))
+    db.commit()
+    return claimed
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Задержка перед следующей попыткой с небольшим случайным разбросом"""
+    delay = min(EMAIL_OUTBOX_BACKOFF_MAX_SECONDS, EMAIL_OUTBOX_BACKOFF_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def record_deliveries(db: Session, claimed: List[ClaimedEmail], deliveries: List[Delivery]) -> None:
+    """Сохраняет результаты отправки: sent, повтор с задержкой или failed"""
+    now = datetime.utcnow()
+    rows = {row.id: row for row in db.query(EmailOutbox).filter(EmailOutbox.id.in_([email.id for email in claimed]))}
+    for email, delivery in zip(claimed, deliveries):
+        row = rows.get(email.id)
+        if row is None:
+            continue
+        if delivery.error is None:
+            row.status = SENT
+            row.sent_at = now
+            row.provider_id = delivery.provider_id
+            row.last_error = None
+            result = "sent"
+        elif email.attempts >= EMAIL_OUTBOX_MAX_ATTEMPTS:
+            row.status = FAILED
+            row.last_error = delivery.error
+            result = "failed"
+            logger.error(
+                "Письмо не доставлено после всех попыток",
+                extra={"email_type": email.email_type, "outbox_id": email.id, "attempts": email.attempts}
+            )
+        else:
+            row.status = PENDING
+            row.last_error = delivery.error
+            row.next_attempt_at = now + timedelta(seconds=backoff_seconds(email.attempts))
+            result = "retry"
+        EMAIL_OUTBOX_DELIVERIES.labels(email.email_type, result).inc()
+    db.commit()
+
+
+def _send_chunk(chunk: List[ClaimedEmail]) -> List[Delivery]:
+    """Отправляет пачку через Batch API; при ошибке пробует письма по одному.
+
+    Batch API отклоняет пачку целиком, поэтому одно некорректное письмо
+    не должно задерживать остальные.
+    """
+    try:
+        with EMAIL_SEND_DURATION.labels(chunk[0].email_type if len(chunk) == 1 else "batch").time():
+            ids = send_batch([email.payload for email in chunk])
+        return [Delivery(provider_id=provider_id) for provider_id in ids]
+    except Exception as e:
+        if len(chunk) > 1:
+            logger.warning("Ошибка пакетной отправки, отправляем письма по одному", extra={"error_type": type(e).__name__})
+            return [delivery for email in chunk for delivery in _send_chunk([email])]
+        logger.warning(
+            "Ошибка отправки письма",
+            extra={"email_type": chunk[0].email_type, "outbox_id": chunk[0].id, "error_type": type(e).__name__},
+            exc_info=True
+        )
+        return [Delivery(error=f"{type(e).__name__}: {e}")]
+
+
+async def deliver(claimed: List[ClaimedEmail], concurrency: int = EMAIL_OUTBOX_CONCURRENCY) -> List[Delivery]:
+    """Отправляет письма пачками, несколько пачек параллельно"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(chunk: List[ClaimedEmail]) -> List[Delivery]:
+        async with semaphore:
+            return await run_in_threadpool(_send_chunk, chunk)
+
+    chunks = [claimed[i:i + RESEND_BATCH_LIMIT] for i in range(0, len(claimed), RESEND_BATCH_LIMIT)]
+    results = await asyncio.gather(*(send(chunk) for chunk in chunks))
+    return [delivery for chunk_result in results for delivery in chunk_result]
+
+
+def delete_sent(db: Session, retention: timedelta = EMAIL_OUTBOX_RETENTION) -> int:
+    """Удаляет давно отправленные письма"""
+    deleted = db.query(EmailOutbox).filter(
+        EmailOutbox.status == SENT,
+        EmailOutbox.sent_at <= datetime.utcnow() - retention
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+async def process_once(session_factory, batch_size: int = EMAIL_OUTBOX_BATCH_SIZE) -> int:
+    """Забирает, отправляет и отмечает одну порцию писем. Возвращает их число"""
+    def with_session(func, *args):
+        db = session_factory()
+        try:
+            return func(db, *args)
+        finally:
+            db.close()
+
+    claimed = await run_in_threadpool(with_session, claim_batch, batch_size)
+    if not claimed:
+        return 0
+    deliveries = await deliver(claimed)
+    await run_in_threadpool(with_session, record_deliveries, claimed, deliveries)
+    return len(claimed)
+
+
+async def run_outbox_loop(session_factory, interval: float = EMAIL_OUTBOX_POLL_INTERVAL_SECONDS) -> None:
+    """Фоновая задача: отправка писем из очереди и очистка отправленных"""
+    cleaned_at = datetime.utcnow()
+    while True:
+        try:
+            # Пока забирается полная порция, очередь не пуста - не ждем
+            while await process_once(session_factory) >= EMAIL_OUTBOX_BATCH_SIZE:
+                pass
+            if datetime.utcnow() - cleaned_at >= EMAIL_OUTBOX_CLEANUP_INTERVAL:
+                db = session_factory()
+                try:
+                    deleted = await run_in_threadpool(delete_sent, db)
+                finally:
+                    db.close()
+                logger.debug("Удалены отправленные письма", extra={"deleted": deleted})
+                cleaned_at = datetime.utcnow()
+        except Exception:
+            logger.warning("Ошибка обработки очереди писем", exc_info=True)
+        await asyncio.sleep(interval)
@@ -0,0 +1,71 @@
+import os
+import logging
+from typing import Dict, Tuple
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, Template, select_autoescape
+
+logger = logging.getLogger(__name__)
+
+# Каталог шаблонов писем: <тип>.html и <тип>.txt, файлы с "_" - общие макеты
+EMAIL_TEMPLATES_DIR = os.getenv("EMAIL_TEMPLATES_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates", "email"
+)
+
+
+class EmailTemplates:
+    """Шаблоны писем на Jinja2, скомпилированные один раз.
+
+    Общая оболочка (разметка и стили) лежит в ``_layout.html``; в
+    скомпилированном шаблоне она хранится готовыми строками, и при
+    отправке подставляются только переменные. Новый тип письма - это
+    пара файлов ``<тип>.html`` и ``<тип>.txt``; тема задается в HTML-шаблоне
+    через ``{% set subject = "..." %}``.
+    """
+
+    def __init__(self, directory: str = EMAIL_TEMPLATES_DIR):
+        self.directory = directory
+        self.env = Environment(
+            loader=FileSystemLoader(directory),
+            autoescape=select_autoescape(["html"]),
+            undefined=StrictUndefined,
+            # Файлы шаблонов не меняются во время работы - не проверяем mtime
+            auto_reload=False,
+            cache_size=-1,
+            keep_trailing_newline=True,
+        )
+        self._templates: Dict[str, Tuple[Template, Template]] = {}
+
+    def email_types(self):
+        return sorted(
+            name[:-len(".html")] for name in os.listdir(self.directory)
+            if name.endswith(".html") and not name.startswith("_")
+        )
+
+    def load(self) -> int:
+        """Компилирует все шаблоны; вызывается при старте приложения"""
+        for email_type in self.email_types():
+            self.get(email_type)
+        logger.info("Шаблоны писем скомпилированы", extra={"email_types": sorted(self._templates)})
+        return len(self._templates)
+
+    def get(self, email_type: str) -> Tuple[Template, Template]:
+        templates = self._templates.get(email_type)
+        if templates is None:
+            templates = self._templates[email_type] = (
+                self.env.get_template(f"{email_type}.html"),
+                self.env.get_template(f"{email_type}.txt"),
+            )
+        return templates
+
+    def render(self, email_type: str, **context) -> dict:
+        """Возвращает subject, html и текстовую версию письма"""
+        html_template, text_template = self.get(email_type)
+        # Модуль шаблона дает за один проход и текст, и переменную subject
+        module = html_template.make_module(context)
+        return {
+            "subject": module.subject,
+            "html": str(module),
+            "text": text_template.render(context),
+        }
+
+
+email_templates = EmailTemplates()
@@ -1,11 +1,26 @@
 import os
 import pytest
+from contextlib import contextmanager
+
+# bcrypt в тестах выполняется в потоках: пул процессов пересоздавался бы
+# при каждом запуске TestClient
+os.environ.setdefault("PASSWORD_HASH_EXECUTOR", "thread")
+# Тесты не должны обращаться к OpenRouter при старте приложения
+os.environ.setdefault("UPSTREAM_PREWARM_ENABLED", "false")
+
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from fastapi.testclient import TestClient
 from datetime import datetime, timedelta
-from core.database import Base, get_db
-from core.auth import create_access_token, get_password_hash
+from core.database import Base, get_db, get_read_db, get_sessionmaker
+from core.auth import create_access_token, create_user_token, get_password_hash
+from core import sql_profiler
+from core.login_throttle import login_throttle
+from core.rate_limit import rate_limiter
+from core.revocation import revocation_list
+from core.token_cache import verified_tokens
+from core.token_versions import token_versions
+from core.user_cache import user_cache
 from models.user import User
 from models.prompt_style import PromptStyle
 from main import app
@@ -48,14 +63,23 @@ def db():
     yield db_session
     db_session.close()
     
-    # Очищаем БД после каждого теста
+    # Очищаем БД после каждого теста; id пользователей в новой БД
+    # повторяются, поэтому кеш пользователей тоже сбрасываем
     Base.metadata.drop_all(bind=engine)
+    user_cache.clear()
+    token_versions.clear()
+    verified_tokens.clear()
+    revocation_list.clear()
+    login_throttle.clear()
+    rate_limiter.clear()
 
 
 @pytest.fixture(scope="function")
 def client(db):
     """Создаем тестовый клиент для каждого теста"""
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    app.dependency_overrides[get_sessionmaker] = lambda: TestingSessionLocal
     
     with TestClient(app) as test_client:
         yield test_client
@@ -111,10 +135,7 @@ def test_user_unconfirmed(db, test_user_data):
 def auth_token(test_user):
     """Создаем JWT токен для тестового пользователя"""
     access_token_expires = timedelta(minutes=30)
-    access_token = create_access_token(
-        data={"sub": test_user.email}, 
-        expires_delta=access_token_expires
-    )
+    access_token = create_user_token(test_user, expires_delta=access_token_expires)
     return access_token
 
 
@@ -158,19 +179,33 @@ def test_user_with_limit_reached(db, test_user_data):
     return user
 
 
+@pytest.fixture
+def query_budget():
+    """Проверка бюджета SQL-запросов эндпоинта.
+    
+    Использование: ``with query_budget(2): client.get(...)``
+    """
+    @contextmanager
+    def _budget(max_queries: int):
+        with sql_profiler.capture() as stats:
+            yield stats
+        assert stats.count <= max_queries, (
+            f"Превышен бюджет SQL-запросов: {stats.count} > {max_queries}\n"
+            + "\n".join(f"{count}x {statement}" for statement, count in stats.statements.items())
+        )
+    
+    return _budget
+
+
 # Мокаем внешние сервисы для тестов
 @pytest.fixture(autouse=True)
 def mock_external_services(monkeypatch):
     """Мокаем внешние сервисы (email, OpenRouter API)"""
-    def mock_send_verification_email(*args, **kwargs):
-        return True
-    
-    def mock_send_welcome_email(*args, **kwargs):
-        return True
+    def mock_send_batch(emails):
+        return [None] * len(emails)
     
     def mock_generate_prompt(prompt, style_id=None):
         return f"Generated prompt for: {prompt} (style: {style_id})"
     
-    monkeypatch.setattr("services.email_service.send_verification_email", mock_send_verification_email)
-    monkeypatch.setattr("services.email_service.send_welcome_email", mock_send_welcome_email)
+    monkeypatch.setattr("services.email_outbox.send_batch", mock_send_batch)
     monkeypatch.setattr("core.prompt_generator.generate_prompt", mock_generate_prompt)
\ No newline at end of file
@@ -1,8 +1,22 @@
+import time
+import asyncio
 import pytest
 from datetime import datetime, timedelta
+from fastapi import HTTPException
 from models.user import User
 from models.email_verification import EmailVerificationCode
-from core.auth import verify_password, get_password_hash
+from models.revoked_token import RevokedToken
+from core.auth import create_access_token, create_verification_code, decode_access_token, verify_password, get_password_hash
+from core.login_throttle import SlidingWindowLimiter, login_throttle
+from core.rate_limit import CONFIRM_EMAIL_LIMIT, REGISTER_LIMIT, InMemoryBackend, RateLimitPolicy, RateLimiter, parse_rate
+from core.revocation import BloomFilter, RevocationList
+from core.token_cache import VerifiedTokenCache, verified_tokens
+from core.token_versions import token_versions
+from passlib.context import CryptContext
+from core.user_cache import UserCache, user_cache
+from core.verification_cleanup import cleanup_verification_codes, delete_stale_batch
+from sqlalchemy.orm import sessionmaker
+from core.password_hashing import PasswordHasher, build_context, calibrate_bcrypt, password_hasher, pwd_context
 
 
 class TestRegister:
@@ -268,18 +282,13 @@ class TestResendConfirmation:
         data = response.json()
         assert "Email уже подтвержден" in data["detail"]
     
-    def test_resend_confirmation_rate_limit(self, client, db, test_user_unconfirmed):
+    def test_resend_confirmation_rate_limit(self, client, test_user_unconfirmed):
         """Тест лимита повторных отправок"""
-        # Создаем 3 кода за последний час
-        for i in range(3):
-            verification_code = EmailVerificationCode(
-                user_id=test_user_unconfirmed.id,
-                code=f"12345{i}",
-                expires_at=datetime.utcnow() + timedelta(minutes=15),
-                created_at=datetime.utcnow()
-            )
-            db.add(verification_code)
-        db.commit()
+        for _ in range(3):
+            response = client.post("/auth/resend-confirmation", json={
+                "email": test_user_unconfirmed.email
+            })
+            assert response.status_code == 200
         
         response = client.post("/auth/resend-confirmation", json={
             "email": test_user_unconfirmed.email
@@ -288,6 +297,7 @@ class TestResendConfirmation:
         assert response.status_code == 429
         data = response.json()
         assert "Превышен лимит отправки" in data["detail"]
+        assert int(response.headers["retry-after"]) > 0
 
 
 class TestChangePassword:
@@ -361,4 +371,655 @@ class TestChangePassword:
                                  "new_password": "123"
                              })
         
-        assert response.status_code == 422
\ No newline at end of file
+        assert response.status_code == 422
+
+
+class TestPasswordHashingPool:
+    """Тесты вынесения bcrypt в ограниченный пул"""
+    
+    @pytest.mark.asyncio
+    async def test_process_pool_hash_and_verify(self):
+        """Тест: хеширование и проверка в пуле процессов"""
+        hasher = PasswordHasher(executor_kind="process", workers=1, max_pending=2)
+        try:
+            hashed = await hasher.hash("password123")
+            assert await hasher.verify("password123", hashed) is True
+            assert await hasher.verify("wrongpassword", hashed) is False
+        finally:
+            hasher.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_backpressure_rejects_excess_operations(self, monkeypatch):
+        """Тест: сверх max_pending операции сразу получают 503"""
+        hasher = PasswordHasher(executor_kind="thread", workers=1, max_pending=1)
+        monkeypatch.setattr("core.password_hashing.check_password", lambda plain, hashed: time.sleep(0.2) or True)
+        
+        try:
+            slow = asyncio.ensure_future(hasher.verify("a", "b"))
+            await asyncio.sleep(0.01)
+            
+            with pytest.raises(HTTPException) as exc_info:
+                await hasher.verify("a", "b")
+            
+            assert exc_info.value.status_code == 503
+            assert await slow is True
+            assert hasher.pending == 0
+        finally:
+            hasher.shutdown()
+    
+    def test_login_returns_503_when_pool_saturated(self, client, test_user, test_user_data, monkeypatch):
+        """Тест: при переполненном пуле логин получает 503 с Retry-After"""
+        monkeypatch.setattr(password_hasher, "max_pending", 0)
+        
+        response = client.post("/auth/login", json={
+            "email": test_user.email,
+            "password": test_user_data["password"]
+        })
+        
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
+    
+    def test_password_change_verifies_once(self, client, test_user_data, auth_headers, monkeypatch):
+        """Тест: смена пароля выполняет одну проверку bcrypt"""
+        calls = []
+        original_verify = password_hasher.verify
+        
+        async def counting_verify(plain, hashed):
+            calls.append(plain)
+            return await original_verify(plain, hashed)
+        
+        monkeypatch.setattr(password_hasher, "verify", counting_verify)
+        
+        response = client.post("/auth/change-password", headers=auth_headers, json={
+            "current_password": test_user_data["password"],
+            "new_password": "newpassword123"
+        })
+        
+        assert response.status_code == 200
+        assert len(calls) == 1
+
+
+class TestPasswordHashUpgrade:
+    """Тесты калибровки параметров хеширования и перехеширования при входе"""
+    
+    def test_calibrate_bcrypt_respects_bounds(self):
+        """Тест: калибровка не выходит за заданные границы cost"""
+        rounds, _ = calibrate_bcrypt(target_ms=0.001, min_rounds=4, max_rounds=6)
+        assert rounds == 4
+        
+        rounds, _ = calibrate_bcrypt(target_ms=60_000, min_rounds=4, max_rounds=6)
+        assert rounds == 6
+    
+    def test_login_rehashes_outdated_hash(self, client, db, test_user, test_user_data):
+        """Тест: хеш со старыми параметрами перехешируется при успешном входе"""
+        outdated_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash(test_user_data["password"])
+        test_user.password_hash = outdated_hash
+        db.commit()
+        
+        response = client.post("/auth/login", json={
+            "email": test_user.email,
+            "password": test_user_data["password"]
+        })
+        
+        assert response.status_code == 200
+        db.refresh(test_user)
+        assert test_user.password_hash != outdated_hash
+        assert not pwd_context.needs_update(test_user.password_hash)
+        assert verify_password(test_user_data["password"], test_user.password_hash)
+    
+    def test_failed_login_keeps_hash(self, client, db, test_user):
+        """Тест: при неверном пароле хеш не меняется"""
+        outdated_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("password123")
+        test_user.password_hash = outdated_hash
+        db.commit()
+        
+        response = client.post("/auth/login", json={
+            "email": test_user.email,
+            "password": "wrongpassword"
+        })
+        
+        assert response.status_code == 401
+        db.refresh(test_user)
+        assert test_user.password_hash == outdated_hash
+    
+    def test_switching_scheme_keeps_old_hashes_valid(self):
+        """Тест: после перехода на argon2 bcrypt-хеши проверяются и помечаются к обновлению"""
+        bcrypt_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("password123")
+        context = build_context(scheme="argon2")
+        
+        assert context.verify("password123", bcrypt_hash)
+        assert context.needs_update(bcrypt_hash)
+
+
+class TestUserCache:
+    """Тесты кеша пользователей для get_current_user"""
+    
+    def test_put_and_get(self, test_user):
+        """Тест: снимок доступен по id и email и не привязан к сессии"""
+        cache = UserCache(ttl=60, max_size=10)
+        snapshot = cache.put(test_user)
+        
+        assert cache.get(test_user.id) == snapshot
+        assert cache.get_by_email(test_user.email) == snapshot
+        with pytest.raises(Exception):
+            snapshot.requests_today = 100
+    
+    def test_expired_entry_is_dropped(self, test_user, monkeypatch):
+        """Тест: запись старше TTL не возвращается"""
+        cache = UserCache(ttl=10, max_size=10)
+        cache.put(test_user)
+        
+        now = time.monotonic()
+        monkeypatch.setattr("core.user_cache.time.monotonic", lambda: now + 11)
+        
+        assert cache.get(test_user.id) is None
+        assert cache.get_by_email(test_user.email) is None
+    
+    def test_evicts_least_recently_used(self, db, test_user, test_user_unconfirmed):
+        """Тест: при переполнении вытесняется давно не использованная запись"""
+        cache = UserCache(ttl=60, max_size=1)
+        cache.put(test_user)
+        cache.put(test_user_unconfirmed)
+        
+        assert cache.get(test_user.id) is None
+        assert cache.get(test_user_unconfirmed.id) is not None
+    
+    def test_password_change_invalidates_cache(self, client, test_user, test_user_data, auth_headers):
+        """Тест: смена пароля удаляет пользователя из кеша"""
+        assert client.get("/auth/me", headers=auth_headers).status_code == 200
+        assert user_cache.get(test_user.id) is not None
+        
+        response = client.post("/auth/change-password", headers=auth_headers, json={
+            "current_password": test_user_data["password"],
+            "new_password": "newpassword123"
+        })
+        
+        assert response.status_code == 200
+        assert user_cache.get(test_user.id) is None
+    
+    def test_email_confirmation_invalidates_cache(self, client, db, test_user_unconfirmed):
+        """Тест: подтверждение email сразу видно в /auth/me"""
+        token = create_access_token(data={"sub": test_user_unconfirmed.email})
+        headers = {"Authorization": f"Bearer {token}"}
+        assert client.get("/auth/me", headers=headers).json()["is_email_confirmed"] is False
+        
+        db.add(EmailVerificationCode(
+            user_id=test_user_unconfirmed.id,
+            code="123456",
+            expires_at=datetime.utcnow() + timedelta(minutes=15)
+        ))
+        db.commit()
+        
+        response = client.post("/auth/confirm-email", json={"email": test_user_unconfirmed.email, "code": "123456"})
+        
+        assert response.status_code == 200
+        assert client.get("/auth/me", headers=headers).json()["is_email_confirmed"] is True
+    
+    def test_prompt_creation_refreshes_limits(self, client, auth_headers, monkeypatch):
+        """Тест: после генерации /prompts/limits видит новый счетчик"""
+        async def fake_generate_prompt(prompt, style_id=None):
+            return "generated"
+        monkeypatch.setattr("routers.prompts.generate_prompt", fake_generate_prompt)
+        
+        assert client.get("/prompts/limits", headers=auth_headers).json()["requests_today"] == 0
+        assert client.post("/prompts/create", headers=auth_headers, json={"original_prompt": "Test"}).status_code == 200
+        assert client.get("/prompts/limits", headers=auth_headers).json()["requests_today"] == 1
+
+
+class TestTokenClaims:
+    """Тесты JWT с данными пользователя и отзыва токенов по версии"""
+    
+    def test_login_token_contains_claims(self, client, test_user, test_user_data):
+        """Тест: токен из /auth/login содержит id, статус подтверждения и версию"""
+        response = client.post("/auth/login", json={
+            "email": test_user.email,
+            "password": test_user_data["password"]
+        })
+        
+        payload = decode_access_token(response.json()["access_token"])
+        assert payload["sub"] == test_user.email
+        assert payload["uid"] == test_user.id
+        assert payload["email_confirmed"] is True
+        assert payload["ver"] == 0
+    
+    def test_password_change_revokes_old_tokens(self, client, test_user_data, auth_headers):
+        """Тест: после смены пароля старый токен отклоняется сразу"""
+        assert client.get("/prompts/styles", headers=auth_headers).status_code == 200
+        
+        response = client.post("/auth/change-password", headers=auth_headers, json={
+            "current_password": test_user_data["password"],
+            "new_password": "newpassword123"
+        })
+        assert response.status_code == 200
+        
+        for path in ("/prompts/styles", "/auth/me"):
+            response = client.get(path, headers=auth_headers)
+            assert response.status_code == 401
+            assert response.json()["detail"] == "Токен отозван"
+        
+        login = client.post("/auth/login", json={
+            "email": test_user_data["email"],
+            "password": "newpassword123"
+        })
+        new_headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        assert client.get("/prompts/styles", headers=new_headers).status_code == 200
+    
+    def test_newer_token_refreshes_stale_version(self, client, db, test_user):
+        """Тест: токен новее известной воркеру версии перечитывает ее из БД"""
+        token_versions.set(test_user.id, 0)
+        test_user.token_version = 1
+        db.commit()
+        
+        token = create_access_token(data={
+            "sub": test_user.email,
+            "uid": test_user.id,
+            "email_confirmed": True,
+            "ver": 1,
+        })
+        
+        response = client.get("/prompts/styles", headers={"Authorization": f"Bearer {token}"})
+        
+        assert response.status_code == 200
+        assert token_versions.get(test_user.id) == 1
+    
+    def test_legacy_token_still_accepted(self, client, test_user):
+        """Тест: токены старого формата (только email) работают до истечения срока"""
+        token = create_access_token(data={"sub": test_user.email})
+        headers = {"Authorization": f"Bearer {token}"}
+        
+        assert client.get("/prompts/styles", headers=headers).status_code == 200
+        assert client.get("/auth/me", headers=headers).status_code == 200
+    
+    def test_token_of_deleted_user_rejected(self, client, db, test_user, auth_headers):
+        """Тест: токен удаленного пользователя отклоняется"""
+        db.delete(test_user)
+        db.commit()
+        
+        response = client.get("/prompts/styles", headers=auth_headers)
+        
+        assert response.status_code == 401
+
+
+class TestVerifiedTokenCache:
+    """Тесты кеша проверенных JWT"""
+    
+    def test_repeated_token_decoded_once(self, auth_token, monkeypatch):
+        """Тест: повторная проверка токена не декодирует JWT"""
+        import core.auth
+        calls = []
+        original_decode = core.auth.jwt.decode
+        
+        def counting_decode(*args, **kwargs):
+            calls.append(1)
+            return original_decode(*args, **kwargs)
+        
+        monkeypatch.setattr(core.auth.jwt, "decode", counting_decode)
+        
+        first = decode_access_token(auth_token)
+        second = decode_access_token(auth_token)
+        
+        assert first == second
+        assert len(calls) == 1
+    
+    def test_entry_expires_before_exp_with_skew(self, monkeypatch):
+        """Тест: запись живет до exp за вычетом запаса на расхождение часов"""
+        cache = VerifiedTokenCache(max_size=10, skew=5)
+        now = time.time()
+        
+        cache.put("short", {"sub": "a@example.com", "exp": now + 3})
+        assert cache.get("short") is None
+        
+        cache.put("long", {"sub": "a@example.com", "exp": now + 60})
+        assert cache.get("long") is not None
+        
+        started_at = time.monotonic()
+        monkeypatch.setattr("core.token_cache.time.monotonic", lambda: started_at + 56)
+        assert cache.get("long") is None
+    
+    def test_tokens_without_exp_not_cached(self):
+        """Тест: бессрочные токены не кешируются"""
+        cache = VerifiedTokenCache(max_size=10, skew=0)
+        cache.put("token", {"sub": "a@example.com"})
+        
+        assert cache.get("token") is None
+    
+    def test_purge_and_purge_subject(self):
+        """Тест: явное удаление токена и всех токенов пользователя"""
+        cache = VerifiedTokenCache(max_size=10, skew=0)
+        exp = time.time() + 60
+        cache.put("a1", {"sub": "a@example.com", "exp": exp})
+        cache.put("a2", {"sub": "a@example.com", "exp": exp})
+        cache.put("b1", {"sub": "b@example.com", "exp": exp})
+        
+        cache.purge("b1")
+        assert cache.get("b1") is None
+        
+        cache.purge_subject("a@example.com")
+        assert cache.get("a1") is None
+        assert cache.get("a2") is None
+        assert len(cache) == 0
+    
+    def test_evicts_least_recently_used(self):
+        """Тест: кеш ограничен по размеру"""
+        cache = VerifiedTokenCache(max_size=2, skew=0)
+        exp = time.time() + 60
+        cache.put("t1", {"sub": "a@example.com", "exp": exp})
+        cache.put("t2", {"sub": "a@example.com", "exp": exp})
+        cache.get("t1")
+        cache.put("t3", {"sub": "a@example.com", "exp": exp})
+        
+        assert cache.get("t2") is None
+        assert cache.get("t1") is not None
+        assert cache.get("t3") is not None
+    
+    def test_password_change_purges_user_tokens(self, client, test_user, test_user_data, auth_token, auth_headers):
+        """Тест: смена пароля удаляет токены пользователя из кеша"""
+        assert client.get("/auth/me", headers=auth_headers).status_code == 200
+        assert verified_tokens.get(auth_token) is not None
+        
+        response = client.post("/auth/change-password", headers=auth_headers, json={
+            "current_password": test_user_data["password"],
+            "new_password": "newpassword123"
+        })
+        
+        assert response.status_code == 200
+        assert verified_tokens.get(auth_token) is None
+
+
+class TestRefreshTokens:
+    """Тесты refresh-токенов с ротацией и отзыва токенов"""
+    
+    def login(self, client, test_user_data):
+        response = client.post("/auth/login", json={
+            "email": test_user_data["email"],
+            "password": test_user_data["password"]
+        })
+        assert response.status_code == 200
+        return response.json()
+    
+    def test_refresh_rotates_tokens_without_password_hashing(self, client, test_user, test_user_data, monkeypatch):
+        """Тест: /auth/refresh выдает новую пару токенов без bcrypt"""
+        tokens = self.login(client, test_user_data)
+        assert tokens["refresh_token"]
+        
+        async def forbidden(*args, **kwargs):
+            raise AssertionError("bcrypt не должен вызываться при обновлении токена")
+        monkeypatch.setattr(password_hasher, "verify_and_update", forbidden)
+        
+        response = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+        
+        assert response.status_code == 200
+        new_tokens = response.json()
+        assert new_tokens["refresh_token"] != tokens["refresh_token"]
+        me = client.get("/auth/me", headers={"Authorization": f"Bearer {new_tokens['access_token']}"})
+        assert me.status_code == 200
+    
+    def test_reused_refresh_token_revokes_all_sessions(self, client, test_user, test_user_data):
+        """Тест: повторное использование refresh-токена отзывает все сессии"""
+        tokens = self.login(client, test_user_data)
+        rotated = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).json()
+        
+        response = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+        assert response.status_code == 401
+        
+        headers = {"Authorization": f"Bearer {rotated['access_token']}"}
+        assert client.get("/auth/me", headers=headers).status_code == 401
+        assert client.post("/auth/refresh", json={"refresh_token": rotated["refresh_token"]}).status_code == 401
+    
+    def test_token_types_are_not_interchangeable(self, client, test_user, test_user_data):
+        """Тест: refresh-токен не принимается как access и наоборот"""
+        tokens = self.login(client, test_user_data)
+        
+        response = client.get("/auth/me", headers={"Authorization": f"Bearer {tokens['refresh_token']}"})
+        assert response.status_code == 401
+        
+        response = client.post("/auth/refresh", json={"refresh_token": tokens["access_token"]})
+        assert response.status_code == 401
+    
+    def test_logout_revokes_tokens(self, client, test_user, test_user_data):
+        """Тест: после выхода access- и refresh-токены не принимаются"""
+        tokens = self.login(client, test_user_data)
+        headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+        assert client.get("/prompts/styles", headers=headers).status_code == 200
+        
+        response = client.post("/auth/logout", headers=headers, json={"refresh_token": tokens["refresh_token"]})
+        
+        assert response.status_code == 200
+        assert client.get("/prompts/styles", headers=headers).status_code == 401
+        assert client.get("/auth/me", headers=headers).status_code == 401
+        assert client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
+    
+    def test_password_change_invalidates_refresh_token(self, client, test_user, test_user_data):
+        """Тест: после смены пароля старый refresh-токен недействителен"""
+        tokens = self.login(client, test_user_data)
+        response = client.post("/auth/change-password", headers={"Authorization": f"Bearer {tokens['access_token']}"}, json={
+            "current_password": test_user_data["password"],
+            "new_password": "newpassword123"
+        })
+        assert response.status_code == 200
+        
+        response = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+        
+        assert response.status_code == 401
+    
+    def test_bloom_filter_has_no_false_negatives(self):
+        """Тест: добавленные ключи всегда находятся, доля ложных срабатываний мала"""
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        keys = [f"jti-{i}" for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        
+        assert all(key in bloom for key in keys)
+        false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+        assert false_positives < 300
+    
+    def test_sync_picks_up_revocations_from_other_workers(self, db, test_user):
+        """Тест: синхронизация добавляет в фильтр токены, отозванные другим воркером"""
+        revocations = RevocationList(capacity=100, error_rate=0.01)
+        revocations.load(db)
+        
+        db.add(RevokedToken(jti="revoked-elsewhere", user_id=test_user.id, expires_at=datetime.utcnow() + timedelta(hours=1)))
+        db.commit()
+        assert revocations.is_revoked(db, "revoked-elsewhere") is False
+        
+        revocations.sync(db)
+        
+        assert revocations.is_revoked(db, "revoked-elsewhere") is True
+
+
+class TestLoginThrottle:
+    """Тесты ограничения попыток входа до проверки пароля"""
+    
+    def test_account_lockout_rejects_before_bcrypt_and_db(self, client, test_user, monkeypatch, query_budget):
+        """Тест: после серии неудачных попыток аккаунт блокируется без bcrypt и БД"""
+        monkeypatch.setattr(login_throttle.accounts, "limit", 2)
+        for _ in range(3):
+            response = client.post("/auth/login", json={"email": test_user.email, "password": "wrongpassword"})
+            assert response.status_code == 401
+        
+        async def forbidden(*args, **kwargs):
+            raise AssertionError("bcrypt не должен вызываться для заблокированного аккаунта")
+        monkeypatch.setattr(password_hasher, "verify_and_update", forbidden)
+        
+        with query_budget(0):
+            response = client.post("/auth/login", json={"email": test_user.email, "password": "password123"})
+        
+        assert response.status_code == 429
+        assert int(response.headers["retry-after"]) > 0
+    
+    def test_successful_login_resets_account_failures(self, client, test_user, test_user_data, monkeypatch):
+        """Тест: успешный вход обнуляет счетчик неудач аккаунта"""
+        monkeypatch.setattr(login_throttle.accounts, "limit", 2)
+        for _ in range(2):
+            client.post("/auth/login", json={"email": test_user.email, "password": "wrongpassword"})
+        
+        response = client.post("/auth/login", json={"email": test_user.email, "password": test_user_data["password"]})
+        assert response.status_code == 200
+        
+        for _ in range(2):
+            response = client.post("/auth/login", json={"email": test_user.email, "password": "wrongpassword"})
+            assert response.status_code == 401
+    
+    def test_ip_limit_counts_attempts_across_accounts(self, client, monkeypatch):
+        """Тест: лимит по IP срабатывает при переборе разных email"""
+        monkeypatch.setattr(login_throttle.ips, "limit", 3)
+        statuses = [
+            client.post("/auth/login", json={"email": f"user{i}@example.com", "password": "password123"}).status_code
+            for i in range(5)
+        ]
+        
+        assert statuses == [401, 401, 401, 429, 429]
+    
+    def test_lockout_grows_exponentially(self):
+        """Тест: повторные превышения удваивают блокировку"""
+        limiter = SlidingWindowLimiter("test", limit=1, window=60, lockout_base=30, lockout_max=3600, max_keys=10)
+        
+        assert limiter.hit("key", 0) == 0
+        assert limiter.hit("key", 1) == 30
+        assert limiter.retry_after("key", 11) == 20
+        
+        assert limiter.hit("key", 40) == 0
+        assert limiter.hit("key", 41) == 60
+    
+    def test_window_slides(self):
+        """Тест: старые попытки перестают учитываться по мере сдвига окна"""
+        limiter = SlidingWindowLimiter("test", limit=2, window=60, lockout_base=30, max_keys=10)
+        limiter.hit("key", 0)
+        limiter.hit("key", 1)
+        
+        assert limiter.hit("key", 130) == 0
+    
+    def test_memory_is_bounded(self):
+        """Тест: число отслеживаемых ключей ограничено"""
+        limiter = SlidingWindowLimiter("test", limit=5, window=60, max_keys=2)
+        for key in ("a", "b", "c"):
+            limiter.hit(key, 0)
+        
+        assert len(limiter._counters) == 2
+        assert "a" not in limiter._counters
+
+
+class TestRateLimit:
+    """Тесты ограничения частоты запросов к эндпоинтам аутентификации"""
+    
+    def test_parse_rate(self):
+        """Тест разбора строки лимита"""
+        assert parse_rate("10/hour") == (10, 3600)
+        assert parse_rate("5/15minute") == (5, 900)
+        assert parse_rate("3 / 2 days") == (3, 172800)
+        with pytest.raises(ValueError):
+            parse_rate("10 per hour")
+    
+    def test_gcra_allows_burst_then_paces(self):
+        """Тест: пачка из limit запросов проходит, дальше - по одному за интервал"""
+        backend = InMemoryBackend(max_keys=10)
+        policy = RateLimitPolicy("test", "3/minute")
+        results = [backend.acquire("key", policy.emission_interval, policy.period, 0) for _ in range(4)]
+        
+        assert results[:3] == [0, 0, 0]
+        assert results[3] == pytest.approx(20)
+        assert backend.acquire("key", policy.emission_interval, policy.period, 20) == 0
+        assert backend.acquire("key", policy.emission_interval, policy.period, 20) > 0
+    
+    def test_rejected_requests_do_not_extend_wait(self):
+        """Тест: отклоненные запросы не отодвигают момент следующего разрешения"""
+        backend = InMemoryBackend(max_keys=10)
+        for now in (0, 0, 1, 2, 3):
+            backend.acquire("key", 30, 60, now)
+        
+        assert backend.acquire("key", 30, 60, 30) == 0
+    
+    def test_memory_is_bounded(self):
+        """Тест: число отслеживаемых ключей ограничено"""
+        backend = InMemoryBackend(max_keys=2)
+        for key in ("a", "b", "c"):
+            backend.acquire(key, 1, 10, 0)
+        
+        assert list(backend._tats) == ["b", "c"]
+    
+    def test_disabled_limiter_allows_everything(self):
+        """Тест: выключенный ограничитель ничего не считает"""
+        limiter = RateLimiter(InMemoryBackend(), enabled=False)
+        policy = RateLimitPolicy("test", "1/hour")
+        
+        assert [limiter.hit(policy, "key") for _ in range(3)] == [0, 0, 0]
+    
+    def test_confirm_email_brute_force_is_limited_by_email(self, client, test_user_unconfirmed, query_budget):
+        """Тест: перебор кода подтверждения отсекается по email без запросов к БД"""
+        for i in range(CONFIRM_EMAIL_LIMIT.limit):
+            response = client.post("/auth/confirm-email", json={
+                "email": test_user_unconfirmed.email,
+                "code": f"00000{i}"
+            })
+            assert response.status_code == 400
+        
+        with query_budget(0):
+            response = client.post("/auth/confirm-email", json={
+                "email": test_user_unconfirmed.email.upper(),
+                "code": "999999"
+            })
+        
+        assert response.status_code == 429
+        assert int(response.headers["retry-after"]) > 0
+    
+    def test_register_is_limited_by_ip(self, client, monkeypatch):
+        """Тест: регистрации с одного IP ограничены"""
+        monkeypatch.setattr(REGISTER_LIMIT, "limit", 2)
+        statuses = [
+            client.post("/auth/register", json={
+                "email": f"new{i}@example.com",
+                "name": "New User",
+                "password": "password123"
+            }).status_code
+            for i in range(3)
+        ]
+        
+        assert statuses == [200, 200, 429]
+
+
+class TestVerificationCodeCleanup:
+    """Тесты деактивации и очистки кодов подтверждения"""
+    
+    def _add_codes(self, db, user, count, is_used=False, expires_in=timedelta(minutes=15)):
+        for i in range(count):
+            db.add(EmailVerificationCode(
+                user_id=user.id,
+                code=f"{i:06d}",
+                expires_at=datetime.utcnow() + expires_in,
+                is_used=is_used
+            ))
+        db.commit()
+    
+    def test_new_code_deactivates_old_ones_in_one_update(self, db, test_user_unconfirmed, query_budget):
+        """Тест: старые коды деактивируются одним запросом без загрузки строк"""
+        self._add_codes(db, test_user_unconfirmed, 5)
+        db.refresh(test_user_unconfirmed)
+        
+        with query_budget(2):
+            code = create_verification_code(db, test_user_unconfirmed)
+            db.commit()
+        
+        active = db.query(EmailVerificationCode).filter(EmailVerificationCode.is_used == False).all()
+        assert [row.code for row in active] == [code]
+    
+    def test_batch_deletes_only_used_or_expired_codes(self, db, test_user_unconfirmed):
+        """Тест: активные коды остаются, пачка не превышает заданный размер"""
+        self._add_codes(db, test_user_unconfirmed, 2)
+        self._add_codes(db, test_user_unconfirmed, 3, is_used=True)
+        self._add_codes(db, test_user_unconfirmed, 3, expires_in=timedelta(minutes=-1))
+        
+        assert delete_stale_batch(db, batch_size=4) == 4
+        assert delete_stale_batch(db, batch_size=4) == 2
+        assert delete_stale_batch(db, batch_size=4) == 0
+        assert db.query(EmailVerificationCode).count() == 2
+    
+    @pytest.mark.asyncio
+    async def test_cleanup_runs_until_table_is_clean(self, db, test_user_unconfirmed):
+        """Тест: очистка проходит пачками до конца, каждая пачка в своей сессии"""
+        self._add_codes(db, test_user_unconfirmed, 7, is_used=True)
+        session_factory = sessionmaker(bind=db.get_bind())
+        
+        deleted = await cleanup_verification_codes(session_factory, batch_size=3, pause=0)
+        
+        assert deleted == 7
+        assert db.query(EmailVerificationCode).count() == 0
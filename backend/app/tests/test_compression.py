@@ -0,0 +1,114 @@
+import gzip
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+from core.compression import CompressionMiddleware, available_codecs, negotiate
+
+BODY = {"items": ["Сгенерированный промпт с подробной структурой ответа"] * 100}
+
+
+def make_client(**options) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/large")
+    def large():
+        return JSONResponse(BODY, headers={"ETag": '"abc"'})
+
+    @app.get("/small")
+    def small():
+        return {"status": "ok"}
+
+    @app.get("/encoded")
+    def encoded():
+        return PlainTextResponse("x" * 4096, headers={"Content-Encoding": "identity-custom"})
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse((b"data: " + b"x" * 2048 + b"\n\n" for _ in range(3)), media_type="text/event-stream")
+
+    app.add_middleware(CompressionMiddleware, encodings="gzip", **options)
+    return TestClient(app)
+
+
+class TestCompressionMiddleware:
+    """Тесты сжатия ответов"""
+
+    def test_large_json_is_gzipped(self):
+        """Тест: большой JSON сжимается gzip, ETag становится слабым"""
+        client = make_client()
+
+        response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert response.headers["etag"] == 'W/"abc"'
+        assert int(response.headers["content-length"]) < len(response.content)
+        assert response.json() == BODY
+
+    def test_offloaded_compression(self):
+        """Тест: большие тела сжимаются в threadpool с тем же результатом"""
+        client = make_client(offload_size=1)
+
+        response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.json() == BODY
+
+    def test_no_accept_encoding(self):
+        """Тест: без Accept-Encoding ответ отдается как есть"""
+        client = make_client()
+
+        response = client.get("/large", headers={"Accept-Encoding": ""})
+
+        assert "content-encoding" not in response.headers
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert response.headers["etag"] == '"abc"'
+
+    def test_small_body_not_compressed(self):
+        """Тест: ответы меньше порога не сжимаются"""
+        response = make_client().get("/small", headers={"Accept-Encoding": "gzip"})
+
+        assert "content-encoding" not in response.headers
+        assert response.json() == {"status": "ok"}
+
+    def test_already_encoded_not_compressed(self):
+        """Тест: уже закодированный ответ не сжимается повторно"""
+        response = make_client().get("/encoded", headers={"Accept-Encoding": "gzip"})
+
+        assert response.headers["content-encoding"] == "identity-custom"
+        assert response.content == b"x" * 4096
+
+    def test_streaming_passes_through(self):
+        """Тест: потоковые ответы не буферизуются и не сжимаются"""
+        response = make_client().get("/stream", headers={"Accept-Encoding": "gzip"})
+
+        assert "content-encoding" not in response.headers
+        assert response.content.count(b"data: ") == 3
+
+
+class TestNegotiate:
+    """Тесты выбора кодека по Accept-Encoding"""
+
+    def test_quality_and_preference(self):
+        """Тест: побеждает наибольший q, при равенстве - порядок предпочтения"""
+        preferred = ["zstd", "br", "gzip"]
+
+        assert negotiate("gzip, br", preferred) == "br"
+        assert negotiate("br;q=0.5, gzip", preferred) == "gzip"
+        assert negotiate("*", preferred) == "zstd"
+        assert negotiate("gzip;q=0, *;q=0.1", ["gzip"]) is None
+        assert negotiate("identity", preferred) is None
+
+    def test_unknown_encoding_rejected(self):
+        """Тест: неизвестное сжатие в конфигурации - ошибка"""
+        with pytest.raises(ValueError):
+            available_codecs("gzip,lzma")
+
+    def test_gzip_is_deterministic(self):
+        """Тест: одинаковое тело сжимается в одинаковые байты"""
+        codec = available_codecs("gzip")["gzip"]
+
+        assert codec(b"payload" * 100) == codec(b"payload" * 100)
+        assert gzip.decompress(codec(b"payload")) == b"payload"
@@ -0,0 +1,194 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy.orm import sessionmaker
+from models.email_outbox import EmailOutbox
+from models.email_verification import EmailVerificationCode
+from jinja2 import UndefinedError
+from services.email_service import build_email
+from services.email_templates import EmailTemplates
+from services import email_outbox
+from services.email_outbox import (
+    EMAIL_OUTBOX_MAX_ATTEMPTS,
+    FAILED,
+    PENDING,
+    SENDING,
+    SENT,
+    claim_batch,
+    enqueue_email,
+    process_once,
+)
+
+
+def _payload(email: str) -> dict:
+    return {"from": "Fluxo <onboarding@resend.dev>", "to": [email], "subject": "Тест", "html": "<p>Тест</p>"}
+
+
+def _forbid_sending(*args, **kwargs):
+    raise AssertionError("HTTP-запрос не должен ждать отправку письма")
+
+
+class TestEnqueue:
+    """Тесты постановки писем в очередь из обработчиков запросов"""
+    
+    def test_register_enqueues_verification_email(self, client, db, monkeypatch):
+        """Тест: регистрация записывает письмо в очередь, не обращаясь к почтовому сервису"""
+        monkeypatch.setattr(email_outbox, "send_batch", _forbid_sending)
+        response = client.post("/auth/register", json={
+            "email": "outbox@example.com",
+            "name": "Outbox User",
+            "password": "password123"
+        })
+        
+        assert response.status_code == 200
+        emails = db.query(EmailOutbox).all()
+        assert [(email.email_type, email.status, email.payload["to"]) for email in emails] == [
+            ("verification", PENDING, ["outbox@example.com"])
+        ]
+    
+    def test_confirm_email_enqueues_welcome_email(self, client, db, test_user_unconfirmed, monkeypatch):
+        """Тест: приветственное письмо ставится в очередь вместе с подтверждением"""
+        monkeypatch.setattr(email_outbox, "send_batch", _forbid_sending)
+        client.post("/auth/resend-confirmation", json={"email": test_user_unconfirmed.email})
+        code = db.query(EmailVerificationCode).filter(EmailVerificationCode.is_used == False).one().code
+        assert code in db.query(EmailOutbox).one().payload["html"]
+        
+        response = client.post("/auth/confirm-email", json={"email": test_user_unconfirmed.email, "code": code})
+        
+        assert response.status_code == 200
+        assert sorted(email.email_type for email in db.query(EmailOutbox)) == ["verification", "welcome"]
+    
+    def test_enqueue_does_not_commit(self, db):
+        """Тест: письмо сохраняется только вместе с транзакцией вызывающего кода"""
+        enqueue_email(db, "verification", _payload("rollback@example.com"))
+        db.rollback()
+        
+        assert db.query(EmailOutbox).count() == 0
+
+
+class TestOutboxWorker:
+    """Тесты фоновой отправки писем из очереди"""
+    
+    @pytest.fixture
+    def session_factory(self, db):
+        return sessionmaker(bind=db.get_bind())
+    
+    def _enqueue(self, db, *addresses):
+        for address in addresses:
+            enqueue_email(db, "verification", _payload(address))
+        db.commit()
+    
+    @pytest.mark.asyncio
+    async def test_pending_emails_are_sent_in_one_batch(self, db, session_factory, monkeypatch):
+        """Тест: письма уходят одним пакетным запросом и помечаются отправленными"""
+        calls = []
+        
+        def fake_send_batch(emails):
+            calls.append(len(emails))
+            return [f"resend-{i}" for i in range(len(emails))]
+        monkeypatch.setattr(email_outbox, "send_batch", fake_send_batch)
+        self._enqueue(db, "a@example.com", "b@example.com", "c@example.com")
+        
+        assert await process_once(session_factory) == 3
+        
+        assert calls == [3]
+        rows = db.query(EmailOutbox).order_by(EmailOutbox.id).all()
+        assert [(row.status, row.provider_id, row.attempts) for row in rows] == [
+            (SENT, "resend-0", 1), (SENT, "resend-1", 1), (SENT, "resend-2", 1)
+        ]
+        assert await process_once(session_factory) == 0
+    
+    @pytest.mark.asyncio
+    async def test_failed_batch_falls_back_to_single_sends(self, db, session_factory, monkeypatch):
+        """Тест: одно некорректное письмо не задерживает остальные"""
+        def fake_send_batch(emails):
+            if len(emails) > 1 or emails[0]["to"] == ["bad@example.com"]:
+                raise RuntimeError("validation_error")
+            return ["resend-id"]
+        monkeypatch.setattr(email_outbox, "send_batch", fake_send_batch)
+        self._enqueue(db, "good@example.com", "bad@example.com")
+        
+        await process_once(session_factory)
+        
+        good, bad = db.query(EmailOutbox).order_by(EmailOutbox.id).all()
+        assert good.status == SENT
+        assert bad.status == PENDING
+        assert bad.next_attempt_at > datetime.utcnow()
+        assert "validation_error" in bad.last_error
+    
+    @pytest.mark.asyncio
+    async def test_gives_up_after_max_attempts(self, db, session_factory, monkeypatch):
+        """Тест: после исчерпания попыток письмо помечается как failed"""
+        def failing_send_batch(emails):
+            raise RuntimeError("timeout")
+        monkeypatch.setattr(email_outbox, "send_batch", failing_send_batch)
+        self._enqueue(db, "a@example.com")
+        db.query(EmailOutbox).update({EmailOutbox.attempts: EMAIL_OUTBOX_MAX_ATTEMPTS - 1})
+        db.commit()
+        
+        await process_once(session_factory)
+        
+        row = db.query(EmailOutbox).one()
+        assert (row.status, row.attempts) == (FAILED, EMAIL_OUTBOX_MAX_ATTEMPTS)
+    
+    def test_claim_skips_leased_and_future_emails(self, db):
+        """Тест: взятые другим воркером и отложенные письма не забираются до истечения срока"""
+        self._enqueue(db, "a@example.com", "b@example.com")
+        
+        assert len(claim_batch(db)) == 2
+        assert claim_batch(db) == []
+        
+        # Воркер упал, аренда истекла - письма снова доступны
+        db.query(EmailOutbox).update({EmailOutbox.next_attempt_at: datetime.utcnow() - timedelta(seconds=1)})
+        db.commit()
+        reclaimed = claim_batch(db)
+        
+        assert [email.attempts for email in reclaimed] == [2, 2]
+        assert {row.status for row in db.query(EmailOutbox)} == {SENDING}
+
+
+class TestEmailTemplates:
+    """Тесты шаблонов писем"""
+    
+    def test_verification_email_has_html_and_text_parts(self):
+        """Тест: письмо содержит тему, HTML и текстовую версию с кодом"""
+        email = build_email("verification", "user@example.com", "Иван", code="654321")
+        
+        assert email["to"] == ["user@example.com"]
+        assert email["subject"] == "Подтверждение email - Fluxo"
+        assert '<div class="code">654321</div>' in email["html"]
+        assert "код подтверждения: 654321" in email["text"]
+        assert "<" not in email["text"]
+    
+    def test_user_name_is_escaped_in_html_only(self):
+        """Тест: имя пользователя экранируется в HTML, но не в тексте"""
+        email = build_email("welcome", "user@example.com", "<b>Иван</b>")
+        
+        assert "&lt;b&gt;Иван&lt;/b&gt;" in email["html"]
+        assert "Поздравляем, <b>Иван</b>!" in email["text"]
+    
+    def test_all_templates_compile(self):
+        """Тест: у каждого типа письма есть HTML- и текстовый шаблон"""
+        templates = EmailTemplates()
+        
+        assert templates.load() == len(templates.email_types()) >= 2
+    
+    def test_new_email_type_is_just_template_files(self, tmp_path):
+        """Тест: новый тип письма добавляется файлами шаблонов без кода"""
+        (tmp_path / "_layout.html").write_text("<html>{% block content %}{% endblock %}</html>")
+        (tmp_path / "digest.html").write_text(
+            '{% extends "_layout.html" %}{% set subject = "Итоги: " ~ count %}{% block content %}{{ count }}{% endblock %}'
+        )
+        (tmp_path / "digest.txt").write_text("Промптов: {{ count }}")
+        templates = EmailTemplates(str(tmp_path))
+        
+        assert templates.email_types() == ["digest"]
+        assert templates.render("digest", count=3) == {
+            "subject": "Итоги: 3",
+            "html": "<html>3</html>",
+            "text": "Промптов: 3",
+        }
+    
+    def test_missing_variable_fails_loudly(self):
+        """Тест: незаданная переменная шаблона - ошибка, а не пустое место в письме"""
+        with pytest.raises(UndefinedError):
+            EmailTemplates().render("verification", name="Иван")
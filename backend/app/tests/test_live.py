@@ -0,0 +1,140 @@
+import asyncio
+import pytest
+from starlette.websockets import WebSocketDisconnect
+from core.live import CLOSE_UNAUTHORIZED, LiveConnection, SlowConsumer
+from models.prompt_request import PromptRequest
+from models.user import User
+
+
+async def fake_stream(original_prompt, style_id):
+    """Ответ OpenRouter по частям; "slow" зависает после первой части"""
+    yield "Сгенерированный"
+    if original_prompt == "slow":
+        await asyncio.sleep(10)
+    yield " промпт"
+
+
+@pytest.fixture
+def live(client, auth_token, monkeypatch):
+    """Авторизованное соединение /ws"""
+    monkeypatch.setattr("routers.live.stream_prompt", fake_stream)
+    with client.websocket_connect("/ws") as websocket:
+        websocket.send_json({"type": "auth", "token": auth_token})
+        assert websocket.receive_json()["type"] == "ready"
+        yield websocket
+
+
+def receive_until(websocket, message_type, generation_id=None):
+    """Сообщения до первого сообщения типа ``message_type`` включительно"""
+    messages = []
+    while True:
+        message = websocket.receive_json()
+        messages.append(message)
+        if message["type"] == message_type and (generation_id is None or message.get("id") == generation_id):
+            return messages
+
+
+class TestLiveChannel:
+    """Тесты WebSocket-канала /ws"""
+
+    def test_ready_contains_user_and_limits(self, client, test_user, auth_token):
+        """Тест: после авторизации приходят пользователь и лимиты"""
+        with client.websocket_connect("/ws") as websocket:
+            websocket.send_json({"type": "auth", "token": auth_token})
+            ready = websocket.receive_json()
+
+        assert ready["user"]["email"] == test_user.email
+        assert ready["limits"]["remaining_requests"] == test_user.daily_limit
+
+    def test_invalid_token_closes_connection(self, client):
+        """Тест: с неверным токеном соединение закрывается"""
+        with client.websocket_connect("/ws") as websocket:
+            websocket.send_json({"type": "auth", "token": "invalid_token"})
+            with pytest.raises(WebSocketDisconnect) as error:
+                websocket.receive_json()
+
+        assert error.value.code == CLOSE_UNAUTHORIZED
+
+    def test_generation_streams_and_pushes_updates(self, live, db, test_user):
+        """Тест: ответ приходит частями, затем сохраненная запись, лимиты и история"""
+        live.send_json({"type": "generate", "id": "a", "original_prompt": "Test", "style_id": 1})
+        messages = receive_until(live, "history")
+
+        assert [message["type"] for message in messages] == ["chunk", "chunk", "done", "limits", "history"]
+        assert "".join(message["delta"] for message in messages[:2]) == "Сгенерированный промпт"
+        assert messages[2]["request"]["generated_prompt"] == "Сгенерированный промпт"
+        assert messages[3]["data"]["requests_today"] == 1
+        assert messages[4]["item"]["id"] == messages[2]["request"]["id"]
+        db.expire_all()
+        assert db.get(User, test_user.id).requests_today == 1
+
+    def test_concurrent_generations_share_quota(self, live, db, test_user):
+        """Тест: идущие генерации соединения учитываются в дневном лимите"""
+        test_user.requests_today = test_user.daily_limit - 1
+        db.commit()
+
+        live.send_json({"type": "generate", "id": "a", "original_prompt": "slow"})
+        assert live.receive_json() == {"type": "chunk", "id": "a", "delta": "Сгенерированный"}
+        live.send_json({"type": "generate", "id": "b", "original_prompt": "Test"})
+        error = receive_until(live, "error", "b")[-1]
+
+        assert error["status"] == 429
+
+    def test_cancel_does_not_save(self, live, db):
+        """Тест: отмененная генерация не сохраняется и не тратит лимит"""
+        live.send_json({"type": "generate", "id": "a", "original_prompt": "slow"})
+        assert live.receive_json()["id"] == "a"
+        live.send_json({"type": "cancel", "id": "a"})
+        live.send_json({"type": "generate", "id": "b", "original_prompt": "Test"})
+        messages = receive_until(live, "history")
+
+        assert {message.get("id") for message in messages if "id" in message} == {"b"}
+        assert db.query(PromptRequest).count() == 1
+
+    def test_invalid_message_keeps_connection(self, live):
+        """Тест: некорректное сообщение дает ошибку, соединение остается открытым"""
+        live.send_json({"type": "generate", "id": "a"})
+        error = live.receive_json()
+
+        assert error["type"] == "error"
+        assert error["status"] == 422
+        live.send_json({"type": "generate", "id": "a", "original_prompt": "Test"})
+        assert receive_until(live, "done")[-1]["id"] == "a"
+
+    def test_http_generation_pushed_to_socket(self, client, live, auth_headers, monkeypatch):
+        """Тест: генерация через /prompts/create обновляет открытые вкладки"""
+        async def fake_generate(original_prompt, style_id):
+            return "Generated"
+
+        monkeypatch.setattr("routers.prompts.generate_prompt", fake_generate)
+        response = client.post("/prompts/create", headers=auth_headers, json={"original_prompt": "Test", "style_id": 1})
+
+        assert response.status_code == 200
+        limits, history = live.receive_json(), live.receive_json()
+        assert limits["type"] == "limits"
+        assert limits["data"]["requests_today"] == 1
+        assert history["item"]["id"] == response.json()["id"]
+
+
+class TestLiveConnection:
+    """Тесты очереди отправки соединения"""
+
+    def test_push_overflow_marks_slow_consumer(self):
+        """Тест: уведомления в переполненную очередь не копятся"""
+        async def scenario():
+            connection = LiveConnection(websocket=None, user_id=1, queue_size=1)
+            assert connection.push({"type": "limits"}) is True
+            assert connection.push({"type": "limits"}) is False
+            return connection._overflowed.is_set()
+
+        assert asyncio.run(scenario()) is True
+
+    def test_send_waits_for_space(self):
+        """Тест: генерация ждет места в очереди и сдается по таймауту"""
+        async def scenario():
+            connection = LiveConnection(websocket=None, user_id=1, queue_size=1, send_timeout=0.05)
+            await connection.send({"type": "chunk"})
+            with pytest.raises(SlowConsumer):
+                await connection.send({"type": "chunk"})
+
+        asyncio.run(scenario())
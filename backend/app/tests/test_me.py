@@ -0,0 +1,75 @@
+from models.prompt_request import PromptRequest
+from routers.me import parse_known
+
+
+class TestBootstrap:
+    """Тесты для эндпоинта /me/bootstrap"""
+
+    def test_bootstrap_returns_all_sections(self, client, db, test_user, auth_headers):
+        """Тест: пользователь, лимиты, стили и история одним ответом"""
+        db.add(PromptRequest(user_id=test_user.id, original_prompt="First", style_id=1, generated_prompt="Generated"))
+        db.commit()
+
+        response = client.get("/me/bootstrap", headers=auth_headers)
+
+        assert response.status_code == 200
+        assert response.headers["cache-control"] == "private, no-cache"
+        data = response.json()
+        assert data["user"]["data"]["email"] == test_user.email
+        assert "token_version" not in data["user"]["data"]
+        assert data["limits"]["data"]["remaining_requests"] == test_user.daily_limit
+        assert set(data["styles"]["data"]) == {"1", "2", "3", "4"}
+        assert [item["original_prompt"] for item in data["history"]["data"]] == ["First"]
+        for section in data.values():
+            assert section["etag"]
+            assert section["not_modified"] is False
+
+    def test_sections_match_separate_endpoints(self, client, test_user, auth_headers):
+        """Тест: разделы совпадают с ответами отдельных эндпоинтов"""
+        data = client.get("/me/bootstrap", headers=auth_headers).json()
+
+        assert data["user"]["data"] == client.get("/auth/me", headers=auth_headers).json()
+        assert data["limits"]["data"] == client.get("/prompts/limits", headers=auth_headers).json()
+        assert data["styles"]["data"] == client.get("/prompts/styles", headers=auth_headers).json()
+        assert data["history"]["data"] == client.get("/prompts/history", headers=auth_headers).json()
+
+    def test_known_sections_are_not_sent(self, client, db, test_user, auth_headers):
+        """Тест: разделы с актуальным etag приходят без данных"""
+        first = client.get("/me/bootstrap", headers=auth_headers).json()
+        known = ",".join(f"{name}:{first[name]['etag']}" for name in ("user", "styles", "history"))
+        db.add(PromptRequest(user_id=test_user.id, original_prompt="New", style_id=1))
+        db.commit()
+
+        second = client.get("/me/bootstrap", headers=auth_headers, params={"known": known}).json()
+
+        assert second["user"] == {"etag": first["user"]["etag"], "not_modified": True, "data": None}
+        assert second["styles"]["not_modified"] is True
+        # История изменилась, а лимиты клиент не присылал
+        assert second["history"]["not_modified"] is False
+        assert second["history"]["etag"] != first["history"]["etag"]
+        assert second["limits"]["data"] is not None
+
+    def test_bootstrap_single_user_lookup(self, client, test_user, auth_headers, query_budget):
+        """Тест: пользователь загружается один раз, дальше - только страница истории"""
+        client.get("/me/bootstrap", headers=auth_headers)
+
+        with query_budget(1):
+            response = client.get("/me/bootstrap", headers=auth_headers)
+        assert response.status_code == 200
+
+    def test_history_limit_is_bounded(self, client, auth_headers):
+        """Тест: размер страницы истории ограничен"""
+        response = client.get("/me/bootstrap", headers=auth_headers, params={"history_limit": 1000})
+
+        assert response.status_code == 422
+
+    def test_bootstrap_unauthorized(self, client):
+        """Тест получения данных без авторизации"""
+        response = client.get("/me/bootstrap")
+
+        assert response.status_code in (401, 403)
+
+    def test_parse_known(self):
+        """Тест разбора переданных клиентом валидаторов"""
+        assert parse_known("user:abc, history:def,broken,:x") == {"user": "abc", "history": "def"}
+        assert parse_known(None) == {}
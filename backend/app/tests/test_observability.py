@@ -0,0 +1,329 @@
+import io
+import json
+import queue
+import logging
+import pytest
+from prometheus_client import REGISTRY
+from core.metrics import statement_operation
+from core.tracing import tracer, InMemorySpanExporter, to_otlp_json
+from core import server_timing, sql_profiler
+from core.logging_config import (
+    JsonFormatter,
+    NonBlockingQueueHandler,
+    BodySampler,
+    parse_logger_levels,
+)
+
+
+class TestStructuredLogging:
+    """Тесты структурированного логирования"""
+    
+    def test_json_formatter_includes_extra_fields(self):
+        """Тест: extra-поля попадают в JSON-запись"""
+        record = logging.LogRecord("core.auth", logging.INFO, __file__, 1, "Код отправлен", (), None)
+        record.user_id = 42
+        
+        entry = json.loads(JsonFormatter().format(record))
+        
+        assert entry["message"] == "Код отправлен"
+        assert entry["level"] == "INFO"
+        assert entry["logger"] == "core.auth"
+        assert entry["user_id"] == 42
+    
+    def test_queue_handler_keeps_extra_and_traceback(self):
+        """Тест: запись из очереди форматируется со всеми полями"""
+        log_queue = queue.Queue()
+        handler = NonBlockingQueueHandler(log_queue)
+        test_logger = logging.getLogger("tests.structured")
+        test_logger.addHandler(handler)
+        test_logger.propagate = False
+        
+        try:
+            try:
+                raise ValueError("boom")
+            except ValueError:
+                test_logger.error("Ошибка %s", "отправки", extra={"email_type": "welcome"}, exc_info=True)
+        finally:
+            test_logger.removeHandler(handler)
+            test_logger.propagate = True
+        
+        entry = json.loads(JsonFormatter().format(log_queue.get_nowait()))
+        assert entry["message"] == "Ошибка отправки"
+        assert entry["email_type"] == "welcome"
+        assert "ValueError: boom" in entry["exc_info"]
+    
+    def test_queue_handler_drops_when_full(self):
+        """Тест: переполненная очередь не блокирует вызывающий код"""
+        handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+        record = logging.LogRecord("test", logging.INFO, __file__, 1, "msg", (), None)
+        
+        handler.handle(record)
+        handler.handle(record)
+        handler.handle(record)
+        
+        assert handler.dropped == 2
+    
+    def test_body_sampler_disabled(self):
+        """Тест: нулевая доля семплирования отключает логирование тел"""
+        sampler = BodySampler(sample_rate=0, max_per_minute=100)
+        assert not any(sampler.should_log() for _ in range(100))
+    
+    def test_body_sampler_rate_limited(self):
+        """Тест: частота логирования тел ограничена сверху"""
+        sampler = BodySampler(sample_rate=1.0, max_per_minute=5)
+        logged = sum(sampler.should_log() for _ in range(100))
+        assert logged == 5
+    
+    def test_parse_logger_levels(self):
+        """Тест разбора уровней для отдельных логгеров"""
+        levels = parse_logger_levels("core.auth=debug, httpx=WARNING,,broken")
+        assert levels == {"core.auth": "DEBUG", "httpx": "WARNING"}
+
+
+class TestMetrics:
+    """Тесты эндпоинта /metrics и сборщиков метрик"""
+    
+    def test_metrics_endpoint_prometheus_format(self, client):
+        """Тест: /metrics отдает текстовый формат Prometheus"""
+        client.get("/health")
+        
+        response = client.get("/metrics")
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert 'fluxo_http_request_duration_seconds_count{method="GET",route="/health",status="200"}' in response.text
+    
+    def test_request_latency_uses_route_template(self, client, auth_headers):
+        """Тест: метка route содержит шаблон маршрута, а не фактический URL"""
+        client.get("/prompts/history?limit=5", headers=auth_headers)
+        
+        value = REGISTRY.get_sample_value(
+            "fluxo_http_request_duration_seconds_count",
+            {"method": "GET", "route": "/prompts/history", "status": "200"}
+        )
+        assert value is not None and value >= 1
+    
+    def test_quota_denial_counter(self, client, test_user_with_limit_reached, test_user_data):
+        """Тест: отказ по дневному лимиту увеличивает счетчик"""
+        before = REGISTRY.get_sample_value("fluxo_quota_denials_total", {"quota": "daily_prompts"}) or 0
+        
+        login = client.post("/auth/login", json={
+            "email": test_user_with_limit_reached.email,
+            "password": test_user_data["password"]
+        })
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        response = client.post("/prompts/create", headers=headers, json={"original_prompt": "Test"})
+        
+        assert response.status_code == 429
+        after = REGISTRY.get_sample_value("fluxo_quota_denials_total", {"quota": "daily_prompts"})
+        assert after == before + 1
+    
+    def test_password_hash_and_db_histograms(self, client, test_user):
+        """Тест: время bcrypt и SQL-выражений попадает в гистограммы"""
+        assert REGISTRY.get_sample_value(
+            "fluxo_password_hash_duration_seconds_count", {"operation": "hash"}
+        ) >= 1
+        assert REGISTRY.get_sample_value(
+            "fluxo_db_statement_duration_seconds_count", {"operation": "INSERT"}
+        ) >= 1
+    
+    def test_statement_operation(self):
+        """Тест определения типа SQL-выражения"""
+        assert statement_operation("  select * from users") == "SELECT"
+        assert statement_operation("") == "UNKNOWN"
+
+
+@pytest.fixture
+def span_exporter():
+    """Включаем трассировку всех запросов с выгрузкой в память"""
+    exporter = InMemorySpanExporter()
+    previous_rate, previous_exporter = tracer.sample_rate, tracer.exporter
+    tracer.configure(sample_rate=1.0, exporter=exporter)
+    yield exporter
+    tracer.configure(sample_rate=previous_rate, exporter=previous_exporter)
+
+
+class TestTracing:
+    """Тесты трассировки запросов"""
+    
+    def test_request_trace_has_nested_spans(self, client, auth_headers, span_exporter):
+        """Тест: трасса запроса содержит спаны авторизации и SQL"""
+        client.get("/prompts/history", headers=auth_headers)
+        
+        spans = {span.name: span for span in span_exporter.get_finished_spans()}
+        root = spans["GET /prompts/history"]
+        auth_span = spans["auth.get_token_claims"]
+        
+        assert root.parent_id is None
+        assert root.attributes["http.status_code"] == 200
+        assert auth_span.parent_id == root.span_id
+        assert auth_span.trace_id == root.trace_id
+        assert "db.query" in spans
+    
+    def test_create_prompt_stages(self, client, auth_headers, span_exporter, monkeypatch):
+        """Тест: у создания промпта есть спаны всех этапов"""
+        async def fake_generate_prompt(prompt, style_id=None):
+            return "generated"
+        monkeypatch.setattr("routers.prompts.generate_prompt", fake_generate_prompt)
+        
+        response = client.post("/prompts/create", headers=auth_headers, json={"original_prompt": "Test"})
+        
+        assert response.status_code == 200
+        names = {span.name for span in span_exporter.get_finished_spans()}
+        assert {
+            "auth.get_token_claims",
+            "prompts.load_user",
+            "prompts.check_daily_limit",
+            "prompts.generate",
+            "prompts.commit",
+        } <= names
+    
+    def test_unsampled_requests_record_nothing(self, client, auth_headers, span_exporter):
+        """Тест: при нулевой доле семплирования спаны не создаются"""
+        tracer.configure(sample_rate=0.0)
+        
+        client.get("/prompts/history", headers=auth_headers)
+        
+        assert span_exporter.get_finished_spans() == []
+    
+    def test_otlp_json_format(self, client, span_exporter):
+        """Тест преобразования спанов в OTLP/JSON"""
+        client.get("/health")
+        
+        payload = to_otlp_json(span_exporter.get_finished_spans())
+        otlp_span = payload["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+        
+        assert len(otlp_span["traceId"]) == 32
+        assert len(otlp_span["spanId"]) == 16
+        assert otlp_span["kind"] == 2
+        assert {"key": "http.route", "value": {"stringValue": "/health"}} in otlp_span["attributes"]
+
+
+class TestServerTiming:
+    """Тесты заголовка Server-Timing"""
+    
+    def test_header_present_on_every_response(self, client):
+        """Тест: заголовок есть даже у ответов без этапов"""
+        response = client.get("/health")
+        
+        assert "total;dur=" in response.headers["server-timing"]
+    
+    def test_authenticated_request_stages(self, client, auth_headers):
+        """Тест: авторизованный запрос содержит этапы auth, db и serialize"""
+        response = client.get("/prompts/history", headers=auth_headers)
+        
+        stages = {item.split(";")[0].strip() for item in response.headers["server-timing"].split(",")}
+        assert {"auth", "db", "serialize", "total"} <= stages
+    
+    def test_timing_allow_origin_for_frontend(self, client):
+        """Тест: для фронтенда добавляется Timing-Allow-Origin"""
+        response = client.get("/health", headers={"Origin": "http://localhost:3000"})
+        
+        assert response.headers["timing-allow-origin"] == "http://localhost:3000"
+    
+    def test_stage_is_noop_outside_request(self):
+        """Тест: вне запроса сбор таймингов ничего не делает"""
+        with server_timing.stage("auth"):
+            pass
+        server_timing.record("db", 0.1)
+        
+        assert server_timing._timings.get() is None
+    
+    def test_format_header(self):
+        """Тест формирования значения заголовка"""
+        assert server_timing.format_header({"db": 1.234, "total": 10}) == "db;dur=1.2, total;dur=10.0"
+
+
+class TestSqlProfiler:
+    """Тесты профилировщика SQL-запросов"""
+    
+    def test_redact_parameters(self):
+        """Тест: значения параметров не попадают в лог"""
+        assert sql_profiler.redact_parameters({"email_1": "a@b.c", "id": 1}) == {"email_1": "<str>", "id": "<int>"}
+        assert sql_profiler.redact_parameters(("secret", 5)) == ["<str>", "<int>"]
+        assert sql_profiler.redact_parameters([{"a": 1}, {"a": 2}]) == "<2 наборов параметров>"
+    
+    def test_stats_slowest_and_repeated(self):
+        """Тест: статистика хранит самые медленные и повторяющиеся выражения"""
+        stats = sql_profiler.QueryStats(top_n=2)
+        for elapsed in (0.001, 0.005, 0.003):
+            stats.add("SELECT users WHERE id = ?", elapsed)
+        stats.add("UPDATE users SET x = ?", 0.010)
+        
+        assert stats.count == 4
+        assert [round(e, 3) for e, _ in stats.slowest] == [0.010, 0.005]
+        assert stats.repeated(threshold=3) == {"SELECT users WHERE id = ?": 3}
+    
+    def test_slow_query_logged_with_redacted_parameters(self, caplog, monkeypatch):
+        """Тест: медленное выражение пишется в лог без значений параметров"""
+        monkeypatch.setattr(sql_profiler, "SLOW_QUERY_THRESHOLD_MS", 10)
+        
+        with caplog.at_level(logging.WARNING, logger="core.sql_profiler"):
+            sql_profiler.record("SELECT * FROM users WHERE email = ?", ("secret@example.com",), 0.05)
+        
+        record = caplog.records[-1]
+        assert record.parameters == ["<str>"]
+        assert "secret@example.com" not in str(record.__dict__)
+    
+    def test_repeated_statements_flagged(self, caplog):
+        """Тест: повторяющиеся выражения в запросе помечаются как возможный N+1"""
+        stats = sql_profiler.QueryStats()
+        for _ in range(sql_profiler.SQL_REPEAT_THRESHOLD):
+            stats.add("SELECT * FROM prompt_styles WHERE id = ?", 0.001)
+        
+        with caplog.at_level(logging.WARNING, logger="core.sql_profiler"):
+            sql_profiler.report(stats, "/prompts/history")
+        
+        assert "N+1" in caplog.records[-1].getMessage()
+
+
+class TestQueryBudgets:
+    """Бюджеты SQL-запросов для эндпоинтов"""
+    
+    def test_me_budget(self, client, auth_headers, query_budget):
+        """Тест: /auth/me делает один запрос к БД"""
+        with query_budget(1):
+            assert client.get("/auth/me", headers=auth_headers).status_code == 200
+    
+    def test_history_budget(self, client, auth_headers, query_budget):
+        """Тест: история - пользователь и список промптов"""
+        with query_budget(2):
+            assert client.get("/prompts/history", headers=auth_headers).status_code == 200
+    
+    def test_limits_budget(self, client, auth_headers, query_budget):
+        """Тест: лимиты только читают пользователя"""
+        with query_budget(1):
+            assert client.get("/prompts/limits", headers=auth_headers).status_code == 200
+    
+    def test_create_prompt_budget(self, client, auth_headers, query_budget, monkeypatch):
+        """Тест: создание промпта, включая повторную загрузку пользователя и refresh"""
+        async def fake_generate_prompt(prompt, style_id=None):
+            return "generated"
+        monkeypatch.setattr("routers.prompts.generate_prompt", fake_generate_prompt)
+        
+        with query_budget(7):
+            assert client.post("/prompts/create", headers=auth_headers, json={"original_prompt": "Test"}).status_code == 200
+    
+    def test_styles_budget(self, client, auth_headers, query_budget):
+        """Тест: стили не загружают пользователя, версия токена читается один раз"""
+        with query_budget(1):
+            assert client.get("/prompts/styles", headers=auth_headers).status_code == 200
+        with query_budget(0):
+            assert client.get("/prompts/styles", headers=auth_headers).status_code == 200
+    
+    def test_warm_cache_budgets(self, client, auth_headers, query_budget, monkeypatch):
+        """Тест: при прогретом кеше пользователя чтения не загружают его из БД"""
+        async def fake_generate_prompt(prompt, style_id=None):
+            return "generated"
+        monkeypatch.setattr("routers.prompts.generate_prompt", fake_generate_prompt)
+        
+        assert client.get("/auth/me", headers=auth_headers).status_code == 200
+        
+        with query_budget(0):
+            assert client.get("/auth/me", headers=auth_headers).status_code == 200
+        with query_budget(0):
+            assert client.get("/prompts/limits", headers=auth_headers).status_code == 200
+        with query_budget(1):
+            assert client.get("/prompts/history", headers=auth_headers).status_code == 200
+        with query_budget(6):
+            assert client.post("/prompts/create", headers=auth_headers, json={"original_prompt": "Test"}).status_code == 200
@@ -4,6 +4,8 @@ from models.user import User
 from models.prompt_request import PromptRequest
 from models.prompt_style import PromptStyle
 from core.auth import get_password_hash, create_access_token
+from core.prompt_generator import get_available_styles
+from core.style_catalog import StyleCatalog, cache_control, etag_matches, style_catalog
 
 
 class TestCreatePrompt:
@@ -292,6 +294,59 @@ class TestGetPromptStyles:
         """Тест получения стилей с невалидным токеном"""
         response = client.get("/prompts/styles", headers=invalid_auth_headers)
         assert response.status_code == 401
+    
+    def test_styles_are_http_cacheable(self, client, auth_headers):
+        """Тест: ответ с ETag и Cache-Control совпадает с реестром стилей"""
+        response = client.get("/prompts/styles", headers=auth_headers)
+        
+        assert response.status_code == 200
+        assert response.headers["etag"] == style_catalog.etag
+        assert response.headers["cache-control"].startswith("private, max-age=")
+        assert response.json() == {str(key): value for key, value in get_available_styles().items()}
+    
+    def test_conditional_request_returns_304(self, client, auth_headers, query_budget):
+        """Тест: запрос с актуальным ETag получает 304 без тела и без SQL"""
+        etag = client.get("/prompts/styles", headers=auth_headers).headers["etag"]
+        
+        with query_budget(0):
+            response = client.get("/prompts/styles", headers={**auth_headers, "If-None-Match": f'W/{etag}, "other"'})
+        
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+    
+    def test_stale_etag_gets_full_response(self, client, auth_headers):
+        """Тест: устаревший ETag получает полный ответ"""
+        response = client.get("/prompts/styles", headers={**auth_headers, "If-None-Match": '"stale"'})
+        
+        assert response.status_code == 200
+        assert len(response.json()) == 4
+    
+    def test_catalog_rebuilt_only_on_registry_change(self):
+        """Тест: тело и ETag пересчитываются только при изменении реестра"""
+        catalog = StyleCatalog()
+        styles = {1: {"name": "Простой", "description": "Описание"}}
+        
+        assert catalog.load(styles) is True
+        etag = catalog.etag
+        assert catalog.load(dict(styles)) is False
+        assert catalog.load({**styles, 2: {"name": "Новый", "description": "Описание"}}) is True
+        assert catalog.etag != etag
+        assert "Простой".encode() in catalog.body
+    
+    def test_public_styles_cache_control(self, monkeypatch):
+        """Тест: публичные стили разрешено кешировать CDN"""
+        monkeypatch.setattr("core.style_catalog.STYLES_PUBLIC", True)
+        
+        assert cache_control().startswith("public, max-age=")
+    
+    def test_etag_matches(self):
+        """Тест разбора If-None-Match"""
+        assert etag_matches('"a", "b"', '"b"')
+        assert etag_matches('W/"a"', '"a"')
+        assert etag_matches("*", '"a"')
+        assert not etag_matches('"a"', '"b"')
+        assert not etag_matches(None, '"a"')
 
 
 class TestGetUserLimits:
@@ -0,0 +1,135 @@
+import multiprocessing
+import pytest
+from core.login_throttle import SlidingWindowLimiter
+from core.rate_limit import RateLimitPolicy, SharedMemoryBackend
+from core.shared_state import SharedState
+from core.token_versions import TokenVersionRegistry
+from core.user_cache import UserCache
+from schemas.user import UserSnapshot
+
+
+def hit_shared_limit(attempts: int) -> int:
+    """Выполняется в отдельном процессе-«воркере»: сколько запросов пропустил лимит 5/hour"""
+    from core.rate_limit import RATE_LIMIT_BACKEND, rate_limiter
+
+    assert RATE_LIMIT_BACKEND == "shared"
+    policy = RateLimitPolicy("shared", "5/hour")
+    return sum(rate_limiter.hit(policy, "key") == 0 for _ in range(attempts))
+
+
+@pytest.fixture
+def state():
+    """Сегмент, созданный «супервизором», и подключение к нему «воркера»"""
+    owner = SharedState.create(slots=1024)
+    worker = SharedState.attach(owner.name)
+    yield owner, worker
+    worker.close()
+    owner.close()
+
+
+def make_snapshot(user_id: int = 1, requests_today: int = 0) -> UserSnapshot:
+    return UserSnapshot(
+        id=user_id,
+        email=f"user{user_id}@example.com",
+        name="User",
+        is_email_confirmed=True,
+        daily_limit=3,
+        requests_today=requests_today,
+        created_at="2026-01-01T00:00:00",
+        updated_at="2026-01-01T00:00:00",
+    )
+
+
+class TestSharedState:
+    """Тесты общего для воркеров состояния в shared memory"""
+
+    def test_slot_table_is_shared(self, state):
+        """Тест: запись одного процесса видна через другое подключение"""
+        owner, worker = state
+        worker.table("login_ip").update("key", lambda values: ((1, 2, 3, 4, 5), None))
+
+        assert owner.table("login_ip").get("key") == (1, 2, 3, 4, 5)
+        owner.table("login_ip").delete("key")
+        assert worker.table("login_ip").get("key") is None
+
+    def test_attach_rejects_foreign_segment(self):
+        """Тест: к чужому сегменту памяти воркер не подключается"""
+        from multiprocessing import shared_memory
+
+        segment = shared_memory.SharedMemory(create=True, size=4096)
+        try:
+            with pytest.raises(RuntimeError):
+                SharedState.attach(segment.name)
+        finally:
+            segment.close()
+            segment.unlink()
+
+    def test_user_cache_invalidated_in_other_worker(self, state):
+        """Тест: изменение пользователя в одном воркере сбрасывает кеш в другом"""
+        owner, worker = state
+        first = UserCache(ttl=60, epochs=owner.epoch("users"))
+        second = UserCache(ttl=60, epochs=worker.epoch("users"))
+        first.put(make_snapshot())
+        second.put(make_snapshot())
+
+        first.invalidate(1)
+
+        assert second.get(1) is None
+        second.put(make_snapshot(requests_today=1))
+        assert second.get(1).requests_today == 1
+
+    def test_token_version_invalidated_in_other_worker(self, state):
+        """Тест: отзыв токенов в одном воркере сразу виден в другом"""
+        owner, worker = state
+        first = TokenVersionRegistry(ttl=60, epochs=owner.epoch("token_versions"))
+        second = TokenVersionRegistry(ttl=60, epochs=worker.epoch("token_versions"))
+        second.set(1, 0)
+
+        first.invalidate(1)
+        first.set(1, 1)
+
+        assert first.get(1) == 1
+        assert second.get(1) is None
+
+    def test_user_changes_do_not_invalidate_token_versions(self, state):
+        """Тест: обновление счетчика запросов не заставляет перечитывать версию токенов"""
+        owner, _ = state
+        cache = UserCache(ttl=60, epochs=owner.epoch("users"))
+        versions = TokenVersionRegistry(ttl=60, epochs=owner.epoch("token_versions"))
+        versions.set(1, 0)
+
+        cache.invalidate(1)
+
+        assert versions.get(1) == 0
+
+    def test_shared_gcra_matches_in_memory(self, state):
+        """Тест: GCRA в общей памяти пропускает пачку и дальше по интервалу"""
+        backend = SharedMemoryBackend(state[0].table("rate_limit"))
+        policy = RateLimitPolicy("test", "3/minute")
+        results = [backend.acquire("key", policy.emission_interval, policy.period, 0) for _ in range(4)]
+
+        assert results[:3] == [0, 0, 0]
+        assert results[3] == pytest.approx(20)
+        assert backend.acquire("key", policy.emission_interval, policy.period, 20) == 0
+
+    def test_login_lockout_shared_between_workers(self, state):
+        """Тест: блокировка, полученная в одном воркере, действует во всех"""
+        owner, worker = state
+        first = SlidingWindowLimiter("test", limit=2, window=60, lockout_base=30, table=owner.table("login_account"))
+        second = SlidingWindowLimiter("test", limit=2, window=60, lockout_base=30, table=worker.table("login_account"))
+        first.hit("key", 0)
+        second.hit("key", 1)
+
+        assert first.hit("key", 2) == 30
+        assert second.retry_after("key", 10) == 22
+        second.reset("key")
+        assert first.retry_after("key", 10) == 0
+
+    def test_rate_limit_shared_between_processes(self, state, monkeypatch):
+        """Тест: процессы с общим сегментом делят один лимит"""
+        # Как и воркеры uvicorn: spawn, имя сегмента в окружении
+        monkeypatch.setenv("SHARED_STATE_NAME", state[0].name)
+        with multiprocessing.get_context("spawn").Pool(4) as pool:
+            allowed = pool.map(hit_shared_limit, [10] * 4)
+
+        assert sum(allowed) == 5
@@ -0,0 +1,86 @@
+import os
+import sys
+import subprocess
+import pytest
+from sqlalchemy import create_engine, text
+from core.startup import SchemaMismatchError, StartupTimer, check_schema, expected_revisions, prewarm_pool
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+from bench_import_time import APP_DIR, DEFAULT_ENV, best_of
+
+# Бюджет времени импорта приложения; на медленных CI-машинах можно поднять
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS") or 2500)
+# Модули, которые не должны загружаться при импорте приложения
+LAZY_MODULES = ("resend", "requests", "passlib", "alembic")
+
+
+class TestStartup:
+    """Тесты подготовки воркера при запуске"""
+    
+    @pytest.fixture
+    def sqlite_engine(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'startup.db'}")
+        yield engine
+        engine.dispose()
+    
+    def test_check_schema_rejects_unmigrated_database(self, sqlite_engine):
+        """Тест: без примененных миграций воркер не стартует"""
+        with pytest.raises(SchemaMismatchError, match="alembic upgrade head"):
+            check_schema(sqlite_engine)
+    
+    def test_check_schema_accepts_head_revision(self, sqlite_engine):
+        """Тест: ревизия БД совпадает с head миграций"""
+        heads = expected_revisions()
+        assert len(heads) == 1
+        with sqlite_engine.begin() as conn:
+            conn.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32) PRIMARY KEY)"))
+            conn.execute(text("INSERT INTO alembic_version VALUES (:head)"), {"head": next(iter(heads))})
+        
+        assert check_schema(sqlite_engine) == next(iter(heads))
+    
+    def test_check_schema_does_not_run_ddl(self, sqlite_engine):
+        """Тест: проверка схемы ничего не создает в БД"""
+        with pytest.raises(SchemaMismatchError):
+            check_schema(sqlite_engine)
+        
+        with sqlite_engine.connect() as conn:
+            tables = conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'")).fetchall()
+        assert tables == []
+    
+    def test_prewarm_opens_pool_connections(self, sqlite_engine):
+        """Тест: прогрев оставляет в пуле готовые соединения"""
+        assert prewarm_pool(sqlite_engine, connections=3) == 3
+        assert sqlite_engine.pool.checkedin() == 3
+    
+    def test_timer_records_stages(self):
+        """Тест: длительность каждого этапа попадает в сводку"""
+        timer = StartupTimer()
+        with timer.stage("schema_check"):
+            pass
+        
+        assert list(timer.stages) == ["schema_check"]
+        assert timer.total_ms() >= timer.stages["schema_check"] >= 0
+
+
+
+class TestImportTime:
+    """Тесты времени импорта приложения"""
+    
+    def test_import_fits_budget(self):
+        """Тест: импорт main укладывается в бюджет (лучший из трех запусков)"""
+        total_ms, modules = best_of(3)
+        
+        slowest = sorted(modules.items(), key=lambda item: -item[1][0])[:10]
+        assert total_ms <= IMPORT_TIME_BUDGET_MS, (
+            f"Импорт main занял {total_ms:.0f} мс при бюджете {IMPORT_TIME_BUDGET_MS:.0f} мс. Самые медленные модули:\n"
+            + "\n".join(f"{name}: {self_us / 1000:.1f} мс" for name, (self_us, _) in slowest)
+        )
+    
+    def test_heavy_modules_are_lazy(self):
+        """Тест: почта, хеширование паролей и миграции не загружаются при импорте"""
+        result = subprocess.run(
+            [sys.executable, "-c", f"import sys, main; print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"],
+            cwd=APP_DIR, env={**DEFAULT_ENV, **os.environ}, capture_output=True, text=True, check=True,
+        )
+        
+        assert result.stdout.strip() == ""
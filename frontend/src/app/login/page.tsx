@@ -50,7 +50,7 @@ function LoginForm() {
 
     try {
       const response = await apiClient.login(data);
-      await login(response.access_token);
+      await login(response.access_token, response.refresh_token);
       router.push("/");
     } catch (err) {
       setError(err instanceof Error ? err.message : "Произошла ошибка при входе");
@@ -1,13 +1,15 @@
 "use client";
 
 import React, { createContext, useContext, useEffect, useState } from "react";
-import { apiClient, User } from "@/lib/api";
+import { apiClient, BootstrapResponse, User } from "@/lib/api";
 
 interface AuthContextType {
   user: User | null;
+  // Лимиты, стили и история из /me/bootstrap
+  bootstrap: BootstrapResponse | null;
   token: string | null;
   loading: boolean;
-  login: (token: string) => Promise<void>;
+  login: (token: string, refreshToken?: string) => Promise<void>;
   logout: () => void;
   refreshUser: () => Promise<void>;
 }
@@ -16,31 +18,62 @@ const AuthContext = createContext<AuthContextType | undefined>(undefined);
 
 export function AuthProvider({ children }: { children: React.ReactNode }) {
   const [user, setUser] = useState<User | null>(null);
+  const [bootstrap, setBootstrap] = useState<BootstrapResponse | null>(null);
   const [token, setToken] = useState<string | null>(null);
   const [loading, setLoading] = useState(true);
 
+  const clearSession = () => {
+    localStorage.removeItem("token");
+    localStorage.removeItem("refreshToken");
+    setUser(null);
+    setBootstrap(null);
+    setToken(null);
+  };
+
+  const applyBootstrap = (data: BootstrapResponse, authToken: string) => {
+    setBootstrap(data);
+    setUser(data.user.data);
+    setToken(authToken);
+  };
+
   const fetchUser = async (authToken: string) => {
     try {
-      const userData = await apiClient.getCurrentUser(authToken);
-      setUser(userData);
-      setToken(authToken);
+      applyBootstrap(await apiClient.getBootstrap(authToken, bootstrap), authToken);
     } catch (error) {
+      // Access-токен истек: пробуем обновить его без повторного входа
+      const refreshToken = localStorage.getItem("refreshToken");
+      if (refreshToken) {
+        try {
+          const tokens = await apiClient.refreshToken(refreshToken);
+          localStorage.setItem("token", tokens.access_token);
+          if (tokens.refresh_token) {
+            localStorage.setItem("refreshToken", tokens.refresh_token);
+          }
+          applyBootstrap(await apiClient.getBootstrap(tokens.access_token, bootstrap), tokens.access_token);
+          return;
+        } catch (refreshError) {
+          console.error("Failed to refresh token:", refreshError);
+        }
+      }
       console.error("Failed to fetch user:", error);
-      localStorage.removeItem("token");
-      setUser(null);
-      setToken(null);
+      clearSession();
     }
   };
 
-  const login = async (authToken: string) => {
+  const login = async (authToken: string, refreshToken?: string) => {
     localStorage.setItem("token", authToken);
+    if (refreshToken) {
+      localStorage.setItem("refreshToken", refreshToken);
+    }
     await fetchUser(authToken);
   };
 
   const logout = () => {
-    localStorage.removeItem("token");
-    setUser(null);
-    setToken(null);
+    if (token) {
+      // Отзываем токены на сервере; выход на клиенте не ждет ответа
+      apiClient.logout(token, localStorage.getItem("refreshToken")).catch(() => {});
+    }
+    clearSession();
   };
 
   const refreshUser = async () => {
@@ -63,6 +96,7 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
 
   const value = {
     user,
+    bootstrap,
     token,
     loading,
     login,
@@ -19,6 +19,7 @@ export interface RegisterResponse {
 export interface AuthResponse {
   access_token: string;
   token_type: string;
+  refresh_token?: string;
 }
 
 export interface EmailConfirmationRequest {
@@ -56,6 +57,41 @@ export interface User {
   updated_at: string;
 }
 
+export interface UserLimits {
+  daily_limit: number;
+  requests_today: number;
+  remaining_requests: number;
+  last_request_date: string;
+}
+
+export interface PromptStyleInfo {
+  name: string;
+  description: string;
+}
+
+export interface PromptHistoryItem {
+  id: number;
+  user_id: number;
+  original_prompt: string;
+  style_id?: number | null;
+  generated_prompt?: string | null;
+  created_at: string;
+}
+
+// Раздел ответа /me/bootstrap: при not_modified данные не передаются
+export interface BootstrapSection<T> {
+  etag: string;
+  not_modified: boolean;
+  data: T | null;
+}
+
+export interface BootstrapResponse {
+  user: BootstrapSection<User>;
+  limits: BootstrapSection<UserLimits>;
+  styles: BootstrapSection<Record<string, PromptStyleInfo>>;
+  history: BootstrapSection<PromptHistoryItem[]>;
+}
+
 export interface ApiError {
   message: string;
   detail?: string;
@@ -130,6 +166,23 @@ class ApiClient {
     });
   }
 
+  async refreshToken(refreshToken: string): Promise<AuthResponse> {
+    return this.request<AuthResponse>('/auth/refresh', {
+      method: 'POST',
+      body: JSON.stringify({ refresh_token: refreshToken }),
+    });
+  }
+
+  async logout(token: string, refreshToken?: string | null): Promise<{ message: string }> {
+    return this.request<{ message: string }>('/auth/logout', {
+      method: 'POST',
+      headers: {
+        Authorization: `Bearer ${token}`,
+      },
+      body: JSON.stringify({ refresh_token: refreshToken ?? null }),
+    });
+  }
+
   async register(userData: RegisterRequest): Promise<RegisterResponse> {
     return this.request<RegisterResponse>('/auth/register', {
       method: 'POST',
@@ -169,6 +222,34 @@ class ApiClient {
     });
   }
 
+  // Пользователь, лимиты, стили и первая страница истории одним запросом.
+  // С previous сервер не присылает разделы, которые не изменились
+  async getBootstrap(token: string, previous?: BootstrapResponse | null): Promise<BootstrapResponse> {
+    const params = new URLSearchParams();
+    if (previous) {
+      const known = (Object.keys(previous) as (keyof BootstrapResponse)[])
+        .map((name) => `${name}:${previous[name].etag}`)
+        .join(',');
+      params.set('known', known);
+    }
+    const query = params.toString();
+    const response = await this.request<BootstrapResponse>(`/me/bootstrap${query ? `?${query}` : ''}`, {
+      headers: {
+        Authorization: `Bearer ${token}`,
+      },
+    });
+    if (!previous) {
+      return response;
+    }
+    // Неизменившиеся разделы берем из предыдущего ответа
+    return {
+      user: response.user.not_modified ? previous.user : response.user,
+      limits: response.limits.not_modified ? previous.limits : response.limits,
+      styles: response.styles.not_modified ? previous.styles : response.styles,
+      history: response.history.not_modified ? previous.history : response.history,
+    };
+  }
+
   async createPrompt(
     originalPrompt: string,
     styleId: number | null,